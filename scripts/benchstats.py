@@ -0,0 +1,207 @@
+import math
+import random
+
+def median(values: list[float]) -> float:
+    """Returns the median of a non-empty list of values"""
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2 == 1:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+def mad(values: list[float]) -> float:
+    """Returns the median absolute deviation from the median"""
+    center = median(values)
+    return median([abs(value - center) for value in values])
+
+def reject_outliers(values: list[float], threshold: float = 3.5) -> tuple[list[float], list[float]]:
+    """Splits the values into (kept, rejected), where values with a modified z-score above the threshold are rejected.
+
+       The modified z-score scales the MAD by 1.4826 such that it estimates the standard deviation of normal data."""
+    deviation = mad(values)
+    if deviation == 0.0:
+        return list(values), []
+
+    center = median(values)
+    kept = []
+    rejected = []
+    for value in values:
+        if abs(value - center) / (1.4826 * deviation) > threshold:
+            rejected.append(value)
+        else:
+            kept.append(value)
+
+    return kept, rejected
+
+def median_interval(values: list[float], confidence: float = 0.95) -> tuple[float, float, float]:
+    """Returns a distribution-free confidence interval (low, high, coverage) for the median based on order statistics.
+
+       The coverage is the confidence actually attained, for small samples the interval is the range of the
+       values and the coverage is lower than requested."""
+    ordered = sorted(values)
+    n = len(ordered)
+
+    # Find the largest k such that P(Binomial(n, 1/2) < k) <= (1 - confidence) / 2.
+    k = 0
+    tail = 0.0
+    while k < n // 2:
+        probability = math.comb(n, k) / 2**n
+        if tail + probability > (1 - confidence) / 2:
+            break
+        tail += probability
+        k += 1
+
+    if k == 0:
+        # The interval [min, max] only misses the median when all values are on one side.
+        return ordered[0], ordered[-1], 1 - 2 / 2**n
+
+    return ordered[k - 1], ordered[n - k], 1 - 2 * tail
+
+def summarise(values: list[float], confidence: float = 0.95) -> dict | None:
+    """Summarises the values with robust estimators after rejecting outliers, or None if there are no values"""
+    if not values:
+        return None
+
+    kept, rejected = reject_outliers(values)
+    low, high, coverage = median_interval(kept, confidence)
+
+    return {
+        "estimator": "median",
+        "value": median(kept),
+        "mad": mad(kept),
+        "ci": [low, high],
+        "confidence": coverage,
+        "runs": len(values),
+        "outliers": len(rejected),
+    }
+
+# Samples up to this size without ties are tested with the exact distribution of the Mann-Whitney statistic.
+EXACT_LIMIT = 20
+
+def ranks(values: list[float]) -> list[float]:
+    """Returns the rank of every value, starting at 1, where tied values get the average of their ranks"""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    result = [0.0] * len(values)
+
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            result[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+
+    return result
+
+def u_distribution(m: int, n: int) -> list[int]:
+    """Returns the number of orderings of m and n values for every value of the Mann-Whitney statistic.
+
+       The largest value either belongs to the first sample, and exceeds all n others, or to the second."""
+    table = [[[1] for _ in range(n + 1)] for _ in range(m + 1)]
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            counts = [0] * (i * j + 1)
+            for u, count in enumerate(table[i - 1][j]):
+                counts[u + j] += count
+            for u, count in enumerate(table[i][j - 1]):
+                counts[u] += count
+            table[i][j] = counts
+
+    return table[m][n]
+
+def mann_whitney(x: list[float], y: list[float]) -> tuple[float, float]:
+    """Returns the Mann-Whitney statistic U of x, the number of pairs in which x is larger, and the two-sided p-value.
+
+       The p-value is exact for small samples without ties, and otherwise uses the normal approximation with a
+       correction for ties and continuity."""
+    m, n = len(x), len(y)
+    combined = ranks(list(x) + list(y))
+    u = sum(combined[:m]) - m * (m + 1) / 2
+
+    ties = len(set(combined)) < m + n
+    if not ties and m <= EXACT_LIMIT and n <= EXACT_LIMIT:
+        counts = u_distribution(m, n)
+        total = sum(counts)
+        lower = sum(counts[:int(u) + 1]) / total
+        upper = sum(counts[int(u):]) / total
+        return u, min(1.0, 2 * min(lower, upper))
+
+    tie_sizes: dict[float, int] = {}
+    for rank in combined:
+        tie_sizes[rank] = tie_sizes.get(rank, 0) + 1
+
+    total = m + n
+    variance = m * n / 12 * ((total + 1) - sum(t**3 - t for t in tie_sizes.values()) / (total * (total - 1)))
+    if variance <= 0.0:
+        return u, 1.0
+
+    z = (abs(u - m * n / 2) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+def smallest_p_value(m: int, n: int) -> float:
+    """Returns the smallest two-sided p-value of the exact Mann-Whitney test for samples of m and n values,
+       attained when all values of one sample are smaller than those of the other"""
+    return min(1.0, 2 / math.comb(m + n, m))
+
+def bootstrap_ratios(x: list[float], y: list[float], samples: int, rng: random.Random) -> list[float]:
+    """Returns the ratio of the median of x to the median of y for resamples of both, used for percentile intervals"""
+    ratios = []
+    for _ in range(samples):
+        numerator = median(rng.choices(x, k=len(x)))
+        denominator = median(rng.choices(y, k=len(y)))
+        ratios.append(numerator / denominator if denominator > 0.0 else math.inf)
+
+    return ratios
+
+def percentile_interval(values: list[float], confidence: float = 0.95) -> tuple[float, float]:
+    """Returns the central interval that contains the given fraction of the values"""
+    ordered = sorted(values)
+    alpha = (1 - confidence) / 2
+    low = ordered[int(alpha * (len(ordered) - 1))]
+    high = ordered[math.ceil((1 - alpha) * (len(ordered) - 1))]
+    return low, high
+
+def geometric_mean(values: list[float]) -> float:
+    """Returns the geometric mean of positive values"""
+    return math.exp(sum(math.log(value) for value in values) / len(values))
+
+class StoppingRule:
+    """Decides how many runs are needed until the confidence interval of the median is narrow enough.
+
+       At least min_runs and at most max_runs measured runs are performed, after the given number of
+       discarded warm-up runs."""
+
+    def __init__(self, warmup: int = 1, min_runs: int = 3, max_runs: int = 10, ci_width: float = 0.05, confidence: float = 0.95):
+        self.warmup = warmup
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.ci_width = ci_width
+        self.confidence = confidence
+
+    def relative_width(self, values: list[float]) -> float:
+        """Returns the width of the confidence interval relative to the median, which is infinite as long as
+           too few values are kept to attain the confidence level, for example fewer than six for 95%"""
+        kept, _ = reject_outliers(values)
+        low, high, coverage = median_interval(kept, self.confidence)
+        if coverage < self.confidence:
+            return math.inf
+
+        center = median(kept)
+        if center == 0.0:
+            return 0.0 if high == low else math.inf
+        return (high - low) / center
+
+    def remaining(self, values: list[float]) -> int:
+        """Returns the number of additional runs to perform given the values measured so far"""
+        if len(values) < self.min_runs:
+            return self.min_runs - len(values)
+
+        if len(values) >= self.max_runs or self.reached(values):
+            return 0
+
+        return 1
+
+    def reached(self, values: list[float]) -> bool:
+        """Returns whether the confidence interval of the values is narrow enough at the confidence level"""
+        return bool(values) and self.relative_width(values) <= self.ci_width
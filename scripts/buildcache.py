@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from library import MyLogger, run_program
+
+class HashCache:
+    """Computes content hashes of files, memoized on their size and modification time.
+
+       The memo is only used to avoid rereading files, a changed modification time
+       leads to rehashing the content but not to a different hash."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.hashes: dict[str, list] = {}
+
+        try:
+            with open(filename, encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.hashes = {}
+
+    def file(self, path: str) -> str:
+        """Returns the sha256 digest of the content of the given file, or of all files in the given directory"""
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            return self.directory(path)
+
+        stat = os.stat(path)
+
+        with self.lock:
+            memo = self.hashes.get(path)
+            if memo is not None and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+                return memo[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+
+        with self.lock:
+            self.hashes[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+
+        return digest.hexdigest()
+
+    def directory(self, path: str) -> str:
+        """Returns the sha256 digest of the names and contents of all files in the given directory"""
+        digest = hashlib.sha256()
+        for root, directories, files in os.walk(path):
+            directories.sort()
+            for name in sorted(files):
+                filename = os.path.join(root, name)
+                digest.update(os.path.relpath(filename, path).encode() + b"\0" + self.file(filename).encode())
+
+        return digest.hexdigest()
+
+    def save(self):
+        """Writes the memo to disk"""
+        with self.lock:
+            tmp_filename = self.filename + ".tmp"
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(self.hashes, f)
+            os.replace(tmp_filename, self.filename)
+
+class Task:
+    """A node in the build graph that produces the output files, or directories, from the input files.
+
+       The task either runs the given command, in which the tool binaries are hashed
+       as part of the key, or calls action(task) for work done in Python, in which
+       case the salt should be changed whenever the action changes."""
+
+    def __init__(
+        self,
+        name: str,
+        outputs: list[str],
+        inputs: list[str],
+        command: list[str] | None = None,
+        tools: list[str] | None = None,
+        action: Callable[["Task"], None] | None = None,
+        salt: str = "",
+    ):
+        self.name = name
+        self.outputs = outputs
+        self.inputs = inputs
+        self.command = command
+        self.tools = tools if tools is not None else []
+        self.action = action
+        self.salt = salt
+
+        self.dependencies: list[Task] = []
+        self.key: str | None = None
+
+class BuildGraph:
+    """A dependency graph of tasks whose outputs are cached by the content hash of the inputs, tools and arguments.
+
+       Dependencies are derived from the inputs that are outputs of other tasks, and
+       independent tasks are executed concurrently."""
+
+    def __init__(self, cache_directory: str, logger: MyLogger):
+        self.cache_directory = cache_directory
+        self.logger = logger
+        self.tasks: list[Task] = []
+        self.producers: dict[str, Task] = {}
+
+        os.makedirs(os.path.join(cache_directory, "objects"), exist_ok=True)
+        self.hashes = HashCache(os.path.join(cache_directory, "hashes.json"))
+
+    def add(self, task: Task) -> Task:
+        """Adds a task to the graph, the tasks producing its inputs must be added first"""
+        for output in task.outputs:
+            self.producers[os.path.abspath(output)] = task
+
+        for path in task.inputs:
+            producer = self.producers.get(os.path.abspath(path))
+            if producer is not None and producer not in task.dependencies:
+                task.dependencies.append(producer)
+
+        self.tasks.append(task)
+        return task
+
+    def run(self, jobs: int = 1, on_done: Callable[[Task], None] | None = None):
+        """Executes all tasks that are not cached yet, running at most jobs tasks concurrently"""
+        remaining = {task: len(task.dependencies) for task in self.tasks}
+        dependents: dict[Task, list[Task]] = {task: [] for task in self.tasks}
+        for task in self.tasks:
+            for dependency in task.dependencies:
+                dependents[dependency].append(task)
+
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                running = {}
+                for task, count in remaining.items():
+                    if count == 0:
+                        running[pool.submit(self.execute, task)] = task
+
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+
+                        # Wait for the other tasks before propagating the error.
+                        error = future.exception()
+                        if error is not None:
+                            wait(running)
+                            raise error
+
+                        if on_done is not None:
+                            on_done(task)
+
+                        for dependent in dependents[task]:
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                running[pool.submit(self.execute, dependent)] = dependent
+        finally:
+            self.hashes.save()
+
+    def compute_key(self, task: Task) -> str:
+        """Computes the key of a task, the inputs must exist"""
+        digest = hashlib.sha256()
+        digest.update(task.salt.encode())
+
+        for tool in task.tools:
+            digest.update(b"tool:" + self.hashes.file(tool).encode())
+
+        # The paths of inputs and outputs are replaced by placeholders such that the key
+        # does not depend on the location of the checkout.
+        placeholders = {os.path.abspath(path): f"<input {i}>" for i, path in enumerate(task.inputs)}
+        placeholders.update({os.path.abspath(path): f"<output {i}>" for i, path in enumerate(task.outputs)})
+        for argument in task.command if task.command is not None else []:
+            argument = placeholders.get(os.path.abspath(argument), argument)
+            digest.update(b"arg:" + argument.encode() + b"\0")
+
+        for path in task.inputs:
+            digest.update(b"input:" + self.hashes.file(path).encode())
+
+        return digest.hexdigest()
+
+    def execute(self, task: Task):
+        """Executes a single task, or restores its outputs from the cache"""
+        task.key = self.compute_key(task)
+        object_directory = os.path.join(self.cache_directory, "objects", task.key)
+        manifest_file = os.path.join(object_directory, "manifest.json")
+
+        try:
+            with open(manifest_file, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except OSError:
+            manifest = None
+
+        if manifest is not None:
+            restored = False
+            for i, (output, expected) in enumerate(zip(task.outputs, manifest["outputs"])):
+                if not os.path.exists(output) or self.hashes.file(output) != expected:
+                    link_or_copy(os.path.join(object_directory, str(i)), output)
+                    restored = True
+
+            self.logger.debug(f"{'Restored' if restored else 'Up to date'}: {task.name}")
+            return
+
+        self.logger.info(f"Building {task.name}")
+
+        # Tools could write into an existing file, which would modify the cached copy it is linked to.
+        for output in task.outputs:
+            remove(output)
+
+        if task.command is not None:
+            run_program(task.command, self.logger)
+        if task.action is not None:
+            task.action(task)
+
+        tmp_directory = object_directory + ".tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        for i, output in enumerate(task.outputs):
+            link_or_copy(output, os.path.join(tmp_directory, str(i)))
+
+        with open(os.path.join(tmp_directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": task.name, "outputs": [self.hashes.file(output) for output in task.outputs]}, f)
+
+        try:
+            os.rename(tmp_directory, object_directory)
+        except OSError:
+            # Another process stored the same task concurrently.
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+
+def remove(path: str):
+    """Removes the given file or directory if it exists"""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def link_file(source: str, destination: str):
+    """Creates destination as a hard link to source, or a copy if linking is not possible"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def link_or_copy(source: str, destination: str):
+    """Replaces destination by hard links to source, which is either a file or a directory"""
+    destination = os.path.normpath(destination)
+    tmp_destination = destination + ".tmp"
+    remove(tmp_destination)
+
+    if os.path.isdir(source):
+        shutil.copytree(source, tmp_destination, copy_function=link_file)
+        remove(destination)
+        os.rename(tmp_destination, destination)
+    else:
+        link_file(source, tmp_destination)
+        os.replace(tmp_destination, destination)
@@ -0,0 +1,122 @@
+import glob
+import json
+import os
+import re
+
+# The option of merc-vpg solve that sets the number of nodes the BDD manager allocates up front.
+CAPACITY_OPTION = "--oxidd-node-capacity"
+
+# Bounds on the automatically chosen capacity, node indices of the BDD manager are 32 bit.
+MIN_CAPACITY = 1 << 16
+MAX_CAPACITY = (1 << 32) - 1
+
+# The factor by which the capacity grows after the solver ran out of nodes.
+GROWTH_FACTOR = 4
+
+# Reported by merc-vpg when the node table of the BDD manager is full, as opposed to a failed allocation.
+exhausted_regex = re.compile(r"OutOfMemory")
+
+def count_lines(file: str) -> int:
+    """Counts the lines of a file in blocks, which for a game is roughly its number of vertices"""
+    count = 0
+    with open(file, "rb") as f:
+        while block := f.read(1 << 20):
+            count += block.count(b"\n")
+
+    return count
+
+def estimate_capacity(game_file: str, features: int) -> int:
+    """Estimates the node capacity of a game from its number of vertices and the number of features.
+
+       Every vertex contributes a guard for each of its edges, which in the worst case needs a node per
+       feature, and the estimate is rounded up to a power of two."""
+    nodes = count_lines(game_file) * (features + 1)
+    return min(MAX_CAPACITY, max(MIN_CAPACITY, 1 << max(nodes - 1, 0).bit_length()))
+
+def fixed_capacity(flags: list[str]) -> int | None:
+    """Returns the capacity given explicitly in the solver flags, if any"""
+    for flag in flags:
+        name, _, value = flag.partition("=")
+        if name == CAPACITY_OPTION:
+            return int(value)
+
+    return None
+
+def grow(capacity: int) -> int | None:
+    """Returns the capacity of the next attempt after the solver ran out of nodes, or None at the maximum"""
+    if capacity >= MAX_CAPACITY:
+        return None
+
+    return min(MAX_CAPACITY, capacity * GROWTH_FACTOR)
+
+class CapacityPlanner:
+    """Chooses the node capacity of every game and variant.
+
+       The smallest capacity with which a game and variant succeeded before is reused, one that ran out of
+       nodes starts from the next larger capacity, and otherwise the capacity is estimated from the game and
+       the number of features of its case. A capacity given on the command line or in the solver flags of a
+       case is used as is for the first attempt."""
+
+    def __init__(self, initial: int | None = None):
+        self.initial = initial
+        # The number of features per game file.
+        self.features: dict[str, int] = {}
+        # The smallest successful and the largest exhausted capacity per job.
+        self.succeeded: dict[tuple[str, str], int] = {}
+        self.exhausted: dict[tuple[str, str], int] = {}
+        self.estimates: dict[str, int] = {}
+
+    @staticmethod
+    def key(file: str, solve_variant: str) -> tuple[str, str]:
+        return (os.path.normpath(os.path.abspath(file)), solve_variant)
+
+    def capacity(self, file: str, solve_variant: str, flags: list[str]) -> int:
+        """Returns the capacity of the first attempt to solve the game with the given variant"""
+        capacity = fixed_capacity(flags)
+        if capacity is not None:
+            return capacity
+        if self.initial is not None:
+            return self.initial
+
+        key = self.key(file, solve_variant)
+        if key in self.succeeded:
+            return self.succeeded[key]
+        if key in self.exhausted:
+            return grow(self.exhausted[key]) or MAX_CAPACITY
+
+        if file not in self.estimates:
+            self.estimates[file] = estimate_capacity(file, self.features.get(file, 0))
+        return self.estimates[file]
+
+    def record(self, file: str, solve_variant: str, capacity: int, outcome: str, exhausted: bool = False):
+        """Learns from the outcome of an attempt with the given capacity"""
+        key = self.key(file, solve_variant)
+        if outcome == "ok":
+            self.succeeded[key] = min(capacity, self.succeeded.get(key, capacity))
+        elif exhausted:
+            self.exhausted[key] = max(capacity, self.exhausted.get(key, capacity))
+
+            # A change of the solver or the game can make an earlier successful capacity too small.
+            if self.succeeded.get(key, MAX_CAPACITY + 1) <= capacity:
+                del self.succeeded[key]
+
+    def load(self, paths: list[str]):
+        """Learns the capacities from the measurements in previous results files, missing files are ignored"""
+        for pattern in paths:
+            for path in glob.glob(pattern):
+                with open(path, encoding="utf-8") as json_file:
+                    for line in json_file:
+                        try:
+                            result = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+
+                        for measurement in result.get("measurements", []):
+                            if measurement is not None and "node_capacity" in measurement:
+                                self.record(
+                                    result["file"],
+                                    result["solve_variant"],
+                                    measurement["node_capacity"],
+                                    measurement["outcome"],
+                                    measurement.get("nodes_exhausted", False),
+                                )
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+import argparse
+import math
+import random
+import sys
+
+from benchstats import bootstrap_ratios, geometric_mean, mann_whitney, median, percentile_interval, smallest_p_value
+from resultsdb import load_cases
+from tables import FORMATS, write_table
+
+def successful_times(entry: dict | None) -> list[float]:
+    """Returns the solving times of the successful runs of an entry"""
+    if entry is None:
+        return []
+
+    outcomes = entry.get("outcomes", ["ok"] * len(entry["times"]))
+    return [time for time, outcome in zip(entry["times"], outcomes) if time is not None and outcome == "ok"]
+
+def failed(entry: dict | None) -> bool:
+    return entry is not None and any(outcome != "ok" for outcome in entry.get("outcomes", []))
+
+class Comparison:
+    """The comparison of the solving times of a single experiment, property and variant between a baseline and a candidate.
+
+       The speedup is the median time of the baseline divided by that of the candidate, so values above one
+       mean that the candidate is faster."""
+
+    def __init__(self, key: tuple[str, str, str], baseline: dict | None, candidate: dict | None):
+        self.key = key
+        self.baseline = successful_times(baseline)
+        self.candidate = successful_times(candidate)
+        self.speedup: float | None = None
+        self.interval: tuple[float, float] | None = None
+        self.ratios: list[float] = []
+        self.p_value: float | None = None
+        self.slower = False
+
+        if baseline is None:
+            self.verdict = "new"
+        elif candidate is None:
+            self.verdict = "missing"
+        elif failed(candidate) and not failed(baseline):
+            self.verdict = "failed"
+        elif failed(baseline) or not self.baseline or not self.candidate:
+            self.verdict = "-"
+        else:
+            self.verdict = "same"
+
+    def test(self, alpha: float, threshold: float, confidence: float, samples: int, rng: random.Random):
+        """Tests whether the candidate differs significantly from the baseline, by more than the threshold"""
+        if self.verdict != "same":
+            return
+
+        baseline_median = median(self.baseline)
+        candidate_median = median(self.candidate)
+        if baseline_median <= 0.0 or candidate_median <= 0.0:
+            return
+
+        self.speedup = baseline_median / candidate_median
+        self.ratios = bootstrap_ratios(self.baseline, self.candidate, samples, rng)
+        self.interval = percentile_interval(self.ratios, confidence)
+        _, self.p_value = mann_whitney(self.baseline, self.candidate)
+
+        # With too few runs no difference can be significant, for example 3 against 3 runs give at least p = 0.1.
+        if smallest_p_value(len(self.baseline), len(self.candidate)) >= alpha:
+            self.verdict = "insufficient runs"
+            self.slower = candidate_median > baseline_median * (1 + threshold)
+        elif self.p_value < alpha:
+            if candidate_median > baseline_median * (1 + threshold):
+                self.verdict = "slower"
+            elif baseline_median > candidate_median * (1 + threshold):
+                self.verdict = "faster"
+
+    def regression(self) -> bool:
+        """Returns whether the candidate is significantly slower, failed, or is slower where too few runs were
+           measured to test it"""
+        return self.verdict in ("slower", "failed") or (self.verdict == "insufficient runs" and self.slower)
+
+def compare(
+    baseline: dict[str, dict[str, dict[str, dict]]],
+    candidate: dict[str, dict[str, dict[str, dict]]],
+) -> list[Comparison]:
+    """Pairs the entries of both results by experiment, property and variant"""
+    keys = set()
+    for results in (baseline, candidate):
+        for experiment, properties in results.items():
+            for prop, variants in properties.items():
+                keys.update((experiment, prop, variant) for variant in variants)
+
+    def entry(results, key):
+        experiment, prop, variant = key
+        return results.get(experiment, {}).get(prop, {}).get(variant)
+
+    return [Comparison(key, entry(baseline, key), entry(candidate, key)) for key in sorted(keys)]
+
+def geometric_speedups(comparisons: list[Comparison], confidence: float) -> dict[str, tuple[float, tuple[float, float], int]]:
+    """Returns the geometric mean speedup per experiment, and over all experiments under the key 'all'.
+
+       The interval combines the bootstrap resamples of all jobs with the same index."""
+    groups: dict[str, list[Comparison]] = {}
+    for comparison in comparisons:
+        if comparison.speedup is not None:
+            groups.setdefault(comparison.key[0], []).append(comparison)
+            groups.setdefault("all", []).append(comparison)
+
+    speedups = {}
+    for name, group in groups.items():
+        resampled = [
+            geometric_mean(ratios) for ratios in zip(*(comparison.ratios for comparison in group))
+            if all(0.0 < ratio < math.inf for ratio in ratios)
+        ]
+        interval = percentile_interval(resampled, confidence) if resampled else (math.nan, math.nan)
+        speedups[name] = (geometric_mean([comparison.speedup for comparison in group]), interval, len(group))
+
+    return speedups
+
+def format_number(value: float | None, digits: int = 3) -> str:
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="compare.py",
+        description="Compares the solving times of two results files, or two binaries in one file, and exits with 1 "
+                    "when the candidate is significantly slower.",
+        epilog="",
+    )
+
+    parser.add_argument(dest="baseline", action="store", type=str, help="Results file or database of the baseline")
+    parser.add_argument(
+        dest="candidate", action="store", type=str, nargs="?",
+        help="Results file or database of the candidate, the baseline file when omitted",
+    )
+    parser.add_argument(
+        "--baseline-binary", action="store", type=str, default=None,
+        help="Only compares the results of the binary with this label, as given to run.py --binary",
+    )
+    parser.add_argument(
+        "--candidate-binary", action="store", type=str, default=None,
+        help="Only compares the results of the binary with this label, as given to run.py --binary",
+    )
+    parser.add_argument(
+        "--alpha", action="store", type=float, default=0.05,
+        help="Significance level of the Mann-Whitney test",
+    )
+    parser.add_argument(
+        "--threshold", action="store", type=float, default=0.0,
+        help="Relative change of the median below which a significant difference is not reported",
+    )
+    parser.add_argument(
+        "--confidence", action="store", type=float, default=0.95,
+        help="Confidence level of the bootstrap intervals of the speedups",
+    )
+    parser.add_argument("--bootstrap", action="store", type=int, default=5000, help="Number of bootstrap resamples")
+    parser.add_argument("--seed", action="store", type=int, default=0)
+    parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="markdown")
+
+    args = parser.parse_args()
+
+    candidate = args.candidate if args.candidate is not None else args.baseline
+    if candidate == args.baseline and args.baseline_binary == args.candidate_binary:
+        parser.error("Give two results files, or the labels of two binaries measured in the same file")
+
+    fields = {"times", "outcomes"}
+    comparisons = compare(
+        load_cases(args.baseline, fields, binary=args.baseline_binary),
+        load_cases(candidate, fields, binary=args.candidate_binary),
+    )
+
+    rng = random.Random(args.seed)
+    for comparison in comparisons:
+        comparison.test(args.alpha, args.threshold, args.confidence, args.bootstrap, rng)
+
+    rows = []
+    for comparison in comparisons:
+        experiment, prop, variant = comparison.key
+        rows.append([
+            experiment,
+            prop,
+            variant,
+            f"{len(comparison.baseline)}/{len(comparison.candidate)}",
+            format_number(median(comparison.baseline) if comparison.baseline else None),
+            format_number(median(comparison.candidate) if comparison.candidate else None),
+            format_number(comparison.speedup),
+            f"[{comparison.interval[0]:.3f}, {comparison.interval[1]:.3f}]" if comparison.interval is not None else "-",
+            format_number(comparison.p_value, 4),
+            comparison.verdict,
+        ])
+
+    for name, (speedup, interval, count) in sorted(
+        geometric_speedups(comparisons, args.confidence).items(), key=lambda item: (item[0] == "all", item[0])
+    ):
+        rows.append([name, "geometric mean", "", str(count), "", "", f"{speedup:.3f}", f"[{interval[0]:.3f}, {interval[1]:.3f}]", "", ""])
+
+    write_table(
+        args.format,
+        ["experiment", "property", "variant", "runs", "baseline (s)", "candidate (s)", "speedup", "interval", "p", "verdict"],
+        rows,
+        sys.stdout,
+    )
+
+    tested = [comparison for comparison in comparisons if comparison.p_value is not None]
+    if len(tested) > 1:
+        print(
+            f"Note: the p-values of the {len(tested)} tested jobs are not corrected for multiple testing, so about "
+            f"{len(tested) * args.alpha:.1f} of them are expected below --alpha {args.alpha} by chance alone",
+            file=sys.stderr,
+        )
+
+    regressions = [comparison for comparison in comparisons if comparison.regression()]
+    for comparison in regressions:
+        if comparison.verdict == "insufficient runs":
+            print(f"Regression: {'/'.join(comparison.key)} is slower, with too few runs to test significance", file=sys.stderr)
+        else:
+            print(f"Regression: {'/'.join(comparison.key)} is {comparison.verdict}", file=sys.stderr)
+
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
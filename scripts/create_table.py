@@ -1,29 +1,43 @@
 import argparse
 import logging
-import json
-import os
+import sys
 
 from create_table_product import EXPERIMENT_LABELS
 from create_table_product import EXPERIMENT_ORDER
-from create_table_product import average
+from create_table_product import failure
 from create_table_product import flatten
 from create_table_product import format_property
+from create_table_product import format_time
 from create_table_product import print_escaped
 from create_table_product import property_number
+from create_table_product import TIMING_FIELDS
+from resultsdb import load_cases
+from solution import load_solutions
+from tables import FORMATS, write_latex, write_table
 
 formatter = logging.Formatter("%(message)s")
 logging.basicConfig(level=logging.DEBUG)
 
-def count_winning(solution: list[dict[str, dict[str, list[int]]]]) -> tuple[int, int]:
-    """Counts the number of vertices won by even and odd players."""
+def count_winning(entry: dict) -> tuple[str, str]:
+    """Counts the number of vertices won by even and odd players in the first run, '-' when only digests are stored."""
     won_even = 0
     won_odd = 0
 
-    for product, winners in solution[0].items():
-        won_even += len(winners.get("0", []))
-        won_odd += len(winners.get("1", []))
+    for winners in load_solutions(entry)[0].values():
+        if isinstance(winners, str):
+            return "-", "-"
 
-    return won_even, won_odd
+        won_even += winners[0].bit_count()
+        won_odd += winners[1].bit_count()
+
+    return str(won_even), str(won_odd)
+
+def format_recursive_calls(entry: dict) -> str:
+    """Formats the maximum number of recursive calls, or '-' when no run reported them."""
+    recursive_calls = flatten(entry["recursive_calls"])
+    if not recursive_calls:
+        return "-"
+    return str(max(recursive_calls))
 
 def main():
     parser = argparse.ArgumentParser(
@@ -33,44 +47,25 @@ def main():
     )
 
     parser.add_argument(
-        "input", action="store", type=str
+        "input", action="store", type=str, help="JSON lines file or database written by run.py"
+    )
+    parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="latex")
+    parser.add_argument(
+        "--binary", action="store", type=str, default=None,
+        help="Only shows the results of the binary with this label, as given to run.py --binary",
     )
 
     args = parser.parse_args()
 
-    results = {}
-    with open(args.input, "r", encoding="utf-8") as json_file:
-        # Read line by line and parse each line as JSON
-        for line in json_file:
-            json_data = json.loads(line)
-        
-            name = json_data["experiment"]
-            if name not in results:
-                results.update({name: {}})
-
-            property_name = os.path.basename(json_data["file"])
-            if property_name not in results[name]:
-                results[name].update({property_name: {}})
-
-            variant = json_data["solve_variant"]
-            if "solve_variant" not in results[name][property_name]:
-                results[name][property_name].update({variant: {}})
-
-            results[name][property_name][variant] = json_data
-
-    print("\\documentclass{standalone}")
-    print("\\begin{document}")
+    # Only the family variants are shown, and the solution of the family variant is counted.
+    results = load_cases(args.input, TIMING_FIELDS | {"solutions"}, ["family", "family-optimised-left"], args.binary)
 
-    print("\\begin{tabular}{r r|r r|r r|r r}")
-    print("\\multicolumn{2}{|c|}{Case} & \\multicolumn{2}{c|}{Family} & \\multicolumn{2}{c|}{Family Left} & \\multicolumn{2}{c}{Solution} \\\\")
-    print("model & property & solve & n & solve & n & even & odd \\\\ \\hline")
-
-    old_experiment = None
     all_experiments = sorted(
         results,
         key=lambda experiment: (EXPERIMENT_ORDER.get(experiment, 99), experiment),
     )
 
+    rows = []
     for experiment in all_experiments:
         properties = results[experiment]
 
@@ -79,40 +74,58 @@ def main():
             key=lambda item: (property_number(item[0]), item[0]),
         ):
             # Reachable family variant
-            family_time = 0.0
-            family_recursive_calls = 0
-            family_left_optimised_time = 0.0
-            family_left_optimised_recursive_calls = 0
+            family_time = format_time(None)
+            family_recursive_calls = "0"
+            family_left_optimised_time = format_time(None)
+            family_left_optimised_recursive_calls = "0"
 
-            won_even = 0
-            won_odd = 0
+            won_even = "0"
+            won_odd = "0"
 
             for variant, values in values.items():
                 if variant == "family":
-                    family_time = average(values["times"])
-                    family_recursive_calls = max(flatten(values["recursive_calls"]))
-                    
-                    won_even, won_odd = count_winning(values["solution"])
-
-                elif variant == "family-optimised-left":
-                    family_left_optimised_time = average(values["times"])
-                    family_left_optimised_recursive_calls = max(flatten(values["recursive_calls"]))
-
-            model_label = EXPERIMENT_LABELS.get(experiment, print_escaped(experiment))
-            property_label = format_property(experiment, prop)
+                    family_time = format_time(values)
+                    family_recursive_calls = format_recursive_calls(values)
 
-            row = (
-                f"{model_label if experiment != old_experiment else ''} & "
-                f"{property_label} & {family_time:.1f} & {family_recursive_calls} & "
-                f"{family_left_optimised_time:.1f} & {family_left_optimised_recursive_calls} & "
-                f"{won_even} & {won_odd} \\\\" 
-            )
-            print(row)
-            old_experiment = experiment
+                    if failure(values) is None:
+                        won_even, won_odd = count_winning(values)
+                    else:
+                        won_even, won_odd = "-", "-"
 
-    print("\\end{tabular}")
-
-    print("\\end{document}")
+                elif variant == "family-optimised-left":
+                    family_left_optimised_time = format_time(values)
+                    family_left_optimised_recursive_calls = format_recursive_calls(values)
+
+            rows.append((experiment, prop, [
+                family_time, family_recursive_calls,
+                family_left_optimised_time, family_left_optimised_recursive_calls,
+                won_even, won_odd,
+            ]))
+
+    if args.format == "latex":
+        write_latex(
+            ["model", "property", "solve", "n", "solve", "n", "even", "odd"],
+            [
+                [EXPERIMENT_LABELS.get(experiment, print_escaped(experiment)), format_property(experiment, prop), *cells]
+                for experiment, prop, cells in rows
+            ],
+            sys.stdout,
+            alignment="r r|r r|r r|r r",
+            groups=[("Case", 2), ("Family", 2), ("Family Left", 2), ("Solution", 2)],
+            escape=False,
+            sections=True,
+        )
+        return
+
+    write_table(
+        args.format,
+        ["model", "property", "family solve", "family n", "family left solve", "family left n", "even", "odd"],
+        [
+            [EXPERIMENT_LABELS.get(experiment, experiment), prop.removesuffix(".svpg"), *cells]
+            for experiment, prop, cells in rows
+        ],
+        sys.stdout,
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
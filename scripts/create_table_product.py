@@ -1,9 +1,11 @@
 import argparse
 import logging
-import json
 import math
-import os
 import re
+import sys
+
+from resultsdb import load_cases
+from tables import FORMATS, write_latex, write_table
 
 formatter = logging.Formatter("%(message)s")
 logging.basicConfig(level=logging.DEBUG)
@@ -26,6 +28,45 @@ PROPERTY_PREFIX = {
     "minepump_fts.mcrl2": "phi",
 }
 
+# The table cell shown instead of a time when a run did not finish successfully.
+OUTCOME_LABELS = {
+    "timeout": "TO",
+    "memout": "MO",
+    "crash": "ERR",
+}
+
+def failure(entry: dict | None) -> str | None:
+    """Returns the label of the first unsuccessful outcome of the entry, or None if all runs succeeded."""
+    if entry is None:
+        return None
+
+    for outcome in entry.get("outcomes", []):
+        if outcome != "ok":
+            return OUTCOME_LABELS.get(outcome, "ERR")
+
+    return None
+
+def format_time(entry: dict | None, key: str = "times") -> str:
+    """Formats the average of the given timings of the entry, or the label of its failure."""
+    label = failure(entry)
+    if label is not None:
+        return label
+
+    if entry is None:
+        return f"{0.0:.1f}"
+
+    return f"{estimate(entry, key):.1f}"
+
+def estimate(entry: dict, key: str = "times") -> float:
+    """Returns the estimated time stored by run.py for the given timings, or their average for older results."""
+    statistics = entry.get("statistics")
+    if statistics is not None and key in statistics:
+        if statistics[key] is None:
+            return 0.0
+        return statistics[key]["value"]
+
+    return average(entry[key])
+
 def average(timings: list[float]) -> float:
     """ Compute the average solving time in milliseconds from a list of timing results. """
     if len(timings) == 0:
@@ -75,25 +116,27 @@ def format_property(experiment: str, property_name: str) -> str:
     prefix = PROPERTY_PREFIX.get(experiment, "prop")
     return f"${chr(92)}{prefix}_{property_number(property_name)}$"
 
-def load_results(path: str) -> dict[str, dict[str, dict[str, dict]]]:
-    results: dict[str, dict[str, dict[str, dict]]] = {}
-
-    with open(path, "r", encoding="utf-8") as json_file:
-        for line in json_file:
-            json_data = json.loads(line)
+# The fields of the results that are needed for the timing tables.
+TIMING_FIELDS = {"times", "project_times", "reachable_times", "outcomes", "recursive_calls", "statistics"}
 
-            experiment = json_data["experiment"]
-            results.setdefault(experiment, {})
+def load_results(
+    path: str, variants: list[str] | None = None, binary: str | None = None
+) -> dict[str, dict[str, dict[str, dict]]]:
+    """Loads the timings from a results.json file or database, repeated runs of the same variant are merged."""
+    return load_cases(path, TIMING_FIELDS, variants, binary)
 
-            property_name = os.path.basename(json_data["file"])
-            results[experiment].setdefault(property_name, {})
-
-            variant = json_data["solve_variant"]
-            results[experiment][property_name][variant] = json_data
-
-    return results
+def product_metrics(entry: dict | None) -> dict[str, float | int | str]:
+    label = failure(entry)
+    if label is not None:
+        return {
+            "solve": label,
+            "max_recursive_calls": label,
+            "recursive_calls": label,
+            "zielonka": label,
+            "project": label,
+            "reachable": label,
+        }
 
-def product_metrics(entry: dict | None) -> dict[str, float | int]:
     if entry is None:
         return {
             "solve": 0.0,
@@ -105,9 +148,9 @@ def product_metrics(entry: dict | None) -> dict[str, float | int]:
         }
 
     recursive_calls = flatten(entry["recursive_calls"])
-    project_time = average(entry["project_times"])
-    reachable_time = average(entry["reachable_times"])
-    solve_time = average(entry["times"])
+    project_time = estimate(entry, "project_times")
+    reachable_time = estimate(entry, "reachable_times")
+    solve_time = estimate(entry, "times")
 
     return {
         "solve": solve_time,
@@ -118,6 +161,12 @@ def product_metrics(entry: dict | None) -> dict[str, float | int]:
         "reachable": reachable_time,
     }
 
+def format_metric(value: float | int | str) -> str:
+    """Formats a timing metric with one decimal, failure labels are printed as is."""
+    if isinstance(value, str):
+        return value
+    return f"{value:.1f}"
+
 def main():
     parser = argparse.ArgumentParser(
         prog="create_table_product.py",
@@ -133,24 +182,23 @@ def main():
         "no_reachability_input", action="store", type=str,
         help="JSON lines file with product results computed without reachability"
     )
+    parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="latex")
+    parser.add_argument(
+        "--binary", action="store", type=str, default=None,
+        help="Only shows the results of the binary with this label in both inputs, as given to run.py --binary",
+    )
 
     args = parser.parse_args()
 
-    reachable_results = load_results(args.reachable_input)
-    no_reachability_results = load_results(args.no_reachability_input)
+    reachable_results = load_results(args.reachable_input, ["product"], args.binary)
+    no_reachability_results = load_results(args.no_reachability_input, ["product"], args.binary)
 
     all_experiments = sorted(
         set(reachable_results) | set(no_reachability_results),
         key=lambda experiment: (EXPERIMENT_ORDER.get(experiment, 99), experiment),
     )
 
-    print("\\documentclass{standalone}")
-    print("\\begin{document}")
-
-    print("\\begin{tabular}{r r|r r r||r r r r}")
-    print("model & property & solve & zielonka & project & solve & zielonka & project & reachability \\\\ \\hline")
-
-    old_experiment = None
+    rows = []
     for experiment in all_experiments:
         reachable_properties = reachable_results.get(experiment, {})
         no_reachability_properties = no_reachability_results.get(experiment, {})
@@ -163,23 +211,43 @@ def main():
             reachable_metrics = product_metrics(reachable_properties.get(property_name, {}).get("product"))
             no_reachability_metrics = product_metrics(no_reachability_properties.get(property_name, {}).get("product"))
 
-            model_label = EXPERIMENT_LABELS.get(experiment, print_escaped(experiment))
-            property_label = format_property(experiment, property_name)
-
-            row = (
-                f"{model_label if experiment != old_experiment else ''} & {property_label} & "
-                f"{no_reachability_metrics['solve']:.1f} & {no_reachability_metrics['zielonka']:.1f} & {no_reachability_metrics['project']:.1f} & "
-                f"{reachable_metrics['solve']:.1f} & "
-                f"{reachable_metrics['zielonka']:.1f} & {reachable_metrics['project']:.1f} & {reachable_metrics['reachable']:.1f} \\\\" 
-            )
-            print(row)
-            old_experiment = experiment
-
-        print("\\hline")
-
-    print("\\end{tabular}")
-
-    print("\\end{document}")
+            rows.append((experiment, property_name, [
+                format_metric(no_reachability_metrics["solve"]),
+                format_metric(no_reachability_metrics["zielonka"]),
+                format_metric(no_reachability_metrics["project"]),
+                format_metric(reachable_metrics["solve"]),
+                format_metric(reachable_metrics["zielonka"]),
+                format_metric(reachable_metrics["project"]),
+                format_metric(reachable_metrics["reachable"]),
+            ]))
+
+    if args.format == "latex":
+        write_latex(
+            ["model", "property", "solve", "zielonka", "project", "solve", "zielonka", "project", "reachability"],
+            [
+                [EXPERIMENT_LABELS.get(experiment, print_escaped(experiment)), format_property(experiment, property_name), *cells]
+                for experiment, property_name, cells in rows
+            ],
+            sys.stdout,
+            alignment="r r|r r r||r r r r",
+            escape=False,
+            sections=True,
+            rules=True,
+        )
+        return
+
+    write_table(
+        args.format,
+        [
+            "model", "property", "solve", "zielonka", "project",
+            "solve (reachable)", "zielonka (reachable)", "project (reachable)", "reachability",
+        ],
+        [
+            [EXPERIMENT_LABELS.get(experiment, experiment), property_name.removesuffix(".svpg"), *cells]
+            for experiment, property_name, cells in rows
+        ],
+        sys.stdout,
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,282 @@
+import argparse
+import re
+
+from typing import Iterator
+
+# The terminals of every feature diagram.
+FALSE = 0
+TRUE = 1
+
+token_regex = re.compile(r"\s*(node|tt|ff|[(),]|[^\s(),]+)")
+
+# The largest expression that is serialised, in characters. The FD format has no sharing, so a diagram whose
+# nodes are shared by many paths can be exponentially larger when written.
+MAX_SERIALISED_SIZE = 16 * 1024 * 1024
+
+class FeatureDiagram:
+    """A reduced ordered binary decision diagram over the features, in the order of the first line of an FD file.
+
+       Nodes are hash-consed in a table shared by all diagrams derived from the same one, and are identified
+       by their index. A node is a triple (level, hi, lo) where hi is taken when the feature at that level is
+       enabled. The terminals are at level len(features)."""
+
+    def __init__(self, features: list[str], table: "FeatureDiagram | None" = None):
+        self.features = features
+        self.levels = {feature: level for level, feature in enumerate(features)}
+        if len(self.levels) != len(features):
+            raise ValueError(f"Feature order {features} contains duplicates")
+
+        if table is not None:
+            # Shares the nodes and caches of a diagram over the same features.
+            self.nodes = table.nodes
+            self.unique = table.unique
+            self.ite_cache = table.ite_cache
+        else:
+            self.nodes: list[tuple[int, int, int]] = [(len(features), FALSE, FALSE), (len(features), TRUE, TRUE)]
+            self.unique: dict[tuple[int, int, int], int] = {}
+            self.ite_cache: dict[tuple[int, int, int], int] = {}
+        self.root = TRUE
+
+    def with_root(self, root: int) -> "FeatureDiagram":
+        """Returns the diagram with the given node of this table as its root"""
+        result = FeatureDiagram(self.features, self)
+        result.root = root
+        return result
+
+    def node(self, level: int, hi: int, lo: int) -> int:
+        """Returns the unique node that decides the feature at the given level"""
+        if hi == lo:
+            return hi
+
+        key = (level, hi, lo)
+        index = self.unique.get(key)
+        if index is None:
+            index = len(self.nodes)
+            self.nodes.append(key)
+            self.unique[key] = index
+
+        return index
+
+    def variable(self, feature: str) -> int:
+        """Returns the node that holds iff the feature is enabled"""
+        if feature not in self.levels:
+            raise ValueError(f"Feature {feature} does not occur in the feature order {self.features}")
+
+        return self.node(self.levels[feature], TRUE, FALSE)
+
+    def ite(self, f: int, g: int, h: int) -> int:
+        """Returns the node for 'if f then g else h'"""
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+
+        key = (f, g, h)
+        result = self.ite_cache.get(key)
+        if result is not None:
+            return result
+
+        level = min(self.nodes[f][0], self.nodes[g][0], self.nodes[h][0])
+        hi = self.ite(*(self.cofactor(u, level, True) for u in (f, g, h)))
+        lo = self.ite(*(self.cofactor(u, level, False) for u in (f, g, h)))
+        result = self.node(level, hi, lo)
+        self.ite_cache[key] = result
+        return result
+
+    def cofactor(self, u: int, level: int, value: bool) -> int:
+        """Returns the node u with the feature at the given level, which is not below u, fixed to the value"""
+        node_level, hi, lo = self.nodes[u]
+        if node_level != level:
+            return u
+
+        return hi if value else lo
+
+    def count(self) -> int:
+        """Returns the number of valid products, in time linear in the number of nodes"""
+        counts = {FALSE: 0, TRUE: 1}
+
+        def visit(u: int) -> int:
+            if u not in counts:
+                level, hi, lo = self.nodes[u]
+                counts[u] = (
+                    visit(hi) << (self.nodes[hi][0] - level - 1)
+                ) + (
+                    visit(lo) << (self.nodes[lo][0] - level - 1)
+                )
+
+            return counts[u]
+
+        return visit(self.root) << self.nodes[self.root][0]
+
+    def products(self) -> Iterator[str]:
+        """Enumerates the valid products lazily in lexicographic order, where character i of a product is 1
+           iff feature i is enabled"""
+        return self.prefixes(len(self.features))
+
+    def prefixes(self, length: int) -> Iterator[str]:
+        """Enumerates the distinct prefixes of the given length of the valid products in lexicographic order"""
+        prefix: list[str] = []
+
+        def walk(u: int, level: int) -> Iterator[str]:
+            if u == FALSE:
+                return
+            if level == length:
+                yield "".join(prefix)
+                return
+
+            node_level, hi, lo = self.nodes[u]
+            for value, child in (("0", lo), ("1", hi)):
+                prefix.append(value)
+                yield from walk(child if node_level == level else u, level + 1)
+                prefix.pop()
+
+        yield from walk(self.root, 0)
+
+    def is_valid(self, product: str) -> bool:
+        """Returns true iff the product, given as a string of zeroes and ones in the feature order, is valid"""
+        if len(product) != len(self.features):
+            raise ValueError(f"Product {product} does not have a value for each of the {len(self.features)} features")
+
+        u = self.root
+        while u > TRUE:
+            level, hi, lo = self.nodes[u]
+            u = hi if product[level] == "1" else lo
+
+        return u == TRUE
+
+    def restrict(self, assignment: dict[str, bool]) -> "FeatureDiagram":
+        """Returns the diagram of the valid products that agree with the assignment of the given features"""
+        restricted = self.root
+        for feature, value in assignment.items():
+            variable = self.variable(feature)
+            restricted = self.ite(variable, restricted, FALSE) if value else self.ite(variable, FALSE, restricted)
+
+        return self.with_root(restricted)
+
+    def reorder(self, features: list[str]) -> "FeatureDiagram":
+        """Returns the same set of products as a diagram over the given permutation of the features"""
+        if sorted(features) != sorted(self.features):
+            raise ValueError(f"Feature order {features} is not a permutation of {self.features}")
+
+        result = FeatureDiagram(features)
+        converted = {FALSE: FALSE, TRUE: TRUE}
+
+        def visit(u: int) -> int:
+            if u not in converted:
+                level, hi, lo = self.nodes[u]
+                converted[u] = result.ite(result.variable(self.features[level]), visit(hi), visit(lo))
+
+            return converted[u]
+
+        return result.with_root(visit(self.root))
+
+    def serialised_size(self) -> int:
+        """Returns the number of characters of the expression written by serialise, in time linear in the number
+           of nodes"""
+        sizes = {FALSE: len("ff"), TRUE: len("tt")}
+
+        def visit(u: int) -> int:
+            if u not in sizes:
+                level, hi, lo = self.nodes[u]
+                sizes[u] = len(f"node({self.features[level]}, , )") + visit(hi) + visit(lo)
+
+            return sizes[u]
+
+        return visit(self.root)
+
+    def serialise(self, limit: int = MAX_SERIALISED_SIZE) -> str:
+        """Writes the diagram in the format of an FD file, where shared nodes are written once per occurrence.
+           Raises a ValueError when the expression would be longer than the limit."""
+        size = self.serialised_size()
+        if size > limit:
+            raise ValueError(
+                f"The feature diagram over {len(self.features)} features would take {size} characters as an FD file, "
+                f"more than the limit of {limit}, since shared nodes are repeated"
+            )
+
+        text = {FALSE: "ff", TRUE: "tt"}
+
+        def visit(u: int) -> str:
+            if u not in text:
+                level, hi, lo = self.nodes[u]
+                text[u] = f"node({self.features[level]}, {visit(hi)}, {visit(lo)})"
+
+            return text[u]
+
+        return ",".join(self.features) + "\n" + visit(self.root) + "\n"
+
+def parse_fd(text: str) -> FeatureDiagram:
+    """Parses a feature diagram, whose first line is the feature order followed by a nested node(F, hi, lo)
+       expression with the terminals tt and ff. The expression need not respect the feature order."""
+    header, _, body = text.partition("\n")
+    diagram = FeatureDiagram([feature.strip() for feature in header.split(",") if feature.strip()])
+
+    tokens = token_regex.findall(body)
+    position = 0
+
+    def expect(token: str):
+        nonlocal position
+        if position >= len(tokens) or tokens[position] != token:
+            found = tokens[position] if position < len(tokens) else "end of input"
+            raise ValueError(f"Expected '{token}' in feature diagram but found '{found}'")
+        position += 1
+
+    def expression() -> int:
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError("Unexpected end of input in feature diagram")
+
+        token = tokens[position]
+        position += 1
+        if token == "tt":
+            return TRUE
+        if token == "ff":
+            return FALSE
+        if token != "node":
+            raise ValueError(f"Unexpected '{token}' in feature diagram")
+
+        expect("(")
+        variable = diagram.variable(tokens[position])
+        position += 1
+        expect(",")
+        hi = expression()
+        expect(",")
+        lo = expression()
+        expect(")")
+        return diagram.ite(variable, hi, lo)
+
+    root = expression()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected '{tokens[position]}' after the feature diagram")
+
+    return diagram.with_root(root)
+
+def read_fd(filename: str) -> FeatureDiagram:
+    """Reads the feature diagram from an FD file"""
+    with open(filename, encoding="utf-8") as f:
+        return parse_fd(f.read())
+
+def main():
+    """Prints the number of valid products of the given feature diagrams"""
+    parser = argparse.ArgumentParser(
+        prog="fd.py",
+        description="Counts, and optionally lists, the valid products of feature diagrams.",
+        epilog="",
+    )
+    parser.add_argument(dest="fd", action="store", type=str, nargs="+")
+    parser.add_argument("--list", action="store_true", help="Prints every valid product")
+
+    args = parser.parse_args()
+    for filename in args.fd:
+        diagram = read_fd(filename)
+        print(f"{filename}: {len(diagram.features)} features, {diagram.count()} valid products")
+        if args.list:
+            for product in diagram.products():
+                print(product)
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,468 @@
-from io import StringIO
+from collections import deque
+import atexit
+import fcntl
+import gzip
+import json
+import os
+import re
+import resource
+import signal
 import subprocess
+import threading
 import time
 import logging
+import logging.handlers
+import queue
+import shutil
 import sys
 
-def run_program(cmds, logger, process=None):
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Messages with which a process reports that it ran out of memory, including OxiDD running out of nodes.
+memory_error_regex = re.compile(r"memory allocation of [0-9]+ bytes failed|out of memory|OutOfMemory|Cannot allocate memory", re.IGNORECASE)
+
+class Measurement:
+    """The resources used by a finished child process, as reported by wait4.
+
+       The outcome is one of "ok", "timeout", "memout", "crash" or "cancelled"."""
+
+    def __init__(self, returncode: int, wall_time_ns: int, rusage: resource.struct_rusage, outcome: str = "ok"):
+        self.returncode = returncode
+        self.outcome = outcome
+        self.wall_time_s = wall_time_ns / 1e9
+        self.user_time_s = rusage.ru_utime
+        self.system_time_s = rusage.ru_stime
+        # On Linux the maximum resident set size is reported in kilobytes.
+        self.max_rss_kb = rusage.ru_maxrss
+        self.minor_page_faults = rusage.ru_minflt
+        self.major_page_faults = rusage.ru_majflt
+        self.voluntary_context_switches = rusage.ru_nvcsw
+        self.involuntary_context_switches = rusage.ru_nivcsw
+
+    def as_dict(self) -> dict:
+        """Returns the measurement as a dictionary that can be stored as JSON"""
+        return dict(self.__dict__)
+
+class Sampler:
+    """Samples the resident memory, cpu usage and number of threads of a child process in a background thread.
+
+       Events, such as the end of a solver phase, can be marked on the same clock as the samples."""
+
+    def __init__(self, interval_ms: float):
+        if psutil is None:
+            raise RuntimeError("Sampling the resource usage requires the psutil package")
+
+        self.interval_ms = interval_ms
+        self.start_time = time.perf_counter()
+        self.times_ms: list[int] = []
+        self.rss_kb: list[int] = []
+        self.cpu_percent: list[float] = []
+        self.threads: list[int] = []
+        self.events: list[dict] = []
+
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def elapsed_ms(self) -> int:
+        return int((time.perf_counter() - self.start_time) * 1000)
+
+    def start(self, pid: int):
+        """Starts sampling the process with the given pid"""
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample, args=(pid,), name="sampler", daemon=True)
+        self.thread.start()
+
+    def sample(self, pid: int):
+        try:
+            process = psutil.Process(pid)
+            process.cpu_percent()
+
+            while not self.stopped.wait(self.interval_ms / 1000):
+                with process.oneshot():
+                    rss = process.memory_info().rss
+                    cpu = process.cpu_percent()
+                    threads = process.num_threads()
+
+                self.times_ms.append(self.elapsed_ms())
+                self.rss_kb.append(rss // 1024)
+                self.cpu_percent.append(round(cpu, 1))
+                self.threads.append(threads)
+        except psutil.Error:
+            # The process has terminated.
+            pass
+
+    def mark(self, event: str, duration_s: float | None = None):
+        """Marks that the given event happened now, where the duration is the length of the phase that ended"""
+        self.events.append({"event": event, "time_ms": self.elapsed_ms(), "duration_s": duration_s})
+
+    def stop(self):
+        """Stops sampling"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def write(self, filename: str):
+        """Writes the timeline as column-oriented JSON"""
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({
+                "interval_ms": self.interval_ms,
+                "time_ms": self.times_ms,
+                "rss_kb": self.rss_kb,
+                "cpu_percent": self.cpu_percent,
+                "threads": self.threads,
+                "events": self.events,
+            }, f, separators=(",", ":"))
+
+def set_limits(memory_limit_mb: int | None, cpu_limit_s: int | None):
+    """Limits the address space and cpu time of the calling process, used in the child before executing the program"""
+    if memory_limit_mb is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    if cpu_limit_s is not None:
+        # The soft limit sends SIGXCPU, the hard limit one second later SIGKILL.
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit_s, cpu_limit_s + 1))
+
+class Cancellation:
+    """Kills the registered programs once cancelled, such as the programs that lost a race.
+
+       Programs are unregistered before they are reaped, so a signal never reaches a reused process id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes: set[int] = set()
+        self.cancelled = False
+
+    def register(self, pid: int):
+        with self.lock:
+            self.processes.add(pid)
+            if self.cancelled:
+                os.kill(pid, signal.SIGKILL)
+
+    def unregister(self, pid: int):
+        with self.lock:
+            self.processes.discard(pid)
+
+    def cancel(self):
+        """Kills all registered programs and the programs registered afterwards"""
+        with self.lock:
+            self.cancelled = True
+            for pid in self.processes:
+                os.kill(pid, signal.SIGKILL)
+
+def classify(returncode: int, timed_out: bool, memory_limited: bool, cpu_limited: bool, tail: deque) -> str:
+    """Determines the outcome of a finished process from its return code and last lines of output"""
+    if returncode == 0:
+        return "ok"
+    if timed_out and returncode == -signal.SIGKILL:
+        return "timeout"
+    if cpu_limited and returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        return "timeout"
+    if any(memory_error_regex.search(line) for line in tail):
+        return "memout"
+    if memory_limited and returncode in (-signal.SIGKILL, -signal.SIGABRT, -signal.SIGSEGV):
+        return "memout"
+    return "crash"
+
+# The size of the blocks in which captured output is read from the pipe and written to disk.
+CAPTURE_CHUNK_SIZE = 1 << 20
+
+# Incomplete lines longer than this are not kept between blocks, since the lines passed on are short.
+MAX_CAPTURED_LINE = 4096
+
+def marker_lines(data: bytes, markers: tuple[bytes, ...]) -> tuple[list[bytes], int]:
+    """Returns the complete lines of data that contain one of the markers, and the offset after the last complete line"""
+    end = data.rfind(b"\n") + 1
+
+    starts = set()
+    for marker in markers:
+        index = data.find(marker, 0, end)
+        while index != -1:
+            starts.add(data.rfind(b"\n", 0, index) + 1)
+            index = data.find(marker, index + len(marker), end)
+
+    return [data[start:data.find(b"\n", start)] for start in sorted(starts)], end
+
+class OutputCapture:
+    """Drains the output of a program into a raw file from a reader thread, such that the program never
+       blocks on a full pipe, and passes only the lines containing one of the markers on.
+
+       Lines are not decoded unless they contain a marker, the remaining output can be parsed from the raw
+       file afterwards."""
+
+    def __init__(self, stream, filename: str, markers: tuple[bytes, ...]):
+        self.stream = stream
+        self.filename = filename
+        self.markers = markers
+        self.chunks: queue.SimpleQueue[bytes | None] = queue.SimpleQueue()
+        self.size = 0
+        self.last = b""
+
+        # A larger pipe buffer lets the program write bursts of output without waiting for the reader.
+        try:
+            fcntl.fcntl(stream.fileno(), fcntl.F_SETPIPE_SZ, CAPTURE_CHUNK_SIZE)
+        except (AttributeError, OSError):
+            pass
+
+        self.thread = threading.Thread(target=self.drain, name="capture", daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        try:
+            with open(self.filename, "wb") as outfile:
+                while chunk := self.stream.read(CAPTURE_CHUNK_SIZE):
+                    outfile.write(chunk)
+                    self.chunks.put(chunk)
+        finally:
+            self.chunks.put(None)
+
+    def lines(self):
+        """Yields the decoded lines containing a marker until the program closes its output"""
+        partial = b""
+        skipping = False
+        while (chunk := self.chunks.get()) is not None:
+            self.size += len(chunk)
+            self.last = (self.last + chunk)[-MAX_CAPTURED_LINE:]
+
+            if skipping:
+                # The rest of a long line that has been dropped.
+                newline = chunk.find(b"\n")
+                if newline == -1:
+                    continue
+                chunk = chunk[newline + 1:]
+                skipping = False
+
+            data = partial + chunk
+            lines, end = marker_lines(data, self.markers)
+            yield from (line.decode("utf-8", errors="replace").strip() for line in lines)
+
+            partial = data[end:]
+            if len(partial) > MAX_CAPTURED_LINE:
+                partial = b""
+                skipping = True
+
+        self.thread.join()
+        lines, _ = marker_lines(partial + b"\n", self.markers)
+        yield from (line.decode("utf-8", errors="replace").strip() for line in lines)
+
+    def tail(self) -> list[str]:
+        """Returns the last lines of output, to classify the outcome of the program"""
+        return self.last.decode("utf-8", errors="replace").splitlines()
+
+def run_program(
+    cmds,
+    logger,
+    process=None,
+    sampler: Sampler | None = None,
+    timeout: float | None = None,
+    memory_limit_mb: int | None = None,
+    cpu_limit_s: int | None = None,
+    check: bool = True,
+    capture: str | None = None,
+    markers: tuple[bytes, ...] = (),
+    core: int | None = None,
+    cancellation: Cancellation | None = None,
+) -> Measurement:
     """Runs the given program with sensible defaults, and logs the results to the logger.
-    Returns the execution time in seconds."""
+    Returns the wall-clock time and resource usage of the program, which is optionally sampled over time.
+
+    The program is killed after timeout seconds, and its address space and cpu time can be limited. If check
+    is true a CalledProcessError is raised when the program fails, otherwise the outcome is recorded in the
+    measurement.
+
+    If capture is given the output is written unmodified to that file, and only the lines containing one
+    of the markers are logged and processed.
+
+    The program is pinned to the core if given, and killed with the outcome "cancelled" when the
+    cancellation is cancelled."""
 
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
+    tail: deque[str] = deque(maxlen=20)
+
+    preexec_fn = None
+    if memory_limit_mb is not None or cpu_limit_s is not None or core is not None:
+        def preexec_fn():
+            set_limits(memory_limit_mb, cpu_limit_s)
+            if core is not None:
+                os.sched_setaffinity(0, {core})
 
     with subprocess.Popen(
-        cmds, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        cmds,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=capture is None,
+        bufsize=0 if capture is not None else -1,
+        preexec_fn=preexec_fn,
     ) as proc:
-        if proc.stdout is not None:
+        timed_out = threading.Event()
+        timer = None
+        if timeout is not None:
+            def kill():
+                timed_out.set()
+                proc.kill()
+
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+
+        if cancellation is not None:
+            cancellation.register(proc.pid)
+
+        if sampler is not None:
+            sampler.start(proc.pid)
+
+        if proc.stdout is not None and capture is not None:
+            output = OutputCapture(proc.stdout, capture, markers)
+            for line in output.lines():
+                logger.info(line)
+
+                if process is not None:
+                    process(line)
+
+            tail.extend(output.tail())
+            logger.info(f"Captured {output.size} bytes of output in {capture}")
+        elif proc.stdout is not None:
             for line in proc.stdout:
                 logger.info(line.strip())
+                tail.append(line)
 
                 if process is not None:
                     process(line.strip())
 
-        proc.wait()
+        if sampler is not None:
+            sampler.stop()
+
+        if cancellation is not None:
+            cancellation.unregister(proc.pid)
 
-        if proc.returncode != 0:
-            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        # Reap the child ourselves to obtain its resource usage.
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        elapsed_time = time.perf_counter_ns() - start_time
 
-    elapsed_time = time.time() - start_time
-    return elapsed_time
+        if timer is not None:
+            timer.cancel()
+
+        outcome = classify(proc.returncode, timed_out.is_set(), memory_limit_mb is not None, cpu_limit_s is not None, tail)
+        if outcome != "ok" and cancellation is not None and cancellation.cancelled and proc.returncode == -signal.SIGKILL:
+            outcome = "cancelled"
+        if outcome != "ok":
+            logger.warning(f"Program {cmds[0]} terminated with outcome {outcome} (return code {proc.returncode})")
+            if capture is not None:
+                for line in tail:
+                    logger.info(line)
+
+            if check:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+    return Measurement(proc.returncode, elapsed_time, rusage, outcome)
 
 formatter = logging.Formatter("%(threadName)-11s %(asctime)s %(levelname)s %(message)s")
 logging.basicConfig(level=logging.DEBUG)
 
+class RingBufferHandler(logging.Handler):
+    """A handler that keeps only the most recent formatted records"""
+
+    def __init__(self, capacity: int, terminator: str = "\n"):
+        logging.Handler.__init__(self)
+        self.lines: deque[str] = deque(maxlen=capacity)
+        self.terminator = terminator
+
+    def emit(self, record: logging.LogRecord):
+        self.lines.append(self.format(record) + self.terminator)
+
+    def getvalue(self) -> str:
+        return "".join(self.lines)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that leaves formatting to the listener, and drops records instead of blocking when the queue is full"""
+
+    def __init__(self, records: queue.Queue):
+        logging.handlers.QueueHandler.__init__(self, records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The record stays within this process, so formatting is deferred to the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def gzip_rotator(source: str, destination: str):
+    """Compresses a rotated log file"""
+    with open(source, "rb") as infile, gzip.open(destination, "wb") as outfile:
+        shutil.copyfileobj(infile, outfile)
+    os.remove(source)
+
 class MyLogger(logging.Logger):
-    """My own logger that stores the log messages into a string stream"""
+    """My own logger that stores the most recent log messages into a ring buffer.
 
-    def __init__(self, name: str, filename: str | None = None, terminator="\n"):
+       Records are passed through a bounded queue to a listener thread that writes them to the
+       buffer, a rotating and compressed log file and stderr, each with its own level, so logging
+       does not block the thread that produces the records."""
+
+    def __init__(
+        self,
+        name: str,
+        filename: str | None = None,
+        terminator="\n",
+        buffer_lines: int = 10000,
+        file_level: int = logging.DEBUG,
+        stderr_level: int = logging.DEBUG,
+        max_bytes: int = 64 * 1024 * 1024,
+        backup_count: int = 5,
+        queue_size: int = 100000,
+    ):
         """Create a new logger instance with the given name"""
         logging.Logger.__init__(self, name, logging.DEBUG)
+        self.file_level = file_level
+        self.stderr_level = stderr_level
 
-        self.stream = StringIO()
-        handler = logging.StreamHandler(self.stream)
-        handler.terminator = terminator
-        handler.setFormatter(formatter)
+        self.buffer = RingBufferHandler(buffer_lines, terminator)
+        self.buffer.setFormatter(formatter)
+        handlers: list[logging.Handler] = [self.buffer]
 
         if filename is not None:
-            self.addHandler(logging.FileHandler(filename))
+            file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+            file_handler.rotator = gzip_rotator
+            file_handler.namer = lambda name: name + ".gz"
+            file_handler.setLevel(file_level)
+            handlers.append(file_handler)
 
         standard_output = logging.StreamHandler(sys.stderr)
         standard_output.terminator = terminator
+        standard_output.setLevel(stderr_level)
+        handlers.append(standard_output)
+
+        self.queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.addHandler(self.queue_handler)
 
-        self.addHandler(handler)
-        self.addHandler(standard_output)
+        self.listener = logging.handlers.QueueListener(self.queue_handler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.closed = False
+        atexit.register(self.close)
+
+    def close(self):
+        """Writes all queued records and stops the listener"""
+        if not self.closed:
+            self.closed = True
+            self.listener.stop()
+
+            if self.queue_handler.dropped > 0:
+                sys.stderr.write(f"Logger {self.name} dropped {self.queue_handler.dropped} records\n")
+
+            for handler in self.listener.handlers:
+                handler.close()
 
     def getvalue(self) -> str:
-        """Returns the str that has been logged to this logger"""
-        return self.stream.getvalue()
\ No newline at end of file
+        """Returns the most recent messages that have been logged to this logger"""
+        if not self.closed:
+            # Wait until the listener has handled all queued records.
+            self.queue_handler.queue.join()
+
+        return self.buffer.getvalue()
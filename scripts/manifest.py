@@ -0,0 +1,153 @@
+import fnmatch
+import glob
+import json
+import os
+import re
+
+SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# The directory in which every subdirectory is a case.
+CASES_PATH = os.path.join(SCRIPT_PATH, "../cases/")
+
+# The optional file in a case directory that describes the case.
+MANIFEST_NAME = "case.json"
+
+def natural_key(name: str) -> list:
+    """Sorts names such that property10 comes after property9"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+class Experiment:
+    """A case consisting of an mCRL2 specification, its feature diagram and action renaming, and the properties to check.
+
+       The solver flags map a property name without extension, or '*' for all properties, to additional
+       arguments for merc-vpg solve. A synthetic case has no specification, its games are generated from
+       the given parameters by synthetic.py and every property is the name of a game."""
+
+    def __init__(
+        self,
+        directory: str,
+        spec: str,
+        properties: list[str],
+        fd: str = "FD",
+        actionrename: str = "actionrename",
+        solver_flags: dict[str, list[str]] | None = None,
+        synthetic: dict | None = None,
+    ):
+        self.directory = os.path.join(directory, "")
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.spec = spec
+        self.properties = properties
+        self.fd = fd
+        self.actionrename = actionrename
+        self.solver_flags = solver_flags if solver_flags is not None else {}
+        self.synthetic = synthetic
+
+    @property
+    def tmp_directory(self) -> str:
+        """The directory in which all generated files are stored"""
+        return self.directory + "tmp/"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def game_file(self, prop: str) -> str:
+        """The variability parity game generated for the given property"""
+        stem, _ = os.path.splitext(prop)
+        return self.tmp_directory + stem + ".svpg"
+
+    def flags(self, prop: str) -> list[str]:
+        """The additional solver arguments for the given property"""
+        stem, _ = os.path.splitext(os.path.basename(prop))
+        return self.solver_flags.get("*", []) + self.solver_flags.get(stem, [])
+
+def load_experiment(directory: str) -> Experiment | None:
+    """Reads the case in the given directory, or returns None if it is not a case.
+
+       Without a case.json the case consists of the only .mcrl2 file and all .mcf files in the directory."""
+    manifest = {}
+    manifest_file = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_file):
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    synthetic = manifest.get("synthetic")
+    spec = manifest.get("spec")
+    if spec is None and synthetic is not None:
+        # The name of the case identifies its results, since there is no specification.
+        spec = os.path.basename(os.path.normpath(directory))
+    if spec is None:
+        specs = sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, "*.mcrl2")))
+        if len(specs) != 1:
+            if specs:
+                raise ValueError(f"Case {directory} contains several specifications {specs}, choose one in {MANIFEST_NAME}")
+            return None
+        spec = specs[0]
+
+    properties = manifest.get("properties")
+    if properties is None and synthetic is not None:
+        properties = [f"seed{seed}" for seed in synthetic.get("seeds", [0])]
+    if properties is None:
+        properties = sorted(
+            (os.path.basename(path) for path in glob.glob(os.path.join(directory, "*.mcf"))),
+            key=natural_key,
+        )
+
+    return Experiment(
+        directory,
+        spec,
+        properties,
+        manifest.get("fd", "FD"),
+        manifest.get("actionrename", "actionrename"),
+        manifest.get("solver_flags"),
+        synthetic,
+    )
+
+def discover_experiments(cases_path: str = CASES_PATH) -> list[Experiment]:
+    """Returns all cases in the subdirectories of the given directory"""
+    experiments = []
+    for directory in sorted(glob.glob(os.path.join(cases_path, "*", ""))):
+        experiment = load_experiment(directory)
+        if experiment is not None:
+            experiments.append(experiment)
+
+    return experiments
+
+def matches(name: str, patterns: list[str] | None) -> bool:
+    """Returns true iff no patterns are given or the name matches one of the glob patterns"""
+    return patterns is None or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+def add_filter_arguments(parser, variants: bool = True):
+    """Adds the --case, --property and optionally --variant filters to the argument parser"""
+    parser.add_argument(
+        "--case", action="append", type=str, default=None,
+        help="Only uses the cases whose directory name matches this glob pattern, can be repeated",
+    )
+    parser.add_argument(
+        "--property", action="append", type=str, default=None,
+        help="Only uses the properties whose name without extension matches this glob pattern, can be repeated",
+    )
+    if variants:
+        parser.add_argument(
+            "--variant", action="append", type=str, default=None,
+            help="Only uses the solve variants that match this glob pattern, can be repeated",
+        )
+
+def select_experiments(args, cases_path: str = CASES_PATH) -> list[tuple[Experiment, list[str]]]:
+    """Returns the discovered cases that match the filters, each with its matching properties"""
+    selected = []
+    for experiment in discover_experiments(cases_path):
+        if not matches(experiment.name, getattr(args, "case", None)):
+            continue
+
+        properties = [
+            prop for prop in experiment.properties
+            if matches(os.path.splitext(prop)[0], getattr(args, "property", None))
+        ]
+        if properties:
+            selected.append((experiment, properties))
+
+    return selected
+
+def select_variants(args, variants: list[str]) -> list[str]:
+    """Returns the variants that match the filters"""
+    return [variant for variant in variants if matches(variant, getattr(args, "variant", None))]
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import shutil
+
+from benchstats import StoppingRule
+from fd import read_fd
+from library import MyLogger
+from manifest import Experiment, add_filter_arguments, select_experiments, select_variants
+from prepare import CACHE_PATH, prepare
+from run import SolveOptions, find_binary, run_experiment
+
+# Matches the feature of every decision node in the feature diagram, in the order in which they are written.
+node_regex = re.compile(r"node\(\s*([^,\s()]+)")
+
+def read_order(fd_file: str) -> list[str]:
+    """Returns the feature order on the first line of the feature diagram"""
+    return read_fd(fd_file).features
+
+def write_fd(fd_file: str, out_file: str, order: list[str]):
+    """Writes the feature diagram with the features in the given order, where the decision nodes are
+       reordered accordingly"""
+    diagram = read_fd(fd_file).reorder(order)
+    with open(out_file, "w", encoding="utf-8") as f:
+        f.write(diagram.serialise())
+
+def structure_order(fd_file: str, order: list[str]) -> list[str]:
+    """Orders the features by their first occurrence in a depth-first traversal of the diagram, which keeps
+       the features that are decided together close to each other. Features that do not occur are kept last."""
+    with open(fd_file, encoding="utf-8") as f:
+        f.readline()
+        diagram = f.read()
+
+    result = []
+    for match in node_regex.finditer(diagram):
+        feature = match.group(1)
+        if feature in order and feature not in result:
+            result.append(feature)
+
+    return result + [feature for feature in order if feature not in result]
+
+def frequency_order(fd_file: str, order: list[str]) -> list[str]:
+    """Orders the features by how often they are decided in the diagram, most frequent first"""
+    with open(fd_file, encoding="utf-8") as f:
+        f.readline()
+        counts: dict[str, int] = {}
+        for match in node_regex.finditer(f.read()):
+            counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+
+    return sorted(order, key=lambda feature: -counts.get(feature, 0))
+
+def initial_orders(fd_file: str) -> list[list[str]]:
+    """Returns the given order followed by the distinct orders derived from the structure of the diagram"""
+    order = read_order(fd_file)
+
+    orders = []
+    for candidate in [order, structure_order(fd_file, order), frequency_order(fd_file, order), order[::-1]]:
+        if candidate not in orders:
+            orders.append(candidate)
+
+    return orders
+
+def moves(order: list[str], feature: str, window: int) -> list[list[str]]:
+    """Returns the orders in which the feature is moved to every other position within the window, nearest first"""
+    index = order.index(feature)
+    rest = order[:index] + order[index + 1:]
+
+    result = []
+    for distance in range(1, window + 1):
+        for position in (index - distance, index + distance):
+            if 0 <= position <= len(rest):
+                result.append(rest[:position] + [feature] + rest[position:])
+
+    return result
+
+class OrderSearch:
+    """Searches for the feature order with which the family solvers solve the properties of a case fastest.
+
+       Every order is evaluated on a copy of the case with the rewritten feature diagram, whose games are
+       generated by prepare and solved by run_experiment. The cost of an order is the sum of the median
+       solving times of all properties and variants, and a run that takes longer than the timeout factor
+       times the best time of its game so far is stopped."""
+
+    def __init__(
+        self,
+        logger: MyLogger,
+        experiment: Experiment,
+        properties: list[str],
+        variants: list[str],
+        bins: tuple[str, str, str],
+        output_dir: str,
+        rule: StoppingRule,
+        options: SolveOptions,
+        timeout_factor: float,
+        jobs: int = 1,
+        cache_directory: str = CACHE_PATH,
+    ):
+        self.logger = logger
+        self.experiment = experiment
+        self.properties = properties
+        self.variants = variants
+        self.bins = bins
+        self.output_dir = output_dir
+        self.rule = rule
+        self.options = options
+        self.timeout_factor = timeout_factor
+        self.jobs = jobs
+        self.cache_directory = cache_directory
+
+        # The cost of every evaluated order, and the best time of every game and variant.
+        self.costs: dict[tuple[str, ...], float] = {}
+        self.best_times: dict[tuple[str, str], float] = {}
+        self.evaluations: list[dict] = []
+
+    def trial_experiment(self, order: list[str]) -> Experiment:
+        """Copies the case into a new directory in the output, with the feature diagram in the given order"""
+        directory = os.path.join(self.output_dir, self.experiment.name, str(len(self.evaluations)))
+        os.makedirs(directory, exist_ok=True)
+
+        for name in [self.experiment.spec, self.experiment.actionrename, *self.properties]:
+            shutil.copyfile(self.experiment.path(name), os.path.join(directory, name))
+        write_fd(self.experiment.path(self.experiment.fd), os.path.join(directory, "FD"), order)
+
+        return Experiment(directory, self.experiment.spec, self.properties, "FD", self.experiment.actionrename, self.experiment.solver_flags)
+
+    def evaluate(self, order: list[str]) -> float:
+        """Returns the cost of the order, which is infinite when a run failed or was stopped"""
+        key = tuple(order)
+        if key in self.costs:
+            return self.costs[key]
+
+        self.logger.info(f"Evaluating order {','.join(order)} of {self.experiment.name}")
+        try:
+            trial = self.trial_experiment(order)
+        except ValueError as e:
+            # The feature diagram in this order is too large to write.
+            self.logger.warning(f"Skipping order {','.join(order)} of {self.experiment.name}: {e}")
+            self.costs[key] = math.inf
+            self.evaluations.append({"order": order, "cost": None, "directory": None})
+            return math.inf
+
+        mcrl22lps_bin, lps2lts_bin, merc_vpg_bin = self.bins
+        prepare(trial, self.properties, self.logger, mcrl22lps_bin, lps2lts_bin, merc_vpg_bin, self.jobs, self.cache_directory)
+
+        cost = 0.0
+        times = {}
+        for prop in self.properties:
+            file = trial.game_file(prop)
+            options = SolveOptions(
+                self.options.sample_interval_ms,
+                self.options.timeout,
+                self.options.memory_limit_mb,
+                self.options.cpu_limit_s,
+                solutions=False,
+                flags={file: trial.flags(prop)},
+                capacities=self.options.capacities,
+            )
+
+            for variant in self.variants:
+                options.timeout = self.options.timeout
+                best = self.best_times.get((prop, variant))
+                if best is not None:
+                    limit = max(1.0, self.timeout_factor * best)
+                    options.timeout = limit if options.timeout is None else min(options.timeout, limit)
+
+                result = run_experiment(
+                    self.logger, merc_vpg_bin, trial.spec, file, variant, trial.directory, options, self.rule
+                )
+                statistics = result["statistics"]["times"]
+                if statistics is None or any(outcome != "ok" for outcome in result["outcomes"]):
+                    cost = math.inf
+                    break
+
+                times[(prop, variant)] = statistics["value"]
+                cost += statistics["value"]
+
+            if cost == math.inf:
+                break
+
+        # The best times only improve with an order that is better overall, such that the timeouts stay fair.
+        if cost < min(self.costs.values(), default=math.inf):
+            self.best_times = times
+
+        self.costs[key] = cost
+        self.evaluations.append({"order": order, "cost": cost if cost < math.inf else None, "directory": trial.directory})
+        self.logger.info(f"Order {','.join(order)} of {self.experiment.name} costs {cost:.3f}s")
+        return cost
+
+    def search(self, max_evaluations: int, window: int) -> tuple[list[str], float]:
+        """Evaluates the initial orders, and then moves every feature to the best position within the window
+           around its current position, like sifting, until no move improves or the evaluations are exhausted"""
+        fd_file = self.experiment.path(self.experiment.fd)
+        best, best_cost = None, math.inf
+        for order in initial_orders(fd_file):
+            if len(self.evaluations) >= max_evaluations:
+                break
+
+            cost = self.evaluate(order)
+            if best is None or cost < best_cost:
+                best, best_cost = order, cost
+
+        # The features that are decided most often are moved first, since they affect the size of most guards.
+        improved = True
+        while improved and len(self.evaluations) < max_evaluations:
+            improved = False
+            for feature in frequency_order(fd_file, best):
+                for order in moves(best, feature, window):
+                    if len(self.evaluations) >= max_evaluations:
+                        break
+
+                    cost = self.evaluate(order)
+                    if cost < best_cost:
+                        best, best_cost = order, cost
+                        improved = True
+                        break
+
+        return best, best_cost
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="order_search.py",
+        description="Searches for the feature order in the feature diagram with which the family solvers are fastest.",
+        epilog="",
+    )
+
+    parser.add_argument(dest="mcrl2_binpath", action="store", type=str)
+    parser.add_argument(dest="merc_binpath", action="store", type=str)
+    parser.add_argument(dest="output", action="store", type=str)
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "--max-evaluations", action="store", type=int, default=30,
+        help="Maximum number of feature orders evaluated per case",
+    )
+    parser.add_argument(
+        "--window", action="store", type=int, default=2,
+        help="Maximum number of positions a feature is moved in a single step of the local search",
+    )
+    parser.add_argument(
+        "--timeout-factor", action="store", type=float, default=2.0,
+        help="Stops a run that takes longer than this factor times the best time of its game so far",
+    )
+    parser.add_argument("--timeout", action="store", type=float, default=None, help="Wall-clock time limit per run")
+    parser.add_argument("--memory-limit-mb", action="store", type=int, default=None)
+    parser.add_argument("--warmup", action="store", type=int, default=0)
+    parser.add_argument("--min-runs", action="store", type=int, default=1)
+    parser.add_argument("--max-runs", action="store", type=int, default=3)
+    parser.add_argument("--ci-width", action="store", type=float, default=0.05)
+    parser.add_argument(
+        "--apply", action="store_true",
+        help="Writes the best order to the feature diagram of the case when it is faster than the current one",
+    )
+    parser.add_argument("--jobs", action="store", type=int, default=1, help="Number of preparation steps to run concurrently")
+    parser.add_argument(
+        "--cache-dir", action="store", type=str, default=CACHE_PATH,
+        help="Directory in which the generated files are cached by the content of their inputs",
+    )
+
+    args = parser.parse_args()
+
+    bins = (
+        shutil.which("mcrl22lps", path=args.mcrl2_binpath),
+        shutil.which("lps2lts", path=args.mcrl2_binpath),
+        find_binary(args.merc_binpath),
+    )
+    if None in bins:
+        logging.error(f"Could not find one of the required binaries {bins}")
+        exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = MyLogger("main", os.path.join(args.output, "order_search.log"))
+
+    # Only the family solvers depend on the feature order.
+    variants = select_variants(args, ["family", "family-optimised-left"])
+    rule = StoppingRule(args.warmup, args.min_runs, args.max_runs, args.ci_width)
+    options = SolveOptions(timeout=args.timeout, memory_limit_mb=args.memory_limit_mb)
+
+    for experiment, properties in select_experiments(args):
+        search = OrderSearch(
+            logger, experiment, properties, variants, bins, args.output, rule, options,
+            args.timeout_factor, args.jobs, args.cache_dir,
+        )
+        best, cost = search.search(args.max_evaluations, args.window)
+
+        fd_file = experiment.path(experiment.fd)
+        current = read_order(fd_file)
+        logger.info(
+            f"Best order of {experiment.name} is {','.join(best)} with {cost:.3f}s, "
+            f"the current order takes {search.costs.get(tuple(current), math.inf):.3f}s"
+        )
+
+        with open(os.path.join(args.output, "orders.json"), "a", encoding="utf-8") as f:
+            json.dump({
+                "case": experiment.name,
+                "properties": properties,
+                "variants": variants,
+                "order": best,
+                "cost": cost if cost < math.inf else None,
+                "evaluations": search.evaluations,
+            }, f)
+            f.write("\n")
+
+        if args.apply and best != current and cost < search.costs.get(tuple(current), math.inf):
+            logger.info(f"Writing order {','.join(best)} to {fd_file}")
+            write_fd(fd_file, fd_file + ".tmp", best)
+            os.replace(fd_file + ".tmp", fd_file)
+
+if __name__ == "__main__":
+    main()
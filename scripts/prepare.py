@@ -5,85 +5,43 @@ import argparse
 import logging
 import json
 import shutil
-import re
 
 from typing import List
-from library import run_program, MyLogger
-
-# A regex matching in=out
-mapping_regex = re.compile(r"(.*)=(.*)")
-
-# A regex matching a transition in the aut format '(from, action, to)'
-transition_regex = re.compile(r"\(([0-9]*),\"(.*)\",([0-9]*)\)")
+from buildcache import BuildGraph, Task
+from library import MyLogger
+from manifest import Experiment, add_filter_arguments, select_experiments
+from relabel import Relabeller, read_mapping, relabel
+from synthetic import add_synthetic_tasks
 
 SCRIPT_PATH=os.path.dirname(os.path.abspath(__file__))
 
-EXPERIMENTS = [
-    (
-        os.path.join(SCRIPT_PATH, "../cases/elevator/"),
-        "elevator.mcrl2",
-        [
-            "property1.mcf",
-            "property2.mcf",
-            "property3.mcf",
-            "property4.mcf",
-            "property5.mcf",
-            "property6.mcf",
-            "property7.mcf",
-        ],
-    ),
-    (
-        os.path.join(SCRIPT_PATH, "../cases/minepump/"),
-        "minepump_fts.mcrl2",
-        [
-            "phi1.mcf",
-            "phi2.mcf",
-            "phi3.mcf",
-            "phi4.mcf",
-            "phi5.mcf",
-            "phi6.mcf",
-            "phi7.mcf",
-            "phi8.mcf",
-            "phi9.mcf",
-        ],
-    ),
-    (
-        os.path.join(SCRIPT_PATH, "../cases/vending_machine/"),
-        "VendingMachine.mcrl2",
-        [
-            "property1.mcf",
-            "property2.mcf",
-            "property3.mcf",
-            "property4.mcf",
-            "property5.mcf",
-            "property6.mcf",
-            "property7.mcf",
-            "property8.mcf",
-        ],
-    ),
-]
+# The directory in which the outputs of all preparation steps are cached by content.
+CACHE_PATH=os.path.join(SCRIPT_PATH, "../.cache/")
 
-def is_newer(inputfile: str, outputfile: str, ignore=False) -> bool:
-    """Returns true iff the input file is newer than the output file"""
-    if ignore:
-        return True
+def rename_actions(aut_file: str, actionrename_file: str, aut_renamed_file: str, logger: MyLogger, jobs: int = 1):
+    """Renames the action labels in the aut file based on the mapping in the actionrename file"""
+    mapping = read_mapping(actionrename_file)
+    logger.debug("renaming applied: %s", mapping)
 
-    try:
-        return os.path.getmtime(inputfile) > os.path.getmtime(outputfile)
-    except OSError:
-        return True
+    relabel(aut_file, aut_renamed_file, Relabeller(mapping), jobs)
 
-def prepare(
-    directory: str,
-    tmp_directory: str,
-    mcrl2_name: str,
+def add_prepare_tasks(
+    graph: BuildGraph,
+    experiment: Experiment,
     properties: List[str],
     logger: MyLogger,
     mcrl22lps_bin: str,
     lps2lts_bin: str,
-    merc_vpg_bin: str
-):
-    """Prepares the parity games for one experiment, consisting of an mCRL2 specification and several properties"""
+    merc_vpg_bin: str,
+    jobs: int = 1,
+) -> list[str]:
+    """Adds the tasks that generate the parity games for one experiment to the build graph, and returns the game files"""
+    if experiment.synthetic is not None:
+        return add_synthetic_tasks(graph, experiment, properties)
+
+    directory = experiment.directory
+    tmp_directory = experiment.tmp_directory
+    mcrl2_name = experiment.spec
 
     # Ensure that tmp directory exists since the mCRL2 tools cannot make it
     try:
@@ -97,70 +55,82 @@ def prepare(
     lps_file = os.path.join(tmp_directory, base + ".lps")
     aut_file = os.path.join(tmp_directory, base + ".aut")
 
-    if is_newer(mcrl2_file, lps_file):
-        run_program([mcrl22lps_bin, "--verbose", mcrl2_file, lps_file], logger)
-    if is_newer(lps_file, aut_file):
-        run_program([lps2lts_bin, "--verbose", lps_file, aut_file], logger)
+    graph.add(Task(
+        f"{os.path.basename(lps_file)}",
+        outputs=[lps_file],
+        inputs=[mcrl2_file],
+        command=[mcrl22lps_bin, "--verbose", mcrl2_file, lps_file],
+        tools=[mcrl22lps_bin],
+    ))
+    graph.add(Task(
+        f"{os.path.basename(aut_file)}",
+        outputs=[aut_file],
+        inputs=[lps_file],
+        command=[lps2lts_bin, "--verbose", lps_file, aut_file],
+        tools=[lps2lts_bin],
+    ))
 
     # Convert the actions in the .aut files to move features from the data into the action label.
-    # File contains from=to per line for each action.
-    mapping = {}
-
-    # Indicates that the .aut file has been generated.
-    actionrename_file = os.path.join(directory, "actionrename")
-    aut_renamed_file = os.path.join(tmp_directory, base + ".renamed.aut")
-
-    if is_newer(actionrename_file, aut_renamed_file) or is_newer(
-        aut_file, aut_renamed_file
-    ):
-        with open(actionrename_file, encoding="utf-8") as file:
-            for line in file.readlines():
-                result = mapping_regex.match(line)
-                if result is not None:
-                    mapping[result.group(1)] = result.group(2)
-
-        logger.debug("renaming applied: %s", mapping)
-
-        # Rename the action labels in the aut file based on the mapping computed above
-        with open(aut_renamed_file, "w", encoding="utf-8") as outfile:
-            with open(aut_file, encoding="utf-8") as file:
-                for line in file.readlines():
-                    result = transition_regex.match(line)
-                    if result is not None:
-                        action = result.group(2)
-                        action = mapping.get(action, action)
-                        outfile.write(
-                            f'({result.group(1)},"{action}",{result.group(3)})\n'
-                        )
-                    else:
-                        outfile.write(line)
+    actionrename_file = experiment.path(experiment.actionrename)
+    aut_renamed_file = renamed_aut_file(experiment)
+
+    graph.add(Task(
+        f"{os.path.basename(aut_renamed_file)}",
+        outputs=[aut_renamed_file],
+        inputs=[aut_file, actionrename_file],
+        action=lambda task: rename_actions(aut_file, actionrename_file, aut_renamed_file, logger, jobs),
+        salt="rename_actions-2",
+    ))
 
     # Generate the SVPG for every property
-    featurediagram_file = os.path.join(directory, "FD")
+    featurediagram_file = experiment.path(experiment.fd)
 
+    game_files = []
     for prop in properties:
         mcf_file = os.path.join(directory, prop)
-        prop, _ = os.path.splitext(prop)
-        game_file = os.path.join(tmp_directory, prop + ".svpg")
-
-        name = f"{os.path.basename(aut_file)} and {os.path.basename(mcf_file)}"
-        if (
-            is_newer(featurediagram_file, game_file)
-            or is_newer(aut_renamed_file, game_file)
-            or is_newer(mcf_file, game_file)
-        ):
-            logger.info(f"Generating parity game for {name}")
-            run_program(
-                [
-                    merc_vpg_bin,
-                    "translate-vpg",
-                    featurediagram_file,
-                    aut_renamed_file,
-                    mcf_file,
-                    game_file,
-                ],
-                logger,
-            )
+        game_file = experiment.game_file(prop)
+        add_game_task(graph, merc_vpg_bin, featurediagram_file, aut_renamed_file, mcf_file, game_file)
+        game_files.append(game_file)
+
+    return game_files
+
+def renamed_aut_file(experiment: Experiment) -> str:
+    """The state space of the specification with the features moved into the action labels"""
+    base, _ = os.path.splitext(experiment.spec)
+    return os.path.join(experiment.tmp_directory, base + ".renamed.aut")
+
+def add_game_task(graph: BuildGraph, merc_vpg_bin: str, featurediagram_file: str, aut_renamed_file: str, mcf_file: str, game_file: str):
+    """Adds the task that translates the state space and property into a variability parity game"""
+    graph.add(Task(
+        f"parity game {os.path.basename(game_file)} for {os.path.basename(aut_renamed_file)} and {os.path.basename(mcf_file)}",
+        outputs=[game_file],
+        inputs=[featurediagram_file, aut_renamed_file, mcf_file],
+        command=[
+            merc_vpg_bin,
+            "translate-vpg",
+            featurediagram_file,
+            aut_renamed_file,
+            mcf_file,
+            game_file,
+        ],
+        tools=[merc_vpg_bin],
+    ))
+
+def prepare(
+    experiment: Experiment,
+    properties: List[str],
+    logger: MyLogger,
+    mcrl22lps_bin: str,
+    lps2lts_bin: str,
+    merc_vpg_bin: str,
+    jobs: int = 1,
+    cache_directory: str = CACHE_PATH,
+) -> list[str]:
+    """Prepares the parity games for one experiment, consisting of an mCRL2 specification and several properties"""
+    graph = BuildGraph(cache_directory, logger)
+    game_files = add_prepare_tasks(graph, experiment, properties, logger, mcrl22lps_bin, lps2lts_bin, merc_vpg_bin, jobs)
+    graph.run(jobs)
+    return game_files
 
 def main():
     """The main function"""
@@ -176,6 +146,15 @@ def main():
         dest="mcrl2_binpath", action="store", type=str
     )
     parser.add_argument(dest="merc_binpath", action="store", type=str)
+    parser.add_argument(
+        "--jobs", action="store", type=int, default=1,
+        help="Number of independent preparation steps to run concurrently",
+    )
+    parser.add_argument(
+        "--cache-dir", action="store", type=str, default=CACHE_PATH,
+        help="Directory in which the generated files are cached by the content of their inputs",
+    )
+    add_filter_arguments(parser, variants=False)
 
     args = parser.parse_args()
 
@@ -188,15 +167,14 @@ def main():
 
     logger = MyLogger("main", "prepare.log")
 
-    # Prepare the variability parity games for all the properties and specifications.
-    for experiment in EXPERIMENTS:
-        directory, mcrl2_name, properties = experiment
-
-        # The directory in which to store all generated files
-        tmp_directory = directory + "tmp/"
+    # Prepare the variability parity games for all the properties and specifications in a single graph,
+    # such that the experiments are prepared concurrently.
+    graph = BuildGraph(args.cache_dir, logger)
+    for experiment, properties in select_experiments(args):
+        logger.info("Adding preparation for experiment '%s'...", experiment.directory)
+        add_prepare_tasks(graph, experiment, properties, logger, mcrl22lps_bin, lps2lts_bin, merc_vpg_bin, args.jobs)
 
-        logger.info("Starting preparation for experiment '%s'...", directory)
-        prepare(directory, tmp_directory, mcrl2_name, properties, logger, mcrl22lps_bin, lps2lts_bin, merc_vpg_bin)
+    graph.run(args.jobs)
 
 
 if __name__ == "__main__":
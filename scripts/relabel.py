@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import argparse
+import gzip
+import mmap
+import os
+import re
+import shutil
+
+from concurrent.futures import ProcessPoolExecutor
+
+# A regex matching in=out
+mapping_regex = re.compile(r"(.*)=(.*)")
+
+# A regex matching the parameters of an action, including the brackets
+parameters_regex = re.compile(rb"\(.*\)")
+
+# The size of the blocks that are read and relabelled at once.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Files smaller than this are not worth splitting over several processes.
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+def read_mapping(actionrename_file: str) -> dict[str, str]:
+    """Reads the action renaming, which contains from=to per line for each action"""
+    mapping = {}
+
+    with open(actionrename_file, encoding="utf-8") as file:
+        for line in file:
+            result = mapping_regex.match(line)
+            if result is not None:
+                mapping[result.group(1)] = result.group(2)
+
+    return mapping
+
+class Relabeller:
+    """Rewrites action labels, every distinct label is rewritten only once and then looked up in a table.
+
+       Labels are first renamed by the mapping, and then optionally stripped of their parameters."""
+
+    def __init__(self, mapping: dict[str, str] | None = None, strip_parameters: bool = False):
+        self.mapping = {
+            key.encode("utf-8"): value.encode("utf-8") for key, value in (mapping or {}).items()
+        }
+        self.strip_parameters = strip_parameters
+        self.table: dict[bytes, bytes] = {}
+
+    def rewrite(self, label: bytes) -> bytes:
+        """Returns the new label for the given label"""
+        label = self.mapping.get(label, label)
+        if self.strip_parameters:
+            label = parameters_regex.sub(b"", label)
+        return label
+
+    def __call__(self, chunk: bytes) -> bytes:
+        """Relabels a chunk of complete lines of an .aut file.
+
+           The chunk is split on the quotes around labels, so every odd part is a label
+           and the whole chunk is relabelled with table lookups only."""
+
+        # Normalise the transitions '(from, "action", to)' to '(from,"action",to)'.
+        chunk = chunk.replace(b', "', b',"').replace(b'", ', b'",')
+
+        parts = chunk.split(b'"')
+        labels = parts[1::2]
+
+        for label in set(labels).difference(self.table):
+            self.table[label] = self.rewrite(label)
+
+        parts[1::2] = map(self.table.__getitem__, labels)
+        return b'"'.join(parts)
+
+def open_aut(filename: str, mode: str):
+    """Opens an .aut file in binary mode, transparently (de)compressing files ending in .gz"""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "b", compresslevel=6)
+
+    return open(filename, mode + "b")
+
+def relabel_stream(infile, outfile, relabeller: Relabeller, chunk_size: int = CHUNK_SIZE):
+    """Relabels all transitions read from infile and writes them to outfile"""
+    remainder = b""
+    while chunk := infile.read(chunk_size):
+        chunk = remainder + chunk
+
+        end = chunk.rfind(b"\n") + 1
+        remainder = chunk[end:]
+        outfile.write(relabeller(chunk[:end]))
+
+    outfile.write(relabeller(remainder))
+
+def relabel_range(input_file: str, part_file: str, begin: int, end: int, relabeller: Relabeller):
+    """Relabels the lines in the byte range [begin, end) of the input file, and writes them to the part file"""
+    with open(input_file, "rb") as file, open_aut(part_file, "w") as outfile:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = begin
+            while offset < end:
+                chunk = data[offset:min(offset + CHUNK_SIZE, end)]
+                if offset + len(chunk) < end:
+                    # Only relabel complete lines, the rest is part of the next chunk.
+                    chunk = chunk[:chunk.rfind(b"\n") + 1] or chunk
+
+                outfile.write(relabeller(chunk))
+                offset += len(chunk)
+
+def split_lines(input_file: str, parts: int) -> list[int]:
+    """Returns the offsets that split the file into roughly equal parts at line boundaries"""
+    size = os.path.getsize(input_file)
+    offsets = [0]
+
+    with open(input_file, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for i in range(1, parts):
+                offset = data.find(b"\n", max(offsets[-1], size * i // parts))
+                if offset == -1:
+                    break
+                offsets.append(offset + 1)
+
+    offsets.append(size)
+    return offsets
+
+def relabel(input_file: str, output_file: str, relabeller: Relabeller, processes: int = 1):
+    """Relabels the .aut input file into the output file.
+
+       Large uncompressed inputs are split at line boundaries and relabelled by several processes,
+       where the chunk boundaries are chosen such that each chunk consists of complete lines."""
+
+    if processes <= 1 or input_file.endswith(".gz") or os.path.getsize(input_file) < PARALLEL_THRESHOLD:
+        with open_aut(input_file, "r") as infile, open_aut(output_file, "w") as outfile:
+            relabel_stream(infile, outfile, relabeller)
+        return
+
+    # Relabel every range into a separate part, concatenated gzip members are a valid gzip file. The parts
+    # of a compressed output must end in .gz themselves, since open_aut only compresses those.
+    offsets = split_lines(input_file, processes)
+    suffix = ".gz" if output_file.endswith(".gz") else ""
+    part_files = [f"{output_file}.part{i}{suffix}" for i in range(len(offsets) - 1)]
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(relabel_range, input_file, part_file, begin, end, relabeller)
+                for part_file, begin, end in zip(part_files, offsets, offsets[1:])
+            ]
+            for future in futures:
+                future.result()
+
+        with open(output_file, "wb") as outfile:
+            for part_file in part_files:
+                with open(part_file, "rb") as infile:
+                    shutil.copyfileobj(infile, outfile, CHUNK_SIZE)
+    finally:
+        for part_file in part_files:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="relabel.py",
+        description="Relabels the actions of an .aut file, files ending in .gz are (de)compressed transparently.",
+        epilog="",
+    )
+
+    parser.add_argument(dest="input", action="store", type=str)
+    parser.add_argument(dest="output", action="store", type=str)
+    parser.add_argument("--actionrename", action="store", type=str, help="File with a from=to mapping per line")
+    parser.add_argument("--strip-parameters", action="store_true", help="Removes the action parameters between brackets")
+    parser.add_argument("--processes", action="store", type=int, default=1)
+
+    args = parser.parse_args()
+
+    mapping = read_mapping(args.actionrename) if args.actionrename is not None else {}
+    relabel(args.input, args.output, Relabeller(mapping, args.strip_parameters), args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sqlite3
+import sys
+
+from benchstats import summarise
+from solution import add_solution, encode_solution, load_solutions
+from tables import FORMATS, write_table
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    property TEXT NOT NULL,
+    file TEXT NOT NULL,
+    solve_variant TEXT NOT NULL,
+    binary TEXT,
+    statistics TEXT,
+    extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_case ON runs (experiment, property, solve_variant);
+
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    repetition INTEGER NOT NULL,
+    outcome TEXT,
+    time REAL,
+    project_time REAL,
+    reachable_time REAL,
+    solution INTEGER,
+    measurement TEXT,
+    timeline TEXT,
+    raw_output TEXT,
+    PRIMARY KEY (run_id, repetition)
+);
+
+CREATE TABLE IF NOT EXISTS recursive_calls (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    repetition INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (run_id, repetition, position)
+);
+
+CREATE TABLE IF NOT EXISTS solutions (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    idx INTEGER NOT NULL,
+    encoded TEXT NOT NULL,
+    PRIMARY KEY (run_id, idx)
+);
+"""
+
+# The keys of a results.json entry that are stored in their own columns or tables, all others are kept in runs.extra.
+STORED_KEYS = {
+    "experiment", "file", "solve_variant", "statistics", "times", "project_times", "reachable_times",
+    "recursive_calls", "outcomes", "measurements", "timelines", "raw_outputs", "solution", "solutions",
+    "solution_runs", "binary",
+}
+
+# The per-repetition columns of the timings table and the results.json keys they correspond to.
+TIMING_COLUMNS = {
+    "times": "time",
+    "project_times": "project_time",
+    "reachable_times": "reachable_time",
+    "outcomes": "outcome",
+    "measurements": "measurement",
+    "timelines": "timeline",
+    "raw_outputs": "raw_output",
+}
+
+# Columns of the timings table that contain JSON.
+JSON_COLUMNS = {"measurement"}
+
+def is_database(path: str) -> bool:
+    """Returns true iff the file is an SQLite database, rather than a JSON lines file"""
+    with open(path, "rb") as f:
+        return f.read(16) == b"SQLite format 3\0"
+
+def property_name(file: str) -> str:
+    """The property of a game, which is the name of the .svpg file"""
+    return file.replace("\\", "/").rsplit("/", 1)[-1]
+
+def normalise_solutions(result: dict) -> tuple[list[dict], list[int]]:
+    """Returns the distinct encoded solutions and the index of every repetition, converting results in the old format"""
+    if "solutions" in result:
+        return result["solutions"], result["solution_runs"]
+
+    converted: dict = {"solutions": [], "solution_runs": []}
+    for solution in load_solutions(result):
+        add_solution(converted, encode_solution({
+            product: {"0": even, "1": odd} for product, (even, odd) in solution.items()
+        }))
+
+    return converted["solutions"], converted["solution_runs"]
+
+class ResultsStore:
+    """Stores the entries of results.json in an indexed SQLite database.
+
+       Every entry is a row in runs, with one row per repetition in timings, one row per reported number of
+       recursive calls in recursive_calls, and the distinct solutions of the entry in solutions."""
+
+    def __init__(self, filename: str = ":memory:"):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+
+        # Databases created before results were labelled with their binary lack the column.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(runs)")]
+        if "binary" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE runs ADD COLUMN binary TEXT")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def insert(self, result: dict, solutions: bool = True) -> int:
+        """Inserts a results.json entry without committing, and returns its id"""
+        extra = {key: value for key, value in result.items() if key not in STORED_KEYS}
+        statistics = result.get("statistics")
+
+        cursor = self.connection.execute(
+            "INSERT INTO runs (experiment, property, file, solve_variant, binary, statistics, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                result["experiment"],
+                property_name(result["file"]),
+                result["file"],
+                result["solve_variant"],
+                result.get("binary"),
+                json.dumps(statistics) if statistics is not None else None,
+                json.dumps(extra),
+            ),
+        )
+        run_id = cursor.lastrowid
+        assert run_id is not None
+
+        if solutions:
+            encoded, solution_runs = normalise_solutions(result)
+            self.connection.executemany(
+                "INSERT INTO solutions (run_id, idx, encoded) VALUES (?, ?, ?)",
+                ((run_id, index, json.dumps(solution)) for index, solution in enumerate(encoded)),
+            )
+        else:
+            solution_runs = []
+
+        def value(key: str, repetition: int):
+            values = result.get(key, [])
+            if repetition >= len(values) or values[repetition] is None:
+                return None
+            return json.dumps(values[repetition]) if TIMING_COLUMNS[key] in JSON_COLUMNS else values[repetition]
+
+        self.connection.executemany(
+            f"INSERT INTO timings (run_id, repetition, solution, {', '.join(TIMING_COLUMNS.values())}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(TIMING_COLUMNS))})",
+            (
+                (
+                    run_id,
+                    repetition,
+                    solution_runs[repetition] if repetition < len(solution_runs) else None,
+                    *(value(key, repetition) for key in TIMING_COLUMNS),
+                )
+                for repetition in range(len(result["times"]))
+            ),
+        )
+
+        self.connection.executemany(
+            "INSERT INTO recursive_calls (run_id, repetition, position, calls) VALUES (?, ?, ?, ?)",
+            (
+                (run_id, repetition, position, calls)
+                for repetition, values in enumerate(result.get("recursive_calls", []))
+                for position, calls in enumerate(values)
+            ),
+        )
+
+        return run_id
+
+    def add(self, result: dict):
+        """Inserts a results.json entry and commits it"""
+        with self.connection:
+            self.insert(result)
+
+    def remove(self, keys: list[str]):
+        """Removes the runs with the given job keys, as stored by run.py"""
+        removed = set(keys)
+        run_ids = [
+            (run_id,) for run_id, extra in self.connection.execute("SELECT id, extra FROM runs")
+            if json.loads(extra).get("key") in removed
+        ]
+
+        with self.connection:
+            for table in ["timings", "recursive_calls", "solutions"]:
+                self.connection.executemany(f"DELETE FROM {table} WHERE run_id = ?", run_ids)
+            self.connection.executemany("DELETE FROM runs WHERE id = ?", run_ids)
+
+    def import_json(self, path: str, solutions: bool = True) -> int:
+        """Imports all entries of a results.json file, and returns the number of entries"""
+        count = 0
+        with self.connection, open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.insert(json.loads(line), solutions)
+                    count += 1
+
+        return count
+
+    def export_json(self, path: str):
+        """Writes every run as a separate entry in the results.json format"""
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in self.entries(merge=False):
+                json.dump(entry, f)
+                f.write("\n")
+
+    def entries(
+        self,
+        fields: set[str] | None = None,
+        variants: list[str] | None = None,
+        merge: bool = True,
+        binary: str | None = None,
+    ):
+        """Yields results.json entries containing only the given fields, all fields if None, optionally only
+           those measured with the binary of the given label.
+
+           With merge the runs of the same experiment, property, variant and binary are combined into a single
+           entry in which the repetitions are concatenated, and the statistics recomputed."""
+        if fields is None:
+            fields = set(TIMING_COLUMNS) | {"statistics", "recursive_calls", "solutions", "extra"}
+
+        columns = [key for key in TIMING_COLUMNS if key in fields]
+        solutions = "solutions" in fields
+
+        query = "SELECT id, experiment, file, solve_variant, binary, statistics, extra FROM runs"
+        conditions = []
+        parameters: list[str] = []
+        if variants is not None:
+            conditions.append(f"solve_variant IN ({', '.join('?' * len(variants))})")
+            parameters.extend(variants)
+        if binary is not None:
+            conditions.append("binary = ?")
+            parameters.append(binary)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        runs = self.connection.execute(query + " ORDER BY id", parameters).fetchall()
+
+        entries: dict[int, dict] = {}
+        for run_id, experiment, file, variant, label, statistics, extra in runs:
+            entry = {"experiment": experiment, "file": file, "solve_variant": variant}
+            if label is not None:
+                entry["binary"] = label
+            if "extra" in fields:
+                entry.update(json.loads(extra))
+            entry.update({key: [] for key in columns})
+            if "recursive_calls" in fields:
+                entry["recursive_calls"] = []
+            if solutions:
+                entry["solutions"] = []
+                entry["solution_runs"] = []
+            if "statistics" in fields and statistics is not None:
+                entry["statistics"] = json.loads(statistics)
+            entries[run_id] = entry
+
+        if columns or solutions:
+            selected = [TIMING_COLUMNS[key] for key in columns] + (["solution"] if solutions else [])
+            for run_id, *values in self.connection.execute(
+                f"SELECT run_id, {', '.join(selected)} FROM timings ORDER BY run_id, repetition"
+            ):
+                entry = entries.get(run_id)
+                if entry is None:
+                    continue
+
+                for key, value in zip(columns, values):
+                    if value is not None and TIMING_COLUMNS[key] in JSON_COLUMNS:
+                        value = json.loads(value)
+                    entry[key].append(value)
+                if solutions:
+                    entry["solution_runs"].append(values[-1])
+
+        if "recursive_calls" in fields:
+            repetitions: dict[tuple[int, int], list[int]] = {}
+            for run_id, repetition, calls in self.connection.execute(
+                "SELECT run_id, repetition, calls FROM recursive_calls ORDER BY run_id, repetition, position"
+            ):
+                repetitions.setdefault((run_id, repetition), []).append(calls)
+
+            counts = dict(self.connection.execute("SELECT run_id, COUNT(*) FROM timings GROUP BY run_id"))
+            for run_id, entry in entries.items():
+                entry["recursive_calls"] = [
+                    repetitions.get((run_id, repetition), []) for repetition in range(counts.get(run_id, 0))
+                ]
+
+        if solutions:
+            for run_id, index, encoded in self.connection.execute(
+                "SELECT run_id, idx, encoded FROM solutions ORDER BY run_id, idx"
+            ):
+                if run_id in entries:
+                    entries[run_id]["solutions"].append(json.loads(encoded))
+
+        # Entries written before outcomes were recorded do not have them, nor the other per-run information.
+        for entry in entries.values():
+            if "outcomes" in entry and entry["times"] and all(outcome is None for outcome in entry["outcomes"]):
+                for key in ("outcomes", "measurements", "timelines", "raw_outputs"):
+                    entry.pop(key, None)
+
+        if not merge:
+            yield from entries.values()
+            return
+
+        merged: dict[tuple[str, str, str, str | None], list[dict]] = {}
+        for entry in entries.values():
+            key = (entry["experiment"], property_name(entry["file"]), entry["solve_variant"], entry.get("binary"))
+            merged.setdefault(key, []).append(entry)
+
+        for group in merged.values():
+            yield group[0] if len(group) == 1 else merge_entries(group)
+
+def merge_entries(group: list[dict]) -> dict:
+    """Combines the repetitions of several entries for the same experiment, property and variant"""
+    entry = {key: value for key, value in group[-1].items() if not isinstance(value, list)}
+
+    for other in group:
+        offset = len(entry.get("solutions", []))
+        for key, values in other.items():
+            if key == "solution_runs":
+                values = [index + offset if index is not None else None for index in values]
+            if isinstance(values, list):
+                entry.setdefault(key, []).extend(values)
+
+        # Entries without recorded outcomes only contain successful runs.
+        if "outcomes" not in other and "times" in other:
+            entry.setdefault("outcomes", []).extend("ok" for _ in other["times"])
+
+    if "statistics" in entry:
+        # The intervals are recomputed at the confidence level with which the entries were measured.
+        confidence = (entry["statistics"] or {}).get("confidence_level", 0.95)
+        entry["statistics"] = {"confidence_level": confidence}
+        for key in ["times", "project_times", "reachable_times"]:
+            if key in entry:
+                values = [
+                    value for value, outcome in zip(entry[key], entry["outcomes"])
+                    if value is not None and outcome == "ok"
+                ]
+                entry["statistics"][key] = summarise(values, confidence)
+
+        reached = [(other.get("statistics") or {}).get("target_reached") for other in group]
+        if any(value is not None for value in reached):
+            entry["statistics"]["target_reached"] = any(reached)
+
+    return entry
+
+def open_results(path: str, solutions: bool = False) -> ResultsStore:
+    """Opens a results database, or imports a results.json file into an in-memory database.
+
+       Solutions are only imported from a results.json file when requested."""
+    if is_database(path):
+        return ResultsStore(path)
+
+    store = ResultsStore()
+    store.import_json(path, solutions)
+    return store
+
+def load_cases(
+    path: str,
+    fields: set[str],
+    variants: list[str] | None = None,
+    binary: str | None = None,
+) -> dict[str, dict[str, dict[str, dict]]]:
+    """Returns the merged entries of a results file or database as experiment -> property -> variant -> entry.
+
+       Results measured with several labelled binaries must be restricted to one of them, since their entries
+       would otherwise replace each other."""
+    results: dict[str, dict[str, dict[str, dict]]] = {}
+
+    with open_results(path, "solutions" in fields) as store:
+        for entry in store.entries(fields, variants, binary=binary):
+            properties = results.setdefault(entry["experiment"], {}).setdefault(property_name(entry["file"]), {})
+            previous = properties.get(entry["solve_variant"])
+            if previous is not None and previous.get("binary") != entry.get("binary"):
+                raise ValueError(
+                    f"{path} contains results of {entry['experiment']} with variant {entry['solve_variant']} for the "
+                    f"binaries {previous.get('binary')} and {entry.get('binary')}, choose one with --binary"
+                )
+            properties[entry["solve_variant"]] = entry
+
+    return results
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="resultsdb.py",
+        description="Imports results.json files into an SQLite database, exports them again or summarises the timings.",
+        epilog="",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Adds the entries of results.json files to the database")
+    import_parser.add_argument(dest="database", action="store", type=str)
+    import_parser.add_argument(dest="inputs", action="store", type=str, nargs="+")
+
+    export_parser = subparsers.add_parser("export", help="Writes all entries of the database as a results.json file")
+    export_parser.add_argument(dest="database", action="store", type=str)
+    export_parser.add_argument(dest="output", action="store", type=str)
+
+    summary_parser = subparsers.add_parser("summary", help="Prints the solving time of every experiment, property and variant")
+    summary_parser.add_argument(dest="input", action="store", type=str, help="Database or results.json file")
+    summary_parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="markdown")
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        with ResultsStore(args.database) as store:
+            for path in args.inputs:
+                print(f"Imported {store.import_json(path)} entries from {path}", file=sys.stderr)
+    elif args.command == "export":
+        with ResultsStore(args.database) as store:
+            store.export_json(args.output)
+    else:
+        rows = []
+        with open_results(args.input) as store:
+            for entry in store.entries({"times", "outcomes", "statistics"}):
+                statistics = entry.get("statistics", {}).get("times")
+                outcomes = sorted(set(entry.get("outcomes", ["ok"])))
+                rows.append([
+                    entry["experiment"],
+                    property_name(entry["file"]),
+                    entry["solve_variant"],
+                    entry.get("binary", ""),
+                    str(len(entry["times"])),
+                    ",".join(outcomes),
+                    f"{statistics['value']:.3f}" if statistics is not None else "-",
+                    f"[{statistics['ci'][0]:.3f}, {statistics['ci'][1]:.3f}]" if statistics is not None else "-",
+                ])
+
+        write_table(
+            args.format,
+            ["experiment", "property", "variant", "binary", "runs", "outcomes", "median (s)", "interval (s)"],
+            sorted(rows),
+            sys.stdout,
+        )
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,31 @@
 import argparse
+import copy
+import hashlib
 import json
 import logging
+import multiprocessing.util
 import os
+import random
 import re
 import shutil
+import time
 
-from library import MyLogger, run_program
-from prepare import EXPERIMENTS
+from typing import Callable
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from benchstats import StoppingRule, summarise
+from buildcache import BuildGraph, HashCache
+from capacity import CAPACITY_OPTION, CapacityPlanner, exhausted_regex, grow
+from fd import read_fd
+from library import Cancellation, Measurement, MyLogger, Sampler, run_program
+from manifest import add_filter_arguments, select_experiments, select_variants
+from prepare import CACHE_PATH
+from resultsdb import ResultsStore
+from solution import add_solution, encode_solution, to_bitset
+from scheduler import CorePinnedPool, job_key, load_history, longest_first, physical_cores, pinned_core
+from selector import AUTO_VARIANT, VariantSelector, game_features
+from shards import add_shard_tasks
 
 project_time_regex = re.compile(r".*Time project: ([0-9.]+)s.*$")
 reachable_time_regex = re.compile(r".*Time reachable: ([0-9.]+)s.*$")
@@ -14,16 +33,23 @@ solving_time_regex = re.compile(r".*Time solve_variability_zielonka: ([0-9.]+)s$
 recursive_calls_regex = re.compile(r".*Performed ([0-9]+) recursive calls.*")
 winning_vertices_regex = re.compile(r".*For product ([01]+) the following vertices are in:(.*)$")
 
+# Only the lines containing these are parsed while the solver runs when its output is captured.
+TIMING_MARKERS = (b"Time ", b"recursive calls", b"OutOfMemory")
+
 class ResultParser:
-    """Parser that captures solving time and number of recursive calls from tool output."""
+    """Parser that captures solving time and number of recursive calls from tool output.
+
+       The optional on_event is called with the name and duration of every timed phase as soon as it is reported."""
 
-    def __init__(self):
+    def __init__(self, on_event: Callable[[str, float], None] | None = None):
+        self.on_event = on_event
         self.project_time_s: float|None = None
         self.reachable_time_s: float|None = None
         self.solving_time_s: float|None = None
         self.recursive_calls: list[int] = []
-        self.solution: dict[str, dict[str, list[int]]] = {}
+        self.solution: dict[str, dict[str, int]] = {}
         self.read_w1: bool = False
+        self.nodes_exhausted: bool = False
 
     def __call__(self, line: str):
         """Processes a line of output from the tool."""
@@ -31,6 +57,7 @@ class ResultParser:
         m = solving_time_regex.match(s)
         if m:
             self.solving_time_s = float(m.group(1))
+            self.event("solve", self.solving_time_s)
             return
 
         m2 = recursive_calls_regex.match(s)
@@ -41,70 +68,944 @@ class ResultParser:
         m3 = project_time_regex.match(s)
         if m3:
             self.project_time_s = float(m3.group(1))
+            self.event("project", self.project_time_s)
             return
         
         m4 = reachable_time_regex.match(s)
         if m4:
             self.reachable_time_s = float(m4.group(1))
+            self.event("reachable", self.reachable_time_s)
+
+        if exhausted_regex.search(s):
+            self.nodes_exhausted = True
 
         if "W1:" in s:
             self.read_w1 = True
 
         m5 = winning_vertices_regex.match(s)
         if m5:
-            # group 2 contains a list of vertices, we convert it to a list of integers
-            vertices = [int(v) for v in m5.group(2).split(",") if v]
+            # group 2 contains a list of vertices, which is stored as a bitset
+            self.add_winning(m5.group(1), to_bitset(int(v) for v in m5.group(2).split(",") if v))
 
-            if self.read_w1:
-                if m5.group(1) not in self.solution:
-                    self.solution[m5.group(1)] = {}
-                self.solution[m5.group(1)]["1"] = vertices
-            else:
-                if m5.group(1) not in self.solution:
-                    self.solution[m5.group(1)] = {}
-                self.solution[m5.group(1)]["0"] = vertices
+    def add_winning(self, product: str, vertices: int):
+        """Stores the bitset of vertices won by the current player for the given product"""
+        if product not in self.solution:
+            self.solution[product] = {}
+        self.solution[product]["1" if self.read_w1 else "0"] = vertices
+
+    def read_solution(self, raw_file: str):
+        """Parses the winning vertices from the captured output of the solver.
+
+           Only the lines with solutions are decoded, and the vertices are converted from bytes directly."""
+        with open(raw_file, "rb") as f:
+            for line in f:
+                if b"W1:" in line:
+                    self.read_w1 = True
+
+                index = line.find(b"For product ")
+                if index == -1:
+                    continue
+
+                product, separator, vertices = line[index + 12:].partition(b" the following vertices are in:")
+                if separator:
+                    self.add_winning(product.decode(), to_bitset(int(v) for v in vertices.split(b",") if v.strip()))
+
+    def event(self, name: str, duration_s: float):
+        if self.on_event is not None:
+            self.on_event(name, duration_s)
+
+
+VARIANTS = ["family", "product", "family-optimised-left"]
+
+# The product variant solved in shards of the products by separate processes, enabled by --shards.
+SHARDED_VARIANT = "product-sharded"
+
+# The variants raced against each other on separate cores, enabled by --portfolio.
+PORTFOLIO_VARIANT = "portfolio"
+
+class SolveOptions:
+    """Options that apply to every run of the solver"""
+
+    def __init__(
+        self,
+        sample_interval_ms: float | None = None,
+        timeout: float | None = None,
+        memory_limit_mb: int | None = None,
+        cpu_limit_s: int | None = None,
+        capture: bool = False,
+        solutions: bool = True,
+        solution_digest: bool = False,
+        flags: dict[str, list[str]] | None = None,
+        capacities: CapacityPlanner | None = None,
+        products: dict[str, int] | None = None,
+        shards: int | None = None,
+        portfolio: list[str] | None = None,
+        cross_check: bool = False,
+    ):
+        self.sample_interval_ms = sample_interval_ms
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit_s = cpu_limit_s
+        self.capture = capture
+        self.solutions = solutions
+        self.solution_digest = solution_digest
+        # Additional solver arguments per game file.
+        self.flags = flags if flags is not None else {}
+        self.capacities = capacities if capacities is not None else CapacityPlanner()
+        # The number of valid products per game file.
+        self.products = products if products is not None else {}
+        # The minimum number of shards of the sharded product variant.
+        self.shards = shards
+        # The variants raced by the portfolio, and whether the losers run to completion to check their answers.
+        self.portfolio = portfolio if portfolio is not None else []
+        self.cross_check = cross_check
+
+def merge_flags(defaults: list[str], flags: list[str] | None) -> list[str]:
+    """Appends the flags to the defaults, where a flag replaces the default value of an option with the same name"""
+    flags = flags if flags is not None else []
+    names = {flag.split("=", 1)[0] for flag in flags}
+    return [flag for flag in defaults if flag.split("=", 1)[0] not in names] + flags
+
+def solver_arguments(solve_variant: str, flags: list[str] | None = None) -> list[str]:
+    """Returns the arguments with which merc-vpg solves a game with the given variant, except the game itself"""
+    return [
+        "solve",
+        *merge_flags(
+            [
+                "--debug",
+                "--timings",
+                f"--solve-variant={solve_variant}",
+            ],
+            flags,
+        ),
+    ]
+
+def solve(
+    logger: MyLogger,
+    merc_vpg_bin: str,
+    file: str,
+    solve_variant: str,
+    options: SolveOptions,
+    timeline_file: str | None = None,
+    raw_file: str | None = None,
+    core: int | None = None,
+    cancellation: Cancellation | None = None,
+) -> tuple[ResultParser, Measurement]:
+    """Solves the given game once with the given variant, and returns the parsed output and resource usage.
+
+       If a sample interval is given the resource usage over time is written to the timeline file. If a raw
+       file is given the output is captured in it, and the solution is parsed after the solver finished.
+       The solver is pinned to the core if given, and killed when the cancellation is cancelled.
+
+       When the solver runs out of BDD nodes it is restarted with a larger node capacity, and only the last
+       attempt is returned. Its capacity is recorded in the measurement."""
+    flags = options.flags.get(file, [])
+    capacity = options.capacities.capacity(file, solve_variant, flags)
+    retries = 0
+    while True:
+        sampler = Sampler(options.sample_interval_ms) if options.sample_interval_ms is not None else None
+        parser = ResultParser(sampler.mark if sampler is not None else None)
+        measurement = run_program(
+            [merc_vpg_bin, *solver_arguments(solve_variant, merge_flags(flags, [f"{CAPACITY_OPTION}={capacity}"])), file],
+            logger,
+            parser,
+            sampler,
+            timeout=options.timeout,
+            memory_limit_mb=options.memory_limit_mb,
+            cpu_limit_s=options.cpu_limit_s,
+            check=False,
+            capture=raw_file,
+            markers=TIMING_MARKERS,
+            core=core,
+            cancellation=cancellation,
+        )
+
+        measurement.node_capacity = capacity
+        measurement.nodes_exhausted = measurement.outcome == "memout" and parser.nodes_exhausted
+        measurement.capacity_retries = retries
+        options.capacities.record(file, solve_variant, capacity, measurement.outcome, measurement.nodes_exhausted)
+
+        larger = grow(capacity) if measurement.nodes_exhausted else None
+        if larger is None:
+            break
+
+        logger.warning(f"Solving {file} with variant {solve_variant} ran out of {capacity} nodes, retrying with {larger}")
+        capacity = larger
+        retries += 1
+
+    if sampler is not None and timeline_file is not None:
+        sampler.write(timeline_file)
+
+    if raw_file is not None and options.solutions:
+        parser.read_solution(raw_file)
+
+    return parser, measurement
+
+def run_file(output_dir: str, directory: str, mcrl2_name: str, file: str, solve_variant: str, repetition: int | str, extension: str) -> str:
+    """Returns the file in the given subdirectory of the output in which data of a single run is stored"""
+    directory = os.path.join(output_dir, directory)
+    os.makedirs(directory, exist_ok=True)
+
+    base, _ = os.path.splitext(mcrl2_name)
+    prop, _ = os.path.splitext(os.path.basename(file))
+    return os.path.join(directory, f"{base}.{prop}.{solve_variant}.{repetition}{extension}")
+
+def timeline_file(output_dir: str, mcrl2_name: str, file: str, solve_variant: str, repetition: int, options: SolveOptions) -> str | None:
+    """Returns the file in which the timeline of a single run is stored, if sampling is enabled"""
+    if options.sample_interval_ms is None:
+        return None
+
+    return run_file(output_dir, "timelines", mcrl2_name, file, solve_variant, repetition, ".json")
+
+def raw_output_file(output_dir: str, mcrl2_name: str, file: str, solve_variant: str, repetition: int | str, options: SolveOptions) -> str | None:
+    """Returns the file in which the output of a single run is captured, if capturing is enabled"""
+    if not options.capture:
+        return None
+
+    return run_file(output_dir, "raw", mcrl2_name, file, solve_variant, repetition, ".log")
+
+def cache_key(
+    hashes: HashCache,
+    merc_vpg_bin: str,
+    file: str,
+    solve_variant: str,
+    options: SolveOptions,
+    binary: str | None = None,
+) -> str:
+    """Returns the key of a job, which changes whenever the solver, the game, or the arguments and limits change.
+
+       Results tagged with a binary label are kept apart from untagged results of the same binary."""
+    digest = hashlib.sha256()
+    digest.update(b"tool:" + hashes.file(merc_vpg_bin).encode())
+    if binary is not None:
+        digest.update(b"label:" + binary.encode() + b"\0")
+    digest.update(b"game:" + hashes.file(file).encode())
+    for argument in solver_arguments("product" if solve_variant == SHARDED_VARIANT else solve_variant, options.flags.get(file)):
+        digest.update(b"arg:" + argument.encode() + b"\0")
+    if solve_variant == SHARDED_VARIANT:
+        digest.update(b"shards:" + str(options.shards).encode())
+    if solve_variant == PORTFOLIO_VARIANT:
+        for variant in options.portfolio:
+            for argument in solver_arguments(variant, options.flags.get(file)):
+                digest.update(b"portfolio:" + argument.encode() + b"\0")
+        digest.update(b"cross-check:" + str(options.cross_check).encode())
+
+    # Automatically chosen node capacities differ between runs, so only a fixed capacity is part of the key.
+    initial = options.capacities.initial
+    digest.update(b"capacity:" + (str(initial).encode() if initial is not None else b"auto"))
+
+    # The limits determine whether a run is recorded as a failure.
+    limits = [options.timeout, options.memory_limit_mb, options.cpu_limit_s]
+    digest.update(b"limits:" + json.dumps(limits).encode())
+    return digest.hexdigest()
+
+def recover_results(filename: str, logger: MyLogger) -> list[bytes]:
+    """Returns the complete lines of the results file, truncating a partially written last line left by a crash"""
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        logger.warning(f"Removing the partially written last entry of {filename}")
+        with open(filename, "r+b") as f:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+    return data[:end].splitlines()
 
+def invalidate_results(
+    filename: str,
+    experiments: set[tuple[tuple[str, str, str], str | None]],
+    logger: MyLogger,
+    database: str | None = None,
+):
+    """Moves the entries of the given experiments, as (job key, binary label), from the results file to
+       results.stale.json next to it.
 
-def run_experiment(logger: MyLogger, merc_vpg_bin: str, mcrl2_name: str, file: str, solve_variant: str, output_dir: str):
-    """Runs all experiments"""
+       The file is replaced atomically, such that a crash leaves either the old or the new file."""
+    kept = []
+    stale = []
+    keys = []
+    for line in recover_results(filename, logger):
+        try:
+            result = json.loads(line)
+        except json.JSONDecodeError:
+            stale.append(line)
+            continue
 
+        if (job_key(result["experiment"], result["file"], result["solve_variant"]), result.get("binary")) in experiments:
+            stale.append(line)
+            keys.append(result.get("key"))
+        else:
+            kept.append(line)
+
+    if not stale:
+        return
+
+    logger.info(f"Moving {len(stale)} outdated entries of {filename} to results.stale.json")
+    with open(os.path.join(os.path.dirname(filename), "results.stale.json"), "ab") as f:
+        f.write(b"".join(line + b"\n" for line in stale))
+
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(b"".join(line + b"\n" for line in kept))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+    if database is not None:
+        with ResultsStore(database) as store:
+            store.remove([key for key in keys if key is not None])
+
+def committed_keys(filename: str, logger: MyLogger) -> set[str]:
+    """Returns the keys of all jobs whose results have been committed to the results file"""
+    keys = set()
+    for line in recover_results(filename, logger):
+        try:
+            key = json.loads(line).get("key")
+        except json.JSONDecodeError:
+            continue
+
+        if key is not None:
+            keys.add(key)
+
+    return keys
+
+def new_result(mcrl2_name: str, file: str, solve_variant: str, key: str | None = None, binary: str | None = None) -> dict:
+    """Creates an empty result entry for the given game and variant, measured with the labelled binary if given"""
     result = {}
     result["experiment"] = mcrl2_name
     result["file"] = file
     result["solve_variant"] = solve_variant
+    result["key"] = key
+    if binary is not None:
+        result["binary"] = binary
     result["times"] = []
     result["recursive_calls"] = []
     result["project_times"] = []
     result["reachable_times"] = []
-    result["solution"] = []
+    result["solutions"] = []
+    result["solution_runs"] = []
+    result["outcomes"] = []
+    result["measurements"] = []
+    result["timelines"] = []
+    result["raw_outputs"] = []
+    return result
 
-    for i in range(0, 5):
-        logger.info(f"Run {i + 1}/5: Solving {file} with variant {solve_variant}")
+def add_repetition(
+    result: dict,
+    parser: ResultParser,
+    measurement: Measurement,
+    timeline: str | None = None,
+    raw_output: str | None = None,
+    solution_digest: bool = False,
+):
+    """Adds the outcome of a single repetition to the result entry, identical solutions are stored once"""
+    result["times"].append(parser.solving_time_s)
+    result["recursive_calls"].append(parser.recursive_calls)
+    result["project_times"].append(parser.project_time_s)
+    result["reachable_times"].append(parser.reachable_time_s)
+    add_solution(result, encode_solution(parser.solution, solution_digest))
+    result["outcomes"].append(measurement.outcome)
+    result["measurements"].append(measurement.as_dict())
+    result["timelines"].append(timeline)
+    result["raw_outputs"].append(raw_output)
 
-        parser = ResultParser()
-        run_program(
-            [
-                merc_vpg_bin,
-                "solve",
-                "--oxidd-node-capacity=1000000",
-                "--debug",
-                "--timings",
-                f"--solve-variant={solve_variant}",
-                file,
-            ],
-            logger,
-            parser,
+def write_result(result: dict, output_dir: str, database: str | None = None):
+    """Appends the result entry to the results.json file in the output directory, and to the database if given.
+
+       The entry is written with a single write and synced, a crash can only leave a partial last line."""
+    with open(os.path.join(output_dir, "results.json"), "ab") as f:
+        f.write(json.dumps(result).encode("utf-8") + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    if database is not None:
+        with ResultsStore(database) as store:
+            store.add(result)
+
+def add_statistics(result: dict, products: int | None = None, rule: StoppingRule | None = None):
+    """Summarises the timings of all successful repetitions with robust estimators.
+
+       The intervals have the confidence level of the stopping rule, which is stored together with whether the
+       interval of the solving time became narrow enough. Given the number of valid products of the game, the
+       throughput is the number of products solved per second of the median solving time."""
+    confidence = rule.confidence if rule is not None else 0.95
+    result["statistics"] = {"confidence_level": confidence}
+    for key in ["times", "project_times", "reachable_times"]:
+        values = [
+            value for value, outcome in zip(result[key], result["outcomes"])
+            if value is not None and outcome == "ok"
+        ]
+        result["statistics"][key] = summarise(values, confidence)
+
+    if rule is not None:
+        result["statistics"]["target_reached"] = rule.reached(solved_times(result))
+
+    if products is not None:
+        result["products"] = products
+        times = result["statistics"]["times"]
+        if times is not None and times["value"] > 0.0:
+            result["statistics"]["throughput"] = products / times["value"]
+
+def solved_times(result: dict) -> list[float]:
+    """Returns the solving times of the successful repetitions"""
+    return [time for time, outcome in zip(result["times"], result["outcomes"]) if time is not None and outcome == "ok"]
+
+def run_experiment(
+    logger: MyLogger,
+    merc_vpg_bin: str,
+    mcrl2_name: str,
+    file: str,
+    solve_variant: str,
+    output_dir: str,
+    options: SolveOptions | None = None,
+    rule: StoppingRule | None = None,
+    database: str | None = None,
+    key: str | None = None,
+) -> dict:
+    """Runs all experiments, repeating runs until the stopping rule is satisfied or a run fails, and returns the
+       written result entry"""
+    if options is None:
+        options = SolveOptions()
+    if rule is None:
+        rule = StoppingRule()
+
+    result = new_result(mcrl2_name, file, solve_variant, key)
+
+    failed = False
+    for i in range(0, rule.warmup):
+        logger.info(f"Warm-up {i + 1}/{rule.warmup}: Solving {file} with variant {solve_variant}")
+        raw = raw_output_file(output_dir, mcrl2_name, file, solve_variant, f"warmup{i}", options)
+        parser, measurement = solve(logger, merc_vpg_bin, file, solve_variant, options, raw_file=raw)
+
+        # A failing warm-up run is recorded, since the measured runs would fail as well.
+        if measurement.outcome != "ok":
+            add_repetition(result, parser, measurement, raw_output=raw, solution_digest=options.solution_digest)
+            failed = True
+            break
+
+    while not failed and (remaining := rule.remaining(solved_times(result))) > 0:
+        for _ in range(0, remaining):
+            i = len(result["times"])
+            logger.info(f"Run {i + 1} (at most {rule.max_runs}): Solving {file} with variant {solve_variant}")
+
+            timeline = timeline_file(output_dir, mcrl2_name, file, solve_variant, i, options)
+            raw = raw_output_file(output_dir, mcrl2_name, file, solve_variant, i, options)
+            parser, measurement = solve(logger, merc_vpg_bin, file, solve_variant, options, timeline, raw)
+            add_repetition(result, parser, measurement, timeline, raw, options.solution_digest)
+
+            if measurement.outcome != "ok":
+                failed = True
+                break
+
+    add_statistics(result, options.products.get(file), rule)
+    if "throughput" in result["statistics"]:
+        logger.info(f"Solved {result['products']} products at {result['statistics']['throughput']:.1f} products per second")
+
+    write_result(result, output_dir, database)
+    return result
+
+# The logger of a worker process in the parallel scheduler.
+_worker_logger: MyLogger | None = None
+
+def _init_worker(core: int, output_dir: str, file_level: int, stderr_level: int):
+    """Initializes a worker process of the parallel scheduler"""
+    global _worker_logger
+    _worker_logger = MyLogger(
+        f"cpu{core}",
+        os.path.join(output_dir, f"run.cpu{core}.log"),
+        file_level=file_level,
+        stderr_level=stderr_level,
+    )
+
+    # Worker processes do not run atexit handlers, so the queued records are written by a finalizer.
+    multiprocessing.util.Finalize(None, _worker_logger.close, exitpriority=10)
+
+def _solve_job(
+    merc_vpg_bin: str,
+    file: str,
+    solve_variant: str,
+    repetition: int | None,
+    options: SolveOptions,
+    timeline: str | None,
+    raw: str | None,
+) -> tuple[ResultParser, Measurement, str | None, str | None]:
+    """Solves a single repetition inside a worker process, where a repetition of None is a warm-up run"""
+    assert _worker_logger is not None
+    run = "Warm-up" if repetition is None else f"Run {repetition + 1}"
+    _worker_logger.info(f"{run} on cpu {pinned_core()}: Solving {file} with variant {solve_variant}")
+    parser, measurement = solve(_worker_logger, merc_vpg_bin, file, solve_variant, options, timeline, raw)
+    return parser, measurement, timeline, raw
+
+def run_parallel(
+    logger: MyLogger,
+    merc_vpg_bin: str,
+    experiments: list[tuple[str, str, str]],
+    output_dir: str,
+    jobs: int,
+    history_paths: list[str],
+    options: SolveOptions,
+    rule: StoppingRule,
+    database: str | None = None,
+    keys: dict[tuple[str, str, str, str | None], str] | None = None,
+):
+    """Solves every (game, variant, repetition) job in a pool of workers pinned to distinct physical cores.
+
+       Jobs are submitted longest-first according to the history to minimise the makespan. Whenever all
+       submitted repetitions of a game and variant have finished, the stopping rule decides whether more
+       repetitions are submitted or the result is written. After a failed run the repetitions of the same
+       game and variant that have not started yet are cancelled."""
+
+    history = load_history(history_paths)
+    experiments = longest_first(
+        experiments,
+        history,
+        lambda experiment: job_key(*experiment),
+    )
+
+    with CorePinnedPool(jobs, _init_worker, (output_dir, logger.file_level, logger.stderr_level)) as pool:
+        logger.info(f"Scheduling {len(experiments)} experiments on cores {pool.cores}")
+        solve_in_pool(logger, pool, merc_vpg_bin, experiments, output_dir, options, rule, database, keys)
+
+def solve_in_pool(
+    logger: MyLogger,
+    pool,
+    merc_vpg_bin: str,
+    experiments: list[tuple[str, str, str]],
+    output_dir: str,
+    options: SolveOptions,
+    rule: StoppingRule,
+    database: str | None = None,
+    keys: dict[tuple[str, str, str, str | None], str] | None = None,
+):
+    """Solves the repetitions of every game and variant with _solve_job in the pool, which has the submit method
+       of an executor, in the order of the experiments, and writes the result of every game and variant.
+
+       A game and variant is finished, or more repetitions are submitted, only once none of its submitted runs
+       is outstanding. Runs that finish at the same time are therefore all recorded before that decision."""
+    pending: dict[Future, tuple[tuple[str, str, str], int | None]] = {}
+    futures: dict[tuple[str, str, str], list[Future]] = {}
+    outstanding: dict[tuple[str, str, str], int] = {}
+    repetitions: dict[tuple[str, str, str], dict[int, tuple[ResultParser, Measurement, str | None, str | None]]] = {}
+
+    def submit_warmup(experiment: tuple[str, str, str], warmup: int):
+        mcrl2_name, path, variant = experiment
+        futures[experiment] = []
+
+        for j in range(0, warmup):
+            raw = raw_output_file(output_dir, mcrl2_name, path, variant, f"warmup{j}", options)
+            future = pool.submit(_solve_job, merc_vpg_bin, path, variant, None, options, None, raw)
+            futures[experiment].append(future)
+            pending[future] = (experiment, None)
+            outstanding[experiment] += 1
+
+    def submit(experiment: tuple[str, str, str], count: int):
+        mcrl2_name, path, variant = experiment
+        futures[experiment] = []
+
+        first = len(repetitions[experiment])
+        for i in range(first, first + count):
+            timeline = timeline_file(output_dir, mcrl2_name, path, variant, i, options)
+            raw = raw_output_file(output_dir, mcrl2_name, path, variant, i, options)
+            future = pool.submit(_solve_job, merc_vpg_bin, path, variant, i, options, timeline, raw)
+            futures[experiment].append(future)
+            pending[future] = (experiment, i)
+            outstanding[experiment] += 1
+
+    # The measured repetitions of a game and variant are only submitted once its warm-up runs have finished,
+    # as in run_experiment, such that they do not compete with them for memory bandwidth and caches.
+    for experiment in experiments:
+        repetitions[experiment] = {}
+        outstanding[experiment] = 0
+        if rule.warmup > 0:
+            submit_warmup(experiment, rule.warmup)
+        else:
+            submit(experiment, rule.remaining([]))
+
+    while pending:
+        future = next(as_completed(pending))
+        experiment, i = pending.pop(future)
+        outstanding[experiment] -= 1
+        if not future.cancelled():
+            repetition = future.result()
+
+            # Warm-up runs are only recorded when they fail, since the measured runs would fail as well.
+            if i is not None or repetition[1].outcome != "ok":
+                repetitions[experiment][i if i is not None else -1] = repetition
+
+            # The capacity learned by the worker is used for the repetitions that are submitted later.
+            measurement = repetition[1]
+            options.capacities.record(
+                experiment[1], experiment[2], measurement.node_capacity, measurement.outcome, measurement.nodes_exhausted
+            )
+
+            if repetition[1].outcome != "ok":
+                for other in futures[experiment]:
+                    other.cancel()
+
+        if outstanding[experiment] == 0:
+            if i is None and not repetitions[experiment]:
+                # The warm-up runs succeeded.
+                submit(experiment, rule.remaining([]))
+                continue
+
+            mcrl2_name, path, variant = experiment
+
+            result = new_result(mcrl2_name, path, variant, keys.get((*experiment, None)) if keys is not None else None)
+            for _, repetition in sorted(repetitions[experiment].items()):
+                add_repetition(result, *repetition, options.solution_digest)
+
+            failed = any(outcome != "ok" for outcome in result["outcomes"])
+            remaining = rule.remaining(solved_times(result))
+            if not failed and remaining > 0:
+                submit(experiment, remaining)
+                continue
+
+            logger.info(f"Finished solving {path} with variant {variant} in {len(result['times'])} runs")
+            del repetitions[experiment], outstanding[experiment], futures[experiment]
+            add_statistics(result, options.products.get(path), rule)
+            write_result(result, output_dir, database)
+
+def merge_shards(
+    repetitions: list[tuple[ResultParser, Measurement, str | None, str | None]],
+    wall_time_s: float,
+) -> tuple[ResultParser, Measurement]:
+    """Combines the runs of all shards of a game into a single run. The solutions are merged, since every product
+       is in one shard.
+
+       The solving time is the largest solving time reported by the solver of a shard, such that it measures the
+       same as for the other variants. The time from starting the first shard until the last one finished, which
+       includes starting the processes, is kept as sharded_wall_time_s of the measurement."""
+    parser = ResultParser()
+    measurements = [measurement for _, measurement, _, _ in repetitions]
+    for shard, _, _, _ in repetitions:
+        parser.recursive_calls.extend(shard.recursive_calls)
+        parser.solution.update(shard.solution)
+
+    solving_times = [shard.solving_time_s for shard, _, _, _ in repetitions]
+    if all(measurement.outcome == "ok" for measurement in measurements) and None not in solving_times:
+        parser.solving_time_s = max(solving_times)
+    for name in ["project_time_s", "reachable_time_s"]:
+        times = [getattr(shard, name) for shard, _, _, _ in repetitions if getattr(shard, name) is not None]
+        setattr(parser, name, sum(times) if times else None)
+
+    # The first failure determines the outcome, and the resource usage is summed over the shards.
+    failures = [measurement for measurement in measurements if measurement.outcome != "ok"]
+    measurement = copy.copy(failures[0] if failures else measurements[0])
+    measurement.wall_time_s = max(shard.wall_time_s for shard in measurements)
+    measurement.sharded_wall_time_s = wall_time_s
+    for name in [
+        "user_time_s", "system_time_s", "minor_page_faults", "major_page_faults",
+        "voluntary_context_switches", "involuntary_context_switches", "capacity_retries",
+    ]:
+        setattr(measurement, name, sum(getattr(shard, name) for shard in measurements))
+    measurement.max_rss_kb = max(shard.max_rss_kb for shard in measurements)
+    measurement.node_capacity = max(shard.node_capacity for shard in measurements)
+    measurement.shard_times = solving_times
+    measurement.shard_outcomes = [shard.outcome for shard in measurements]
+    return parser, measurement
+
+def run_sharded(
+    logger: MyLogger,
+    pool: CorePinnedPool,
+    merc_vpg_bin: str,
+    mcrl2_name: str,
+    file: str,
+    shards: list[str],
+    output_dir: str,
+    options: SolveOptions,
+    rule: StoppingRule,
+    database: str | None = None,
+    key: str | None = None,
+) -> dict:
+    """Solves a game with the product variant by solving the games of all its shards concurrently in the pool,
+       repeating until the stopping rule is satisfied or a shard fails, and returns the written result entry"""
+    result = new_result(mcrl2_name, file, SHARDED_VARIANT, key)
+    result["shards"] = shards
+
+    def solve_shards(repetition: int | str) -> tuple[ResultParser, Measurement, str | None]:
+        start = time.perf_counter()
+        futures = [
+            pool.submit(
+                _solve_job, merc_vpg_bin, shard, "product", repetition if isinstance(repetition, int) else None, options,
+                None, raw_output_file(output_dir, mcrl2_name, shard, SHARDED_VARIANT, repetition, options),
+            )
+            for shard in shards
+        ]
+        repetitions = [future.result() for future in futures]
+        wall_time_s = time.perf_counter() - start
+
+        for shard, (_, measurement, _, _) in zip(shards, repetitions):
+            options.capacities.record(shard, "product", measurement.node_capacity, measurement.outcome, measurement.nodes_exhausted)
+
+        parser, measurement = merge_shards(repetitions, wall_time_s)
+        return parser, measurement
+
+    failed = False
+    for i in range(0, rule.warmup):
+        logger.info(f"Warm-up {i + 1}/{rule.warmup}: Solving {file} in {len(shards)} shards")
+        parser, measurement = solve_shards(f"warmup{i}")
+
+        # A failing warm-up run is recorded, since the measured runs would fail as well.
+        if measurement.outcome != "ok":
+            add_repetition(result, parser, measurement, solution_digest=options.solution_digest)
+            failed = True
+            break
+
+    while not failed and (remaining := rule.remaining(solved_times(result))) > 0:
+        for _ in range(0, remaining):
+            i = len(result["times"])
+            logger.info(f"Run {i + 1} (at most {rule.max_runs}): Solving {file} in {len(shards)} shards")
+            parser, measurement = solve_shards(i)
+            add_repetition(result, parser, measurement, solution_digest=options.solution_digest)
+
+            if measurement.outcome != "ok":
+                failed = True
+                break
+
+    add_statistics(result, options.products.get(file), rule)
+    write_result(result, output_dir, database)
+    return result
+
+def differing_products(left: dict[str, dict[str, int]], right: dict[str, dict[str, int]]) -> list[str]:
+    """Returns the products for which the two solutions differ, or which only one of them solved"""
+    return sorted(
+        product for product in left.keys() | right.keys()
+        if product not in left or product not in right
+        or (left[product].get("0", 0), left[product].get("1", 0)) != (right[product].get("0", 0), right[product].get("1", 0))
+    )
+
+def run_portfolio(
+    logger: MyLogger,
+    merc_vpg_bin: str,
+    mcrl2_name: str,
+    file: str,
+    output_dir: str,
+    options: SolveOptions,
+    cores: list[int],
+    database: str | None = None,
+    key: str | None = None,
+) -> tuple[dict, Future | None]:
+    """Races the variants of the portfolio on the game, each pinned to its own core, and returns the written
+       result entry with the run of the first variant that solved it.
+
+       The other variants are killed as soon as there is a winner, unless their answers are cross-checked. In
+       that case the result is written as soon as there is a winner, and the other variants run to completion
+       in the background. The returned future then compares their solutions with the solution of the winner,
+       and appends the comparison to cross_check.json."""
+    result = new_result(mcrl2_name, file, PORTFOLIO_VARIANT, key)
+    cancellation = Cancellation() if not options.cross_check else None
+
+    def race(variant: str, core: int) -> tuple[ResultParser, Measurement, str | None, str | None, float]:
+        timeline = timeline_file(output_dir, mcrl2_name, file, variant, "portfolio", options)
+        raw = raw_output_file(output_dir, mcrl2_name, file, variant, "portfolio", options)
+        parser, measurement = solve(logger, merc_vpg_bin, file, variant, options, timeline, raw, core, cancellation)
+        return parser, measurement, timeline, raw, time.perf_counter() - start
+
+    def summary(run: tuple[ResultParser, Measurement, str | None, str | None, float]) -> dict:
+        return {"outcome": run[1].outcome, "time": run[0].solving_time_s, "elapsed": run[4]}
+
+    logger.info(f"Racing variants {', '.join(options.portfolio)} on {file}")
+    runs: dict[str, tuple[ResultParser, Measurement, str | None, str | None, float]] = {}
+    winner = None
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(len(options.portfolio))
+    futures = {
+        executor.submit(race, variant, cores[i % len(cores)]): variant
+        for i, variant in enumerate(options.portfolio)
+    }
+    for future in as_completed(futures):
+        variant = futures[future]
+        runs[variant] = future.result()
+        if winner is None and runs[variant][1].outcome == "ok":
+            winner = variant
+            logger.info(f"Variant {variant} solved {file} first after {runs[variant][4]:.3f}s")
+            if cancellation is not None:
+                cancellation.cancel()
+            else:
+                break
+
+    # Without a winner the run of the first variant is recorded, which shows why it failed.
+    parser, measurement, timeline, raw, elapsed = runs[winner if winner is not None else options.portfolio[0]]
+    add_repetition(result, parser, measurement, timeline, raw, options.solution_digest)
+    result["winner"] = winner
+    result["time_to_answer"] = elapsed if winner is not None else None
+    result["portfolio"] = {variant: summary(run) for variant, run in runs.items()}
+
+    pending = {future: variant for future, variant in futures.items() if futures[future] not in runs}
+    if pending:
+        result["cross_check"] = {"pending": sorted(pending.values())}
+
+    if winner is None:
+        logger.warning(f"No variant solved {file}")
+
+    add_statistics(result, options.products.get(file))
+    write_result(result, output_dir, database)
+
+    def cross_check() -> dict:
+        for future in as_completed(pending):
+            runs[pending[future]] = future.result()
+
+        mismatches = {}
+        for variant in options.portfolio:
+            if variant != winner and runs[variant][1].outcome == "ok":
+                products = differing_products(runs[winner][0].solution, runs[variant][0].solution)
+                if products:
+                    logger.error(f"Variant {variant} disagrees with {winner} on {len(products)} products of {file}")
+                    mismatches[variant] = products
+
+        check = {
+            "experiment": mcrl2_name,
+            "file": file,
+            "key": key,
+            "winner": winner,
+            "portfolio": {variant: summary(run) for variant, run in runs.items()},
+            "agree": not mismatches,
+            "mismatches": mismatches,
+        }
+        with open(os.path.join(output_dir, "cross_check.json"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(check) + "\n")
+        logger.info(f"Cross-checked the variants on {file}, {'they agree' if not mismatches else 'they disagree'}")
+        return check
+
+    # The thread of the winner is free to wait for the others.
+    check = executor.submit(cross_check) if options.cross_check and winner is not None else None
+    executor.shutdown(wait=False)
+    return result, check
+
+def run_interleaved(
+    logger: MyLogger,
+    binaries: dict[str, str],
+    mcrl2_name: str,
+    file: str,
+    solve_variant: str,
+    output_dir: str,
+    options: SolveOptions,
+    rule: StoppingRule,
+    seed: int | None = None,
+    keys: dict[tuple[str, str, str, str | None], str] | None = None,
+) -> list[dict]:
+    """Measures several labelled binaries on the same game and variant, and returns a result entry per binary.
+
+       Every round performs one repetition of every binary that needs more runs, in a random order, such that
+       changes in the performance of the machine over time affect all binaries alike."""
+    rng = random.Random(seed)
+    results = {
+        label: new_result(
+            mcrl2_name, file, solve_variant, keys.get((mcrl2_name, file, solve_variant, label)) if keys is not None else None, label
         )
-        result["times"].append(parser.solving_time_s)
-        result["recursive_calls"].append(parser.recursive_calls)
-        result["project_times"].append(parser.project_time_s)
-        result["reachable_times"].append(parser.reachable_time_s)
-        result["solution"].append(parser.solution)
+        for label in binaries
+    }
+    failed = set()
+
+    for i in range(0, rule.warmup):
+        order = list(binaries)
+        rng.shuffle(order)
+        for label in order:
+            if label in failed:
+                continue
+
+            logger.info(f"Warm-up {i + 1}/{rule.warmup}: Solving {file} with variant {solve_variant} using {label}")
+            raw = raw_output_file(output_dir, mcrl2_name, file, solve_variant, f"{label}.warmup{i}", options)
+            parser, measurement = solve(logger, binaries[label], file, solve_variant, options, raw_file=raw)
+
+            # A failing warm-up run is recorded, since the measured runs would fail as well.
+            if measurement.outcome != "ok":
+                add_repetition(results[label], parser, measurement, raw_output=raw, solution_digest=options.solution_digest)
+                failed.add(label)
+
+    while order := [
+        label for label in binaries
+        if label not in failed and rule.remaining(solved_times(results[label])) > 0
+    ]:
+        rng.shuffle(order)
+        for label in order:
+            i = len(results[label]["times"])
+            logger.info(f"Run {i + 1} (at most {rule.max_runs}): Solving {file} with variant {solve_variant} using {label}")
+
+            timeline = timeline_file(output_dir, mcrl2_name, file, solve_variant, f"{label}.{i}", options)
+            raw = raw_output_file(output_dir, mcrl2_name, file, solve_variant, f"{label}.{i}", options)
+            parser, measurement = solve(logger, binaries[label], file, solve_variant, options, timeline, raw)
+            add_repetition(results[label], parser, measurement, timeline, raw, options.solution_digest)
+
+            if measurement.outcome != "ok":
+                failed.add(label)
+
+    for result in results.values():
+        add_statistics(result, options.products.get(file), rule)
+
+    return list(results.values())
+
+def _interleaved_job(
+    binaries: dict[str, str],
+    mcrl2_name: str,
+    file: str,
+    solve_variant: str,
+    output_dir: str,
+    options: SolveOptions,
+    rule: StoppingRule,
+    seed: int | None,
+    keys: dict[tuple[str, str, str, str | None], str] | None,
+) -> list[dict]:
+    """Runs the interleaved measurement of a game and variant inside a worker process"""
+    assert _worker_logger is not None
+    _worker_logger.info(f"Interleaving {', '.join(binaries)} on cpu {pinned_core()}")
+    return run_interleaved(_worker_logger, binaries, mcrl2_name, file, solve_variant, output_dir, options, rule, seed, keys)
+
+def run_binaries(
+    logger: MyLogger,
+    binaries: dict[str, str],
+    experiments: list[tuple[str, str, str]],
+    output_dir: str,
+    jobs: int,
+    history_paths: list[str],
+    options: SolveOptions,
+    rule: StoppingRule,
+    seed: int | None = None,
+    database: str | None = None,
+    keys: dict[tuple[str, str, str, str | None], str] | None = None,
+):
+    """Measures all labelled binaries on every game and variant with interleaved repetitions.
+
+       With several jobs all repetitions of a game and variant run on the same pinned core, and the games
+       and variants are distributed over the cores longest-first."""
+    rng = random.Random(seed)
+    seeds = {experiment: rng.randrange(2**32) for experiment in experiments}
+
+    if jobs <= 1:
+        for experiment in experiments:
+            for result in run_interleaved(logger, binaries, *experiment, output_dir, options, rule, seeds[experiment], keys):
+                write_result(result, output_dir, database)
+        return
 
-    with open(os.path.join(output_dir, "results.json"), "a", encoding="utf-8") as f:
-        json.dump(result, f)
-        f.write("\n")
+    experiments = longest_first(experiments, load_history(history_paths), lambda experiment: job_key(*experiment))
+    with CorePinnedPool(jobs, _init_worker, (output_dir, logger.file_level, logger.stderr_level)) as pool:
+        logger.info(f"Scheduling {len(experiments)} interleaved experiments on cores {pool.cores}")
 
+        futures = {
+            pool.submit(
+                _interleaved_job, binaries, *experiment, output_dir, options, rule, seeds[experiment], keys
+            ): experiment
+            for experiment in experiments
+        }
+        for future in as_completed(futures):
+            mcrl2_name, path, variant = futures[future]
+            logger.info(f"Finished solving {path} with variant {variant} using {', '.join(binaries)}")
+            for result in future.result():
+                write_result(result, output_dir, database)
+
+def find_binary(path: str) -> str:
+    """Returns the merc-vpg binary, given either the binary itself or the directory that contains it"""
+    binary = shutil.which("merc-vpg", path=path) if os.path.isdir(path) else path
+    if binary is None or not os.path.isfile(binary):
+        raise FileNotFoundError(f"Could not find merc_vpg binary in path {path}")
+
+    return binary
 
 def main():
     """The main function"""
@@ -116,29 +1017,312 @@ def main():
         epilog="",
     )
 
-    parser.add_argument(dest="merc_binpath", action="store", type=str)
+    parser.add_argument(
+        dest="merc_binpath", action="store", type=str, nargs="?",
+        help="Directory containing merc-vpg, not needed when the binaries are given with --binary",
+    )
     parser.add_argument(dest="output", action="store", type=str)
+    parser.add_argument(
+        "--binary", action="append", type=str, default=None, metavar="LABEL=PATH",
+        help="A labelled merc-vpg binary, or directory containing it. The repetitions of all binaries are interleaved "
+             "in a random order on the same core, and the results are tagged with the label",
+    )
+    parser.add_argument(
+        "--seed", action="store", type=int, default=None,
+        help="Seed for the order in which the repetitions of the binaries are interleaved",
+    )
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "--jobs", action="store", type=int, default=1,
+        help="Number of jobs to solve in parallel, every job is pinned to its own physical core",
+    )
+    parser.add_argument(
+        "--sample-interval-ms", action="store", type=float, default=None,
+        help="Samples the memory, cpu usage and threads of the solver at this interval, stored in <output>/timelines/",
+    )
+    parser.add_argument(
+        "--timeout", action="store", type=float, default=None,
+        help="Wall-clock time limit in seconds per run, after which it is recorded as a timeout",
+    )
+    parser.add_argument(
+        "--memory-limit-mb", action="store", type=int, default=None,
+        help="Limit on the address space of the solver in megabytes, exceeding it is recorded as a memout",
+    )
+    parser.add_argument(
+        "--cpu-limit-s", action="store", type=int, default=None,
+        help="Limit on the cpu time of the solver in seconds, exceeding it is recorded as a timeout",
+    )
+    parser.add_argument(
+        "--capture", action="store_true",
+        help="Captures the solver output unmodified in <output>/raw/ and only parses the timings while it runs",
+    )
+    parser.add_argument(
+        "--no-solutions", action="store_true",
+        help="Does not parse the winning vertices from the captured output, they are then not stored in the results",
+    )
+    parser.add_argument(
+        "--solution-digest", action="store_true",
+        help="Stores only a hash of the winning vertices per product, enough to check that the answer did not change",
+    )
+    parser.add_argument(
+        "--sqlite", action="store", type=str, default=None,
+        help="Also stores the results in this SQLite database, which can be read by the table scripts",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Solves all jobs again, also those whose results for the same solver, game and arguments are committed",
+    )
+    parser.add_argument(
+        "--cache-dir", action="store", type=str, default=CACHE_PATH,
+        help="Directory in which the content hashes of the solver and games are memoized",
+    )
+    parser.add_argument(
+        "--warmup", action="store", type=int, default=1,
+        help="Number of discarded warm-up runs before measuring a game and variant",
+    )
+    parser.add_argument(
+        "--min-runs", action="store", type=int, default=3,
+        help="Minimum number of measured runs per game and variant",
+    )
+    parser.add_argument(
+        "--max-runs", action="store", type=int, default=10,
+        help="Maximum number of measured runs per game and variant",
+    )
+    parser.add_argument(
+        "--ci-width", action="store", type=float, default=0.05,
+        help="Stop repeating once the confidence interval of the median is narrower than this fraction of the median",
+    )
+    parser.add_argument(
+        "--confidence", action="store", type=float, default=0.95,
+        help="Confidence level of the interval of the median",
+    )
+    parser.add_argument(
+        "--file-level", action="store", type=str, default="DEBUG",
+        help="Minimum level of the messages written to the log files",
+    )
+    parser.add_argument(
+        "--stderr-level", action="store", type=str, default="DEBUG",
+        help="Minimum level of the messages written to stderr, the solver output is logged at INFO",
+    )
+    parser.add_argument(
+        "--history", action="append", type=str, default=None,
+        help="Results file(s) with previous timings used to schedule the longest jobs first, and node capacities "
+             "with which the games were solved (default: <output>/results.json)",
+    )
+    parser.add_argument(
+        "--node-capacity", action="store", type=int, default=None,
+        help="Initial BDD node capacity of every run, by default it is chosen per game from earlier results or the "
+             "size of the game and its feature diagram. It grows when the solver runs out of nodes",
+    )
+    parser.add_argument(
+        "--shards", action="store", type=int, default=None,
+        help=f"Also solves every game with the {SHARDED_VARIANT} variant, which splits the products into at least this many "
+             "shards by fixing prefixes of the feature order and solves them with the product variant on --jobs cores",
+    )
+    parser.add_argument(
+        "--portfolio", action="store_true",
+        help="Races the selected variants on separate cores instead of measuring each of them, and records the variant "
+             "that solved every game first and its time to answer. The other variants are killed",
+    )
+    parser.add_argument(
+        "--cross-check", action="store_true",
+        help="Lets the variants that lost a --portfolio race finish, and checks that their solutions agree with the winner",
+    )
+    parser.add_argument(
+        "--selector", action="store", type=str, default=None,
+        help=f"Selector trained by selector.py that chooses the variant of every game with --variant {AUTO_VARIANT} "
+             "(default: <output>/selector.json)",
+    )
 
     args = parser.parse_args()
 
-    merc_vpg_bin = shutil.which("merc-vpg", path=args.merc_binpath)
-    if merc_vpg_bin is None:
-        raise FileNotFoundError(f"Could not find merc_vpg binary in path {args.merc_binpath}")
+    # The binary to measure, or several binaries with their labels.
+    binaries: dict[str | None, str] = {}
+    for binary in args.binary or []:
+        label, separator, path = binary.partition("=")
+        if not separator or not label:
+            parser.error(f"Expected LABEL=PATH for --binary, got {binary}")
+        binaries[label] = find_binary(path)
+
+    if not binaries:
+        if args.merc_binpath is None:
+            parser.error("Either the merc_binpath or at least one --binary is required")
+        binaries[None] = find_binary(args.merc_binpath)
+
+    if args.shards is not None and None not in binaries:
+        parser.error("--shards can not be combined with --binary")
+    if args.portfolio and (None not in binaries or args.shards is not None):
+        parser.error("--portfolio can not be combined with --binary or --shards")
+    if args.cross_check and not args.portfolio:
+        parser.error("--cross-check requires --portfolio")
+
+    # With --variant auto the selector chooses a single variant per game.
+    selector = None
+    if args.variant is not None and AUTO_VARIANT in args.variant:
+        if args.variant != [AUTO_VARIANT]:
+            parser.error(f"--variant {AUTO_VARIANT} can not be combined with other variants")
+        if args.portfolio or args.shards is not None:
+            parser.error(f"--variant {AUTO_VARIANT} can not be combined with --portfolio or --shards")
+
+        selector_file = args.selector if args.selector is not None else os.path.join(args.output, "selector.json")
+        if not os.path.exists(selector_file):
+            parser.error(f"--variant {AUTO_VARIANT} requires a selector trained by selector.py, {selector_file} does not exist")
+        selector = VariantSelector.load(selector_file)
+        args.variant = None
+
+    logger = MyLogger(
+        "main",
+        os.path.join(args.output, "run.log"),
+        file_level=logging.getLevelName(args.file_level.upper()),
+        stderr_level=logging.getLevelName(args.stderr_level.upper()),
+    )
+    options = SolveOptions(
+        args.sample_interval_ms,
+        args.timeout,
+        args.memory_limit_mb,
+        args.cpu_limit_s,
+        args.capture,
+        not args.no_solutions,
+        args.solution_digest,
+        capacities=CapacityPlanner(args.node_capacity),
+        shards=args.shards,
+        cross_check=args.cross_check,
+    )
+    rule = StoppingRule(args.warmup, args.min_runs, args.max_runs, args.ci_width, args.confidence)
+
+    # Collect the variability parity games for the selected properties and specifications.
+    games = []
+    sources = {}
+    features = {}
+    for experiment, properties in select_experiments(args):
+        fd_file = experiment.path(experiment.fd)
+        if not os.path.exists(fd_file):
+            logger.warning(f"Skipping {experiment.name} since its feature diagram {fd_file} does not exist")
+            continue
+
+        diagram = read_fd(fd_file)
+        for prop in properties:
+            path = experiment.game_file(prop)
+            if not os.path.exists(path):
+                logger.warning(f"Skipping {path} since it has not been prepared")
+                continue
 
-    logger = MyLogger("main", os.path.join(args.output, "run.log"))
+            games.append((experiment.spec, path))
+            sources[path] = (experiment, prop)
+            options.flags[path] = experiment.flags(prop)
+            options.capacities.features[path] = len(diagram.features)
+            options.products[path] = diagram.count()
+            if selector is not None:
+                features[path] = game_features(path, diagram)
 
-    # Prepare the variability parity games for all the properties and specifications.
-    for experiment in EXPERIMENTS:
-        directory, mcrl2_name, properties = experiment
+    variants = select_variants(args, VARIANTS + [SHARDED_VARIANT] if args.shards is not None else VARIANTS)
+    if args.portfolio:
+        # The selected variants are raced, and every game is solved once by the portfolio.
+        if not variants:
+            parser.error("--portfolio requires at least one variant that matches --variant")
+        options.portfolio = variants
+        variants = [PORTFOLIO_VARIANT]
+
+    # Every game is solved with every variant, or only with the variant that the selector predicts to be fastest.
+    jobs = [(mcrl2_name, path, variant) for mcrl2_name, path in games for variant in variants]
+    if selector is not None:
+        jobs = [(mcrl2_name, path, selector.select(features[path], variants)) for mcrl2_name, path in games]
+        for mcrl2_name, path, variant in jobs:
+            logger.info(f"Selected variant {variant} for {path}")
+
+    # The shards are translated from the state space of the specification, which a synthetic case does not have.
+    jobs = [job for job in jobs if job[2] != SHARDED_VARIANT or sources[job[1]][0].synthetic is None]
+
+    # Jobs whose key has been committed before are skipped, the outdated entries of the others are moved aside.
+    results_file = os.path.join(args.output, "results.json")
+    os.makedirs(args.cache_dir, exist_ok=True)
+    hashes = HashCache(os.path.join(args.cache_dir, "hashes.json"))
+    keys = {
+        (mcrl2_name, path, variant, label): cache_key(hashes, binary, path, variant, options, label)
+        for mcrl2_name, path, variant in jobs
+        for label, binary in binaries.items()
+    }
+    hashes.save()
+
+    # The binaries of a game and variant are measured in the same session, so they are only skipped together.
+    committed = committed_keys(results_file, logger) if not args.force else set()
+    experiments = [
+        (mcrl2_name, path, variant)
+        for mcrl2_name, path, variant in jobs
+        if any(keys[(mcrl2_name, path, variant, label)] not in committed for label in binaries)
+    ]
+    if len(experiments) < len(jobs):
+        logger.info(
+            f"Skipping {len(jobs) - len(experiments)} jobs with committed results, use --force to rerun them"
+        )
+
+    invalidate_results(
+        results_file,
+        {(job_key(*experiment), label) for experiment in experiments for label in binaries},
+        logger,
+        args.sqlite,
+    )
+
+    history = args.history if args.history is not None else [
+        results_file, os.path.join(args.output, "results.stale.json")
+    ]
+    options.capacities.load(history)
+
+    # The sharded jobs use all cores for a single game, so they are solved after the other jobs.
+    sharded = [experiment for experiment in experiments if experiment[2] == SHARDED_VARIANT]
+    experiments = [experiment for experiment in experiments if experiment[2] != SHARDED_VARIANT]
+
+    if args.portfolio:
+        cores = physical_cores()
+        if len(cores) < len(options.portfolio):
+            logger.warning(f"Racing {len(options.portfolio)} variants on only {len(cores)} cores, some will share a core")
+        checks = []
+        for mcrl2_name, path, variant in experiments:
+            _, check = run_portfolio(
+                logger, binaries[None], mcrl2_name, path, args.output, options, cores, args.sqlite,
+                keys[(mcrl2_name, path, variant, None)],
+            )
+            if check is not None:
+                # The losing variants still occupy the cores, so the next race only starts once they finished.
+                check.result()
+                checks.append(check)
+
+        if checks:
+            disagreements = sum(not check.result()["agree"] for check in checks)
+            logger.info(f"The variants disagree on {disagreements} of {len(checks)} cross-checked games")
+    elif None not in binaries:
+        labelled = {label: binary for label, binary in binaries.items() if label is not None}
+        run_binaries(
+            logger, labelled, experiments, args.output, args.jobs, history, options, rule, args.seed, args.sqlite, keys
+        )
+    elif args.jobs > 1:
+        run_parallel(logger, binaries[None], experiments, args.output, args.jobs, history, options, rule, args.sqlite, keys)
+    else:
+        for mcrl2_name, path, variant in experiments:
+            run_experiment(
+                logger, binaries[None], mcrl2_name, path, variant, args.output, options, rule, args.sqlite,
+                keys[(mcrl2_name, path, variant, None)],
+            )
 
-        # The directory in which to store all generated files
-        tmp_directory = directory + "tmp/"
+    if sharded:
+        # Generate the games of the shards, in which the feature diagram only allows the products of the shard.
+        graph = BuildGraph(args.cache_dir, logger)
+        shards = {}
+        for _, path, _ in sharded:
+            experiment, prop = sources[path]
+            shards[path] = list(add_shard_tasks(graph, binaries[None], experiment, prop, args.shards).values())
+            for shard in shards[path]:
+                options.flags[shard] = options.flags[path]
+                options.capacities.features[shard] = options.capacities.features[path]
+        graph.run(args.jobs)
 
-        for file in os.listdir(tmp_directory):
-            path = tmp_directory + file
-            if ".svpg" in path:
-                for variant in ["family", "product", "family-optimised-left"]:
-                    run_experiment(logger, merc_vpg_bin, mcrl2_name, path, variant, args.output)
+        with CorePinnedPool(args.jobs, _init_worker, (args.output, logger.file_level, logger.stderr_level)) as pool:
+            logger.info(f"Solving {len(sharded)} games in shards on cores {pool.cores}")
+            for mcrl2_name, path, variant in sharded:
+                run_sharded(
+                    logger, pool, binaries[None], mcrl2_name, path, shards[path], args.output, options, rule, args.sqlite,
+                    keys[(mcrl2_name, path, variant, None)],
+                )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,544 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+
+from benchstats import StoppingRule
+from capacity import count_lines
+from fd import read_fd
+from library import MyLogger
+from manifest import CASES_PATH, Experiment, matches, select_variants
+from prepare import CACHE_PATH, prepare
+from run import VARIANTS, SolveOptions, find_binary, run_experiment
+from tables import FORMATS, write_table
+
+# The features of the elevator, in the order of its feature diagram.
+ELEVATOR_FEATURES = ["P", "EC", "TTF", "O", "Ex"]
+
+# Ends the definition of the feature expressions in the elevator specification, which does not depend on the floors.
+ELEVATOR_PRELUDE_END = "%%%%% that was the end of the BDD structure for representing feature expressions"
+
+# The actions of the elevator that are renamed per floor, in the order of the act declaration.
+ELEVATOR_FLOOR_ACTIONS = ["executive_on", "idling", "landingButton", "level", "liftButton", "open"]
+
+class FreshNames:
+    """Generates distinct fixpoint variables for the properties, cycling through X, Y and Z"""
+
+    def __init__(self):
+        self.count = 0
+        # The number of the first X, Y and Z.
+        self.base = 1
+
+    def reset(self, count: int = 0, base: int = 1):
+        self.count = count
+        self.base = base
+
+    def __call__(self) -> str:
+        name = "XYZ"[self.count % 3] + str(self.count // 3 + self.base)
+        self.count += 1
+        return name
+
+def conjunction(terms: list[str]) -> str:
+    return " && ".join(terms) if terms else "true"
+
+def disjunction(terms: list[str]) -> str:
+    return " || ".join(terms) if terms else "false"
+
+def nested_if(cases: list[tuple[str, str]], otherwise: str, indent: int) -> str:
+    """Writes the cases as nested if(condition, value, ...) expressions, one case per line"""
+    text = otherwise
+    for depth, (condition, value) in reversed(list(enumerate(cases))):
+        text = f"if({condition}, {value},\n{' ' * (indent + 2 * (depth + 1))}{text} )"
+    return text
+
+def elevator_prelude(features: list[str]) -> str:
+    """Returns the definition of the features and feature expressions of the elevator for the given features"""
+    with open(os.path.join(CASES_PATH, "elevator", "elevator.mcrl2"), encoding="utf-8") as f:
+        prelude, separator, _ = f.read().partition(ELEVATOR_PRELUDE_END)
+
+    if not separator:
+        raise ValueError(f"The elevator specification does not contain '{ELEVATOR_PRELUDE_END}'")
+
+    struct = f"Feature = struct {' | '.join(ELEVATOR_FEATURES)};"
+    if struct not in prelude:
+        raise ValueError(f"The elevator specification does not define '{struct}'")
+
+    return prelude.replace(struct, f"Feature = struct {' | '.join(features)};") + ELEVATOR_PRELUDE_END + "\n"
+
+def elevator_spec(floors: int, features: list[str]) -> str:
+    """Returns the elevator specification with the given number of floors, where the features beyond those of
+       the elevator do not guard any transition"""
+    levels = range(1, floors + 1)
+    guard = "!(ef != 0 && lc == ef) && "
+    call_down = nested_if([(f"ll({i}) && f > {i - 1}", str(i)) for i in reversed(levels) if i > 1] + [("ll(1)", "1")], "0", 34)
+    call_up = nested_if([(f"ll({i}) && f < {i + 1}", str(i)) for i in levels if i < floors] + [(f"ll({floors})", str(floors))], "0", 34)
+    lift_down = nested_if([(f"{guard}ll({i}) && f > {i - 1}", str(i)) for i in reversed(levels) if i > 1] + [(f"{guard}ll(1)", "1")], "0", 45)
+    lift_up = nested_if([(f"{guard}ll({i}) && f < {i + 1}", str(i)) for i in levels if i < floors] + [(f"{guard}ll({floors})", str(floors))], "0", 45)
+    priority = nested_if([(f"f1 == {i} && ll(f1)", str(i)) for i in levels], "call(d,f2,ll)", 29)
+    idle = " && ".join(f"ll({i}) == false" for i in levels)
+    actions = ",\n".join(
+        ["  direction_down", "  direction_up"]
+        + [f"  {action}_{i}" for action in ELEVATOR_FLOOR_ACTIONS for i in levels]
+        + ["  overload_off", "  overload_on"]
+    )
+
+    return elevator_prelude(features) + f"""
+
+sort
+  Door = struct open | closed;
+  Direction = struct up | down;
+  Floor = Nat;
+  Buttons = Floor -> Bool;
+  Signal = struct on | off;
+
+map
+  no_dest : Buttons;
+  call : Direction # Floor # Buttons -> Floor;
+  lift_call : Floor # Floor # Direction # Floor # Buttons -> Floor;
+  door_function : Floor # Floor # Floor -> Door;
+  idle : Buttons # Buttons -> Bool;
+  idle : Buttons -> Bool;
+  priority_call : Floor # Floor # Direction # Buttons -> Floor;
+
+  next_level     : Floor # Floor # Door # Direction # Buttons # Buttons -> Floor;
+  next_direction : Floor # Floor # Direction # Buttons # Buttons -> Direction;
+
+var
+  n:Nat;
+eqn
+  no_dest(n) = false;
+
+var
+  d:Direction;
+  ef,f,f1,f2,f3,lc:Floor;
+  ll,l1,l2:Buttons;
+  d':Door;
+eqn
+  (d == down) -> call(d,f,ll) =  {call_down};
+
+  (d == up)   -> call(d,f,ll) =  {call_up};
+
+  (d == down) -> lift_call(ef,lc,d,f,ll) =  {lift_down};
+
+  (d == up)   -> lift_call(ef,lc,d,f,ll) =  {lift_up};
+
+  f1 == f2 -> door_function(f1,f2,f3) = open;
+  f1 == f3 -> door_function(f1,f2,f3) = open;
+  f1 != f2 && f1 != f3 -> door_function(f1,f2,f3) = closed;
+
+  idle(ll) = {idle};
+  idle(l1,l2) = idle(l1) && idle(l2);
+
+  % l1 is liftbuttons; l2 is landingbuttons
+  next_level(f1,f2,d',d,l1,l2) = if(d' == open, f2,
+                             if(lift_call(f1,priority_call(f1,f2,d,l2),d,f2,l1) == 0 && priority_call(f1,f2,d,l2) == 0, f2,
+                                if(d == up && f2 < {floors}, f2+1,
+                                  if(d == down && f2 > 1, Int2Nat(f2-1), f2)
+                                  )
+                                )
+                             );
+
+  next_direction(f1,f2,d,l1,l2) = if(idle(l1,l2), d,
+                                     if(f2 == {floors}, down,
+                                       if(f2 == 1, up,
+                                         if(lift_call(f1,priority_call(f1,f2,d,l2),d,f2,l1) == 0 && priority_call(f1,f2,d,l2) == 0,
+                                           if(d == down, up, down),
+                                           d)
+                                         )
+                                       )
+                                     );
+
+  priority_call(f1,f2,d,ll) = {priority};
+
+act
+ landingButton, liftButton, open,Level : Floor;
+ direction : Direction;
+ close;
+ executive : FExpr # Signal # Floor; executive : FExpr # Signal;
+ overload: FExpr # Signal;
+ parking, ttfull, empty : FExpr;
+ idling: FExpr # Floor;
+
+% Actions without feature expressions and no parameters
+act
+  parking, ttfull, empty;
+{actions};
+
+proc Lift(level:Floor, door:Door, direction:Direction, liftbuttons,landingbuttons:Buttons, parking:Bool, ttfull:Bool, overload:Bool, executive:Floor,empty:Bool)
+=
+( (parking && level != 1) -> landingButton(1). Lift(parking = false) )
++
+sum i: Nat. (1 <= i && i <= {floors}) ->
+( (!landingbuttons(i) && !ttfull) ->
+                           ( !parking -> ( (i != executive && (level != i || door == closed)) -> landingButton(i) . Lift(landingbuttons = landingbuttons[i -> true], parking = false )
+                                         + (i == executive && (level != i || door == closed)) -> landingButton(i) . Lift(landingbuttons = landingbuttons[i -> true], parking = false )
+                                         )
+                                      <>
+                                         ( (i != executive && (level != i || door == closed)) -> landingButton(i) . Lift(landingbuttons = (landingbuttons[1 ->false])[i -> true], parking = false )
+                                         + (i == executive && (level != i || door == closed)) -> landingButton(i) . Lift(landingbuttons = (landingbuttons[1 ->false])[i -> true], parking = false )
+                                         )
+              )
++
+  (!liftbuttons(i) && level != i ) ->
+                                       ( (!parking)  -> ( (!empty -> liftButton(i). Lift(liftbuttons = liftbuttons[i -> true] ) ) )
+                                                     <>
+                                                        ( (!empty -> liftButton(i). Lift(landingbuttons = landingbuttons[1 -> false], liftbuttons = liftbuttons[i -> true], parking = false ) ) )
+                                       )
+
++
+  (executive == 0) -> executive(atom(Ex),on,i). Lift(executive = i)
+)
++
+sum d':Door. ( d' == door_function(level, lift_call(executive, call(direction,level,landingbuttons),direction,level,liftbuttons), priority_call(executive,level,direction,landingbuttons)  ) ) ->
+(
+  (d' != door ) ->
+      (
+        (d' == open) ->
+                     (
+                        (
+                          (executive == 0 || level != executive) -> open(level). Lift (door = d', liftbuttons = liftbuttons[level -> false], landingbuttons = landingbuttons[level -> false], parking = false, ttfull= false, empty = false )
+                                                                <> open(level). Lift (door = d', liftbuttons = liftbuttons[level -> false], landingbuttons = landingbuttons[level -> false], parking = false, ttfull= false, empty = false, executive = 0 )
+                        )
+                      +
+                        (ttfull && !idle(liftbuttons[level -> false])) -> open(level). Lift (door = d', liftbuttons = liftbuttons[level -> false], landingbuttons = landingbuttons[level -> false], parking = false, empty = false )
+                     )
+       <>
+                     (
+                        (
+                          (!overload) ->
+                                         close. Lift (door = d')
+                                       +
+                                         (!idle(liftbuttons)) -> ttfull(atom(TTF)). close.  Lift (door = d', landingbuttons = no_dest, ttfull = true)
+                         )
+                    +
+                      (!idle(liftbuttons) && !overload && !empty) -> empty(atom(EC)). Lift (liftbuttons = no_dest, empty = true)
+                    +
+                      (!idle(liftbuttons) && !overload) -> overload(atom(O),on). Lift(overload = !overload)
+                    + (!idle(liftbuttons) && overload) -> overload(atom(O),off). Lift(overload = !overload)
+                     )
+       )
+  <>
+     (
+      sum d:Direction. (d == next_direction(executive,level,direction,liftbuttons,landingbuttons) ) ->
+        (
+          (d != direction) -> direction(d). Lift(direction = d)
+                           <>
+                           ( sum f:Floor.  (f == next_level(executive,level,door,direction,liftbuttons,landingbuttons) ) ->
+                               (
+                                 (level != f) -> Level(f). Lift(level = f)
+                                              <>
+                                                 (
+                                                  (level == 1) -> idling(atom(P),level). Lift ()
+                                                +
+                                                  (level != 1) -> parking(atom(P)). Lift (landingbuttons = landingbuttons[1 -> true],  parking = true)
+                                                +
+                                                  idling(neg(atom(P)),level). Lift ()
+                                                 )
+                               )
+                            )
+        )
+    )
+)
+;
+
+init Lift(1, closed, down,no_dest,no_dest,false,false,false,0,true);
+"""
+
+def elevator_actionrename(floors: int) -> str:
+    """Returns the renaming of the floor parameters of the elevator actions into separate actions"""
+    levels = range(1, floors + 1)
+    lines = ["direction(down)=direction_down", "direction(up)=direction_up"]
+    lines += [f"executive(node(Ex, tt, ff), on, {i})=executive_on_{i}(node(Ex, tt, ff))" for i in levels]
+    lines += [f"idling(node(P, ff, tt), {i})=idling_{i}(node(P, ff, tt))" for i in levels]
+    lines += ["idling(node(P, tt, ff), 1)=idling_1(node(P, tt, ff))"]
+    lines += [f"landingButton({i})=landingButton_{i}" for i in levels]
+    lines += [f"Level({i})=level_{i}" for i in levels]
+    lines += [f"liftButton({i})=liftButton_{i}" for i in levels]
+    lines += [f"open({i})=open_{i}" for i in levels]
+    lines += ["overload(node(O, tt, ff), off)=overload_off(node(O, tt, ff))", "overload(node(O, tt, ff), on)=overload_on(node(O, tt, ff))"]
+    return "\n".join(lines) + "\n"
+
+def elevator_properties(floors: int) -> dict[str, str]:
+    """Returns the properties of the elevator for the given number of floors, by file name"""
+    levels = range(1, floors + 1)
+    middle = range(2, floors)
+    fresh = FreshNames()
+    opened = disjunction([f"open_{i}" for i in levels])
+
+    def eventually_open(button: str, i: int, avoid: str | None = None) -> str:
+        variable = fresh()
+        avoiding = f" && [{avoid}]false" if avoid is not None else ""
+        return f"[{button}_{i}](mu {variable}. [!open_{i}]{variable}{avoiding} && <true>true)"
+
+    properties = {}
+
+    # A pressed landing or lift button is eventually followed by opening the doors on that floor. The variables
+    # are named as in cases/elevator, where the first variable of property 2 has no number.
+    fresh.reset(0, 0)
+    terms = [eventually_open("landingButton", i) for i in levels]
+    properties["property1.mcf"] = f"nu Z. {conjunction(terms + ['[true]Z'])}"
+
+    fresh.reset(1)
+    terms = [eventually_open("liftButton", i) for i in levels]
+    terms[0] = terms[0].replace("Y1", "Y")
+    properties["property2.mcf"] = f"nu X. {conjunction(terms + ['[true]X'])}"
+
+    # While travelling up (down) with calls in that direction, the lift does not change its direction. This is
+    # the formula of cases/elevator/property3.mcf, including its deviations from the commented definition there:
+    # an outer mu Z0, the second half also after direction_up, and liftButton(2), which is not renamed, in the
+    # second half. For five floors it is identical to that file.
+    def calls(i: int, targets: list[int], avoid: str) -> str:
+        terms = [
+            eventually_open("liftButton", j, avoid).replace("[liftButton_2]", "[liftButton(2)]")
+            if avoid == "direction_up" else eventually_open("liftButton", j, avoid)
+            for j in targets
+        ]
+        if not terms:
+            return f"[open_{i}]true"
+        return f"[open_{i}]{terms[0]}" if len(terms) == 1 else f"[open_{i}]({conjunction(terms)})"
+
+    fresh.reset()
+    invariant, up = fresh(), fresh()
+    up_terms = [calls(i, [j for j in levels if j > i], "direction_down") for i in levels]
+    down = fresh()
+    down_terms = [calls(i, [j for j in levels if j < i], "direction_up") for i in levels]
+    up_terms.append(f"[!(direction_down || {opened})]{up}")
+    down_terms.append(f"[!(direction_up || {opened})]{down}")
+    properties["property3.mcf"] = (
+        f"mu Z0. nu {invariant}. [direction_up](nu {up}. {conjunction(up_terms)})"
+        f" && [direction_up](nu {down}. {conjunction(down_terms)}) && [true]{invariant}"
+    )
+
+    # The doors do not invariantly open eventually after they closed, with the unused mu Z0 of cases/elevator.
+    properties["property4.mcf"] = (
+        f"mu Z0. mu X1. <!close && !({opened})>X1 || <{opened}>(mu Y1. <!close && !({opened})>Y1 || <{opened}>Y1 || <close>X1)"
+        f" || <close>X1 || (nu Z1. <!({opened})>Z1 || <{opened}>(nu X2. false) || [true]false)"
+    )
+
+    # The lift can idle on every floor, and remain idling there.
+    fresh.reset(1)
+    reach = []
+    for i in levels:
+        variable = fresh()
+        reach.append(f"(mu {variable}. <idling_{i}>true || <true>{variable})")
+    invariant = fresh()
+    remain = []
+    for i in levels:
+        variable = fresh()
+        remain.append(f"[idling_{i}](nu {variable}. <idling_{i}>{variable})")
+    remain.append(f"[true]{invariant}")
+    reach.append(f"(nu {invariant}. {conjunction(remain)})")
+    properties["property5.mcf"] = f"nu X. {conjunction(reach)}"
+
+    # The lift may stop at the middle floors for landing calls when travelling up, respectively down.
+    for name, direction, opposite in [("property6.mcf", "direction_up", "direction_down"), ("property7.mcf", "direction_down", "direction_up")]:
+        fresh.reset()
+        terms = []
+        for i in middle:
+            outer, inner = fresh(), fresh()
+            terms.append(
+                f"(mu {outer}. <{direction}>(mu {inner}. <open_{i}>true || <!(liftButton_{i} || {opposite})>{inner}) || <!liftButton_{i}>{outer})"
+            )
+        properties[name] = f"nu X. {conjunction(terms)}"
+
+    return properties
+
+def generate_elevator(directory: str, floors: int, free_features: int = 0) -> Experiment:
+    """Writes an elevator case with the given number of floors, and optional features that guard no transition
+       but multiply the number of products, to the directory. Returns the generated case."""
+    if floors < 3:
+        raise ValueError(f"The elevator needs at least three floors, got {floors}")
+
+    features = ELEVATOR_FEATURES + [f"F{i}" for i in range(1, free_features + 1)]
+    os.makedirs(directory, exist_ok=True)
+    spec = f"elevator{floors}.mcrl2" if free_features == 0 else f"elevator{floors}_{free_features}.mcrl2"
+
+    files = {
+        spec: elevator_spec(floors, features),
+        "actionrename": elevator_actionrename(floors),
+        "FD": ",".join(features) + "\ntt",
+        **elevator_properties(floors),
+    }
+
+    # Unchanged files are not rewritten, such that the generated games are restored from the cache.
+    for name, text in files.items():
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                unchanged = f.read() == text
+        except OSError:
+            unchanged = False
+
+        if not unchanged:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+    return Experiment(directory, spec, sorted(name for name in files if name.endswith(".mcf")))
+
+def case_name(floors: int, free_features: int) -> str:
+    return f"elevator{floors}" if free_features == 0 else f"elevator{floors}_{free_features}"
+
+def sweep(
+    logger: MyLogger,
+    bins: tuple[str, str, str],
+    output_dir: str,
+    sizes: list[tuple[int, int]],
+    properties: list[str],
+    variants: list[str],
+    options: SolveOptions,
+    rule: StoppingRule,
+    jobs: int = 1,
+    cache_directory: str = CACHE_PATH,
+) -> list[dict]:
+    """Generates, prepares and solves the elevator for every (floors, free features), and returns a point per
+       size, property and variant with the median solving time and the peak memory of the solver"""
+    mcrl22lps_bin, lps2lts_bin, merc_vpg_bin = bins
+    points = []
+    for floors, free_features in sizes:
+        experiment = generate_elevator(os.path.join(output_dir, "cases", case_name(floors, free_features)), floors, free_features)
+        selected = [prop for prop in experiment.properties if prop in properties]
+
+        logger.info(f"Preparing {experiment.name} with {floors} floors and {free_features} free features")
+        prepare(experiment, selected, logger, mcrl22lps_bin, lps2lts_bin, merc_vpg_bin, jobs, cache_directory)
+
+        diagram = read_fd(experiment.path(experiment.fd))
+        for prop in selected:
+            file = experiment.game_file(prop)
+            options.capacities.features[file] = len(diagram.features)
+            options.products[file] = diagram.count()
+
+            for variant in variants:
+                result = run_experiment(logger, merc_vpg_bin, experiment.spec, file, variant, output_dir, options, rule)
+                times = result["statistics"]["times"]
+                point = {
+                    "case": experiment.name,
+                    "floors": floors,
+                    "features": len(diagram.features),
+                    "products": options.products[file],
+                    "property": prop,
+                    "vertices": count_lines(file),
+                    "variant": variant,
+                    "time": times["value"] if times is not None else None,
+                    "max_rss_kb": max((measurement["max_rss_kb"] for measurement in result["measurements"]), default=None),
+                    "outcomes": sorted(set(result["outcomes"])),
+                }
+
+                with open(os.path.join(output_dir, "scaling.json"), "a", encoding="utf-8") as f:
+                    json.dump(point, f)
+                    f.write("\n")
+                points.append(point)
+
+    return points
+
+def curves(points: list[dict]) -> list[list[str]]:
+    """Returns a row per variant and size with the total solving time and the peak memory over all properties,
+       where a size in which a property failed has no total time"""
+    totals: dict[tuple[str, int, int], list[dict]] = {}
+    for point in points:
+        totals.setdefault((point["variant"], point["floors"], point["features"]), []).append(point)
+
+    rows = []
+    for (variant, floors, features), group in sorted(totals.items()):
+        times = [point["time"] for point in group]
+        memory = [point["max_rss_kb"] for point in group if point["max_rss_kb"] is not None]
+        rows.append([
+            variant,
+            str(floors),
+            str(features),
+            str(group[0]["products"]),
+            str(sum(point["vertices"] for point in group)),
+            f"{sum(times):.3f}" if None not in times else "-",
+            f"{max(memory) / 1024:.1f}" if memory else "-",
+        ])
+
+    return rows
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="scaling.py",
+        description="Generates elevator cases of increasing size, and measures how the solving time and memory of "
+                    "every variant grow with the number of floors and features.",
+        epilog="",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Writes an elevator case with the given number of floors")
+    generate_parser.add_argument(dest="directory", action="store", type=str)
+    generate_parser.add_argument("--floors", action="store", type=int, default=5)
+    generate_parser.add_argument(
+        "--free-features", action="store", type=int, default=0,
+        help="Number of additional features that guard no transition, each doubles the number of products",
+    )
+
+    sweep_parser = subparsers.add_parser("sweep", help="Generates, prepares and solves the elevator for every size")
+    sweep_parser.add_argument(dest="mcrl2_binpath", action="store", type=str)
+    sweep_parser.add_argument(dest="merc_binpath", action="store", type=str)
+    sweep_parser.add_argument(dest="output", action="store", type=str)
+    sweep_parser.add_argument("--property", action="append", type=str, default=None, help="Glob pattern of the properties to solve")
+    sweep_parser.add_argument("--variant", action="append", type=str, default=None, help="Glob pattern of the variants to solve")
+    sweep_parser.add_argument("--floors", action="store", type=int, nargs="+", default=[3, 4, 5, 6, 7])
+    sweep_parser.add_argument("--free-features", action="store", type=int, nargs="+", default=[0])
+    sweep_parser.add_argument("--timeout", action="store", type=float, default=None, help="Wall-clock time limit per run")
+    sweep_parser.add_argument("--memory-limit-mb", action="store", type=int, default=None)
+    sweep_parser.add_argument("--warmup", action="store", type=int, default=0)
+    sweep_parser.add_argument("--min-runs", action="store", type=int, default=1)
+    sweep_parser.add_argument("--max-runs", action="store", type=int, default=3)
+    sweep_parser.add_argument("--ci-width", action="store", type=float, default=0.05)
+    sweep_parser.add_argument("--jobs", action="store", type=int, default=1, help="Number of preparation steps to run concurrently")
+    sweep_parser.add_argument(
+        "--cache-dir", action="store", type=str, default=CACHE_PATH,
+        help="Directory in which the generated files are cached by the content of their inputs",
+    )
+    sweep_parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="markdown")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        experiment = generate_elevator(args.directory, args.floors, args.free_features)
+        print(f"Wrote {experiment.spec} with {len(experiment.properties)} properties to {experiment.directory}", file=sys.stderr)
+        return
+
+    bins = (
+        shutil.which("mcrl22lps", path=args.mcrl2_binpath),
+        shutil.which("lps2lts", path=args.mcrl2_binpath),
+        find_binary(args.merc_binpath),
+    )
+    if None in bins:
+        logging.error(f"Could not find one of the required binaries {bins}")
+        exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = MyLogger("main", os.path.join(args.output, "scaling.log"))
+
+    sizes = [(floors, free_features) for free_features in args.free_features for floors in args.floors]
+    properties = [name for name in elevator_properties(max(args.floors)) if matches(os.path.splitext(name)[0], args.property)]
+
+    points = sweep(
+        logger,
+        bins,
+        args.output,
+        sizes,
+        properties,
+        select_variants(args, VARIANTS),
+        SolveOptions(timeout=args.timeout, memory_limit_mb=args.memory_limit_mb),
+        StoppingRule(args.warmup, args.min_runs, args.max_runs, args.ci_width),
+        args.jobs,
+        args.cache_dir,
+    )
+
+    write_table(
+        args.format,
+        ["variant", "floors", "features", "products", "vertices", "total time (s)", "peak memory (MB)"],
+        curves(points),
+        sys.stdout,
+    )
+
+if __name__ == "__main__":
+    main()
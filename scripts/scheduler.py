@@ -0,0 +1,99 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+def physical_cores() -> list[int]:
+    """Returns one logical cpu for every physical core that this process is allowed to run on."""
+    allowed = sorted(os.sched_getaffinity(0))
+
+    cores: dict[tuple[str, str], int] = {}
+    for cpu in allowed:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology/"
+        try:
+            with open(topology + "physical_package_id", encoding="utf-8") as f:
+                package = f.read().strip()
+            with open(topology + "core_id", encoding="utf-8") as f:
+                core = f.read().strip()
+        except OSError:
+            # No topology information available, treat every logical cpu as a core.
+            package, core = "0", str(cpu)
+
+        cores.setdefault((package, core), cpu)
+
+    return sorted(cores.values())
+
+# The core that the current worker process has been pinned to.
+_pinned_core: int | None = None
+
+def _pin_worker(core_queue, initializer, initargs):
+    """Pins the worker process to the next free core, and runs the user initializer."""
+    global _pinned_core
+    _pinned_core = core_queue.get()
+    os.sched_setaffinity(0, {_pinned_core})
+
+    if initializer is not None:
+        initializer(_pinned_core, *initargs)
+
+def pinned_core() -> int | None:
+    """Returns the core that the current worker has been pinned to, if any."""
+    return _pinned_core
+
+class CorePinnedPool(ProcessPoolExecutor):
+    """A process pool in which every worker runs exclusively on its own physical core.
+
+       The initializer, if given, is called with the core as first argument followed by initargs."""
+
+    def __init__(self, max_workers: int, initializer=None, initargs=()):
+        cores = physical_cores()
+        if max_workers > len(cores):
+            logging.warning(f"Requested {max_workers} workers, but only {len(cores)} physical cores are available")
+            max_workers = len(cores)
+
+        self.cores = cores[:max_workers]
+
+        context = multiprocessing.get_context()
+        core_queue = context.Queue()
+        for core in self.cores:
+            core_queue.put(core)
+
+        ProcessPoolExecutor.__init__(
+            self,
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_pin_worker,
+            initargs=(core_queue, initializer, initargs),
+        )
+
+def job_key(experiment: str, file: str, solve_variant: str) -> tuple[str, str, str]:
+    """The key under which timings of a job are matched between different runs."""
+    return (experiment, os.path.basename(file), solve_variant)
+
+def load_history(paths: list[str]) -> dict[tuple[str, str, str], float]:
+    """Loads the mean solving time of every job from previous results files, missing files are ignored."""
+    history: dict[tuple[str, str, str], float] = {}
+
+    for pattern in paths:
+        for path in glob.glob(pattern):
+            with open(path, encoding="utf-8") as json_file:
+                for line in json_file:
+                    try:
+                        json_data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    times = [time for time in json_data.get("times", []) if time is not None]
+                    if times:
+                        key = job_key(json_data["experiment"], json_data["file"], json_data["solve_variant"])
+                        history[key] = sum(times) / len(times)
+
+    return history
+
+def longest_first(jobs: list, history: dict, key) -> list:
+    """Orders the jobs such that the longest jobs according to the history are scheduled first.
+
+       Jobs without history are scheduled before all others since their duration is unknown."""
+    return sorted(jobs, key=lambda job: -history.get(key(job), float("inf")))
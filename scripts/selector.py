@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import math
+import os
+import sys
+
+from benchstats import geometric_mean, median
+from compare import failed, successful_times
+from fd import FeatureDiagram, read_fd
+from manifest import CASES_PATH, add_filter_arguments, load_experiment, matches
+from resultsdb import load_cases, property_name
+from tables import FORMATS, write_table
+
+# The value of --variant with which run.py lets the selector choose the variant of every game.
+AUTO_VARIANT = "auto"
+
+# The static features of a game, every feature is compared on a logarithmic scale.
+GAME_FEATURES = ["vertices", "edges", "priorities", "features", "products"]
+
+# The slowdown with respect to the fastest variant that is assumed for a variant that failed.
+FAILURE_PENALTY = 10.0
+
+# The smallest time in seconds that is distinguished from zero when computing slowdowns, since the solver reports
+# its times with millisecond precision.
+MIN_TIME = 0.001
+
+def count_successors(successors: str) -> int:
+    """Counts the comma separated successors of a vertex, where the guards can contain commas within parentheses"""
+    successors = successors.partition('"')[0].strip()
+    if not successors:
+        return 0
+
+    count = 1
+    depth = 0
+    for character in successors:
+        if character in "([{":
+            depth += 1
+        elif character in ")]}":
+            depth -= 1
+        elif character == "," and depth == 0:
+            count += 1
+
+    return count
+
+def read_game_statistics(game_file: str) -> tuple[int, int, int]:
+    """Returns the number of vertices, edges and distinct priorities of a game, read line by line.
+
+       Every vertex is written as '<vertex> <priority> <owner> <successors>;' where the successors may have
+       guards and be followed by a quoted label. Headers and other lines that do not start with a vertex and
+       priority are skipped."""
+    vertices = 0
+    edges = 0
+    priorities = set()
+    with open(game_file, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.strip().rstrip(";").split(None, 3)
+            if len(parts) < 3 or not parts[0].isdigit() or not parts[1].isdigit():
+                continue
+
+            vertices += 1
+            priorities.add(int(parts[1]))
+            if len(parts) == 4:
+                edges += count_successors(parts[3])
+
+    return vertices, edges, len(priorities)
+
+def game_features(game_file: str, diagram: FeatureDiagram) -> dict[str, int]:
+    """Returns the static features of a game with the given feature diagram"""
+    vertices, edges, priorities = read_game_statistics(game_file)
+    return {
+        "vertices": vertices,
+        "edges": edges,
+        "priorities": priorities,
+        "features": len(diagram.features),
+        "products": diagram.count(),
+    }
+
+def locate_game(file: str, cases_path: str = CASES_PATH) -> str:
+    """Returns the game of a results entry, which is looked up by its case and property in the cases directory
+       when the recorded path does not exist, for example for results measured on another machine"""
+    if os.path.exists(file):
+        return file
+
+    case = os.path.basename(os.path.dirname(os.path.dirname(file.replace("\\", "/"))))
+    return os.path.join(cases_path, case, "tmp", property_name(file))
+
+def fastest_time(game: dict) -> float:
+    """Returns the median time of the fastest variant of a game"""
+    return min(time for time in game["times"].values() if time is not None)
+
+def slowdown(game: dict, variant: str) -> float:
+    """Returns how many times slower the variant solved the game than the fastest variant, where both times are
+       at least MIN_TIME such that a time rounded to zero does not hide a slow choice"""
+    time = game["times"][variant]
+    if time is None:
+        return FAILURE_PENALTY
+
+    return max(time, MIN_TIME) / max(fastest_time(game), MIN_TIME)
+
+class VariantSelector:
+    """Predicts the fastest variant of a game from its static features with the k nearest games of the training data.
+
+       The features are compared on a logarithmic scale normalised by their spread in the training data. Every
+       neighbour rates a variant by its slowdown with respect to the fastest variant of that neighbour, and the
+       variant with the smallest mean logarithmic slowdown is chosen."""
+
+    def __init__(self, games: list[dict], k: int = 3):
+        # Every game is a dictionary with its file, features and the median time per variant, None if it failed.
+        self.games = [game for game in games if any(time is not None for time in game["times"].values())]
+        self.k = k
+
+        self.scales = {}
+        for feature in GAME_FEATURES:
+            values = [self.scaled(game["features"], feature) for game in self.games]
+            mean = sum(values) / len(values) if values else 0.0
+            deviation = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values)) if values else 0.0
+            self.scales[feature] = deviation if deviation > 0.0 else 1.0
+
+    @staticmethod
+    def scaled(features: dict[str, int], feature: str) -> float:
+        return math.log2(1 + features.get(feature, 0))
+
+    def distance(self, left: dict[str, int], right: dict[str, int]) -> float:
+        return math.sqrt(sum(
+            ((self.scaled(left, feature) - self.scaled(right, feature)) / self.scales[feature]) ** 2
+            for feature in GAME_FEATURES
+        ))
+
+    def neighbours(self, features: dict[str, int], exclude: str | None = None) -> list[dict]:
+        """Returns the k games of the training data that are nearest to the features"""
+        candidates = [game for game in self.games if game["file"] != exclude]
+        return sorted(candidates, key=lambda game: self.distance(features, game["features"]))[:self.k]
+
+    def select(self, features: dict[str, int], variants: list[str], exclude: str | None = None) -> str:
+        """Returns the variant that is predicted to solve a game with the given features fastest, where the
+           first variant is chosen when none of them occurs in the training data"""
+        scores: dict[str, list[float]] = {}
+        for game in self.neighbours(features, exclude):
+            for variant in game["times"]:
+                if variant in variants:
+                    scores.setdefault(variant, []).append(math.log(slowdown(game, variant)))
+
+        if not scores:
+            return variants[0]
+
+        return min(
+            (variant for variant in variants if variant in scores),
+            key=lambda variant: sum(scores[variant]) / len(scores[variant]),
+        )
+
+    def evaluate(self) -> dict:
+        """Predicts the variant of every training game from the other games, and compares the time of the prediction
+           with the fastest variant of the game, the oracle, and with always choosing the same variant.
+
+           The regret is the geometric mean of the slowdowns with respect to the oracle, where a failed variant
+           counts as FAILURE_PENALTY times slower and times below MIN_TIME count as MIN_TIME."""
+        variants = sorted({variant for game in self.games for variant in game["times"]})
+        correct = 0
+        slowdowns: dict[str, list[float]] = {"selector": [], **{variant: [] for variant in variants}}
+        totals: dict[str, float] = {"selector": 0.0, "oracle": 0.0}
+        predictions = []
+
+        for game in self.games:
+            measured = sorted(game["times"])
+            best_time = fastest_time(game)
+            oracle = min((variant for variant in measured if game["times"][variant] is not None), key=game["times"].get)
+            predicted = self.select(game["features"], measured, exclude=game["file"])
+
+            correct += predicted == oracle
+            slowdowns["selector"].append(slowdown(game, predicted))
+            for variant in variants:
+                if variant in game["times"]:
+                    slowdowns[variant].append(slowdown(game, variant))
+            totals["oracle"] += best_time
+            predicted_time = game["times"][predicted]
+            totals["selector"] += predicted_time if predicted_time is not None else max(best_time, MIN_TIME) * FAILURE_PENALTY
+            predictions.append({"file": game["file"], "predicted": predicted, "oracle": oracle})
+
+        return {
+            "games": len(self.games),
+            "k": self.k,
+            "accuracy": correct / len(self.games) if self.games else None,
+            "regret": {name: geometric_mean(values) if values else None for name, values in slowdowns.items()},
+            "total_times": totals,
+            "predictions": predictions,
+        }
+
+    def save(self, filename: str, report: dict | None = None):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({"k": self.k, "features": GAME_FEATURES, "games": self.games, "report": report}, f, indent=2)
+
+    @staticmethod
+    def load(filename: str) -> "VariantSelector":
+        with open(filename, encoding="utf-8") as f:
+            model = json.load(f)
+
+        return VariantSelector(model["games"], model["k"])
+
+def collect_games(args, paths: list[str], cases_path: str = CASES_PATH) -> list[dict]:
+    """Returns the features and median time per variant of every game in the results files that match the filters.
+
+       Entries of the sharded variant and of a portfolio combine the runs of several processes and are skipped,
+       as are the games that are no longer available to extract the features from. Results of labelled binaries
+       are only used when that label is given as --binary."""
+    games: dict[str, dict] = {}
+    diagrams: dict[str, FeatureDiagram] = {}
+    for path in paths:
+        for experiment, properties in load_cases(path, {"times", "outcomes", "extra"}, binary=args.binary).items():
+            for prop, variants in properties.items():
+                for variant, entry in variants.items():
+                    if "shards" in entry or "portfolio" in entry:
+                        continue
+
+                    game_file = locate_game(entry["file"], cases_path)
+                    case_directory = os.path.dirname(os.path.dirname(os.path.abspath(game_file)))
+                    case = os.path.basename(case_directory)
+                    if not matches(case, args.case) or not matches(os.path.splitext(prop)[0], args.property):
+                        continue
+                    if not matches(variant, args.variant):
+                        continue
+
+                    if game_file not in games:
+                        if not os.path.exists(game_file):
+                            print(f"Skipping {entry['file']} since {game_file} does not exist", file=sys.stderr)
+                            games[game_file] = None
+                            continue
+
+                        if case_directory not in diagrams:
+                            case_experiment = load_experiment(case_directory)
+                            diagrams[case_directory] = read_fd(os.path.join(case_directory, case_experiment.fd if case_experiment is not None else "FD"))
+
+                        games[game_file] = {
+                            "file": game_file,
+                            "features": game_features(game_file, diagrams[case_directory]),
+                            "times": {},
+                        }
+
+                    if games[game_file] is None:
+                        continue
+
+                    times = successful_times(entry)
+                    games[game_file]["times"][variant] = median(times) if times and not failed(entry) else None
+
+    return [game for game in games.values() if game is not None]
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="selector.py",
+        description="Trains a selector that predicts the fastest solve variant of a game from its static features, "
+                    "and reports its leave-one-out accuracy and regret with respect to the fastest variant.",
+        epilog="",
+    )
+    parser.add_argument(dest="model", action="store", type=str, help="File to which the selector is written")
+    parser.add_argument(dest="results", action="store", type=str, nargs="+", help="Results files or databases to train on")
+    add_filter_arguments(parser)
+    parser.add_argument("--k", action="store", type=int, default=3, help="Number of nearest games that vote")
+    parser.add_argument(
+        "--binary", action="store", type=str, default=None,
+        help="Trains on the results of the binary with this label, as given to run.py --binary",
+    )
+    parser.add_argument("--format", action="store", type=str, choices=FORMATS, default="markdown")
+
+    args = parser.parse_args()
+
+    games = collect_games(args, args.results)
+    if not games:
+        print("No games with successful runs found in the results", file=sys.stderr)
+        exit(1)
+
+    selector = VariantSelector(games, args.k)
+    report = selector.evaluate()
+    selector.save(args.model, report)
+
+    rows = [
+        [os.path.relpath(prediction["file"]), prediction["predicted"], prediction["oracle"]]
+        for prediction in report["predictions"]
+    ]
+    write_table(args.format, ["game", "predicted", "fastest"], rows, sys.stdout)
+
+    print(f"Accuracy {report['accuracy']:.2f} on {report['games']} games with k = {report['k']}", file=sys.stderr)
+    for name, regret in report["regret"].items():
+        if regret is not None:
+            print(f"Regret of {name}: {regret:.3f} times slower than the fastest variant", file=sys.stderr)
+    print(
+        f"Total time {report['total_times']['selector']:.3f}s with the selector, "
+        f"{report['total_times']['oracle']:.3f}s with the fastest variants",
+        file=sys.stderr,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+
+from buildcache import BuildGraph
+from fd import FeatureDiagram, read_fd
+from manifest import Experiment
+from prepare import add_game_task, renamed_aut_file
+
+def shard_prefixes(diagram: FeatureDiagram, count: int) -> list[str]:
+    """Returns the shortest prefixes of the feature order that split the valid products into at least the
+       given number of non-empty shards, or the products themselves when there are fewer"""
+    for length in range(0, len(diagram.features) + 1):
+        prefixes = list(diagram.prefixes(length))
+        if len(prefixes) >= count:
+            return prefixes
+
+    return prefixes
+
+def restrict_prefix(diagram: FeatureDiagram, prefix: str) -> FeatureDiagram:
+    """Returns the diagram of the valid products that start with the prefix"""
+    return diagram.restrict({feature: value == "1" for feature, value in zip(diagram.features, prefix)})
+
+def shard_file(experiment: Experiment, prop: str, prefix: str, extension: str = ".svpg") -> str:
+    """The file of the shard of the game of a property in which the features of the prefix are fixed"""
+    stem, _ = os.path.splitext(prop)
+    return os.path.join(experiment.tmp_directory, "shards", f"{stem}.{prefix or 'all'}{extension}")
+
+def add_shard_tasks(
+    graph: BuildGraph,
+    merc_vpg_bin: str,
+    experiment: Experiment,
+    prop: str,
+    count: int,
+) -> dict[str, str]:
+    """Writes the restricted feature diagram of every shard of the game of the property, and adds the tasks
+       that generate their games to the graph. Returns the game file of every shard by its prefix."""
+    diagram = read_fd(experiment.path(experiment.fd))
+    os.makedirs(os.path.join(experiment.tmp_directory, "shards"), exist_ok=True)
+
+    games = {}
+    for prefix in shard_prefixes(diagram, count):
+        fd_file = shard_file(experiment, prop, prefix, ".FD")
+        text = restrict_prefix(diagram, prefix).serialise()
+
+        # The diagram is only rewritten when it changes, such that the game is restored from the cache.
+        try:
+            with open(fd_file, encoding="utf-8") as f:
+                unchanged = f.read() == text
+        except OSError:
+            unchanged = False
+
+        if not unchanged:
+            with open(fd_file, "w", encoding="utf-8") as f:
+                f.write(text)
+
+        game_file = shard_file(experiment, prop, prefix)
+        add_game_task(graph, merc_vpg_bin, fd_file, renamed_aut_file(experiment), experiment.path(prop), game_file)
+        games[prefix] = game_file
+
+    return games
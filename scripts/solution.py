@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import zlib
+
+def to_bitset(vertices) -> int:
+    """Converts an iterable of vertices into a bitset in which bit v is set iff vertex v is in the list"""
+    bits = bytearray()
+    for vertex in vertices:
+        index = vertex >> 3
+        if index >= len(bits):
+            bits.extend(bytes(index - len(bits) + 1))
+        bits[index] |= 1 << (vertex & 7)
+
+    return int.from_bytes(bits, "little")
+
+def from_bitset(bits: int) -> list[int]:
+    """Returns the sorted vertices in the bitset"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return [8 * index + bit for index, byte in enumerate(data) if byte for bit in range(8) if byte >> bit & 1]
+
+def encode_bitset(bits: int) -> str:
+    """Serialises a bitset as base64 of its compressed little-endian bytes"""
+    if bits == 0:
+        return ""
+
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return base64.b64encode(zlib.compress(data, 9)).decode("ascii")
+
+def decode_bitset(text: str) -> int:
+    """Inverse of encode_bitset"""
+    if not text:
+        return 0
+
+    return int.from_bytes(zlib.decompress(base64.b64decode(text)), "little")
+
+def digest(even: int, odd: int) -> str:
+    """A stable hash of the vertices won by both players in a single product"""
+    h = hashlib.sha256()
+    for bits in (even, odd):
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        h.update(len(data).to_bytes(8, "little") + data)
+
+    return h.hexdigest()[:32]
+
+def encode_solution(solution: dict[str, dict[str, int]], digests: bool = False) -> dict:
+    """Serialises the solution of a single run, given as bitsets of the vertices won by each player per product.
+
+       Every distinct bitset is stored once, and products refer to them by index. In digest mode only a
+       hash of the winning vertices is stored per product."""
+    if digests:
+        return {"digests": {
+            product: digest(winners.get("0", 0), winners.get("1", 0)) for product, winners in solution.items()
+        }}
+
+    sets: list[str] = []
+    indices: dict[int, int] = {}
+    products = {}
+    for product, winners in solution.items():
+        pair = []
+        for bits in (winners.get("0", 0), winners.get("1", 0)):
+            if bits not in indices:
+                indices[bits] = len(sets)
+                sets.append(encode_bitset(bits))
+            pair.append(indices[bits])
+        products[product] = pair
+
+    return {"sets": sets, "products": products}
+
+def add_solution(result: dict, encoded: dict):
+    """Records the encoded solution of the next repetition, identical solutions are stored once"""
+    try:
+        index = result["solutions"].index(encoded)
+    except ValueError:
+        index = len(result["solutions"])
+        result["solutions"].append(encoded)
+
+    result["solution_runs"].append(index)
+
+def load_solutions(result: dict) -> list[dict[str, tuple[int, int] | str]]:
+    """Returns the solution of every repetition of a results.json entry, as a pair of bitsets of the vertices
+       won by even and odd per product, or the digest of that pair.
+
+       Entries written before solutions were encoded contain a list of vertices per repetition instead."""
+    if "solutions" not in result:
+        return [
+            {
+                product: (to_bitset(winners.get("0", [])), to_bitset(winners.get("1", [])))
+                for product, winners in solution.items()
+            }
+            for solution in result.get("solution", [])
+        ]
+
+    decoded = []
+    for encoded in result["solutions"]:
+        if "digests" in encoded:
+            decoded.append(dict(encoded["digests"]))
+        else:
+            sets = [decode_bitset(text) for text in encoded["sets"]]
+            decoded.append({product: (sets[even], sets[odd]) for product, (even, odd) in encoded["products"].items()})
+
+    return [decoded[index] for index in result["solution_runs"]]
+
+def same_winners(left: tuple[int, int] | str, right: tuple[int, int] | str) -> bool:
+    """Compares the winning vertices of a product, where either side can be a digest"""
+    if isinstance(left, str) or isinstance(right, str):
+        left = left if isinstance(left, str) else digest(*left)
+        right = right if isinstance(right, str) else digest(*right)
+
+    return left == right
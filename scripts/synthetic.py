@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+from buildcache import BuildGraph, Task
+from manifest import MANIFEST_NAME, Experiment, load_experiment
+
+# Changes whenever the generated games change for the same parameters, such that cached games are regenerated.
+SYNTHETIC_SALT = "synthetic_game-1"
+
+# The parameters of a synthetic case and their defaults.
+DEFAULT_PARAMETERS = {
+    "vertices": 10000,
+    "out_degree": 3,
+    "priorities": 8,
+    "features": 6,
+    "guard_density": 0.3,
+    "seeds": [1],
+}
+
+# The properties of a synthetic case are named after the seed of their game.
+seed_regex = re.compile(r"seed(-?[0-9]+)$")
+
+# The number of vertices that are written at once.
+BLOCK_SIZE = 1 << 12
+
+def random_guard(rng: random.Random, features: int) -> str:
+    """Returns a cube over the features in which one or two randomly chosen features are fixed"""
+    cube = ["-"] * features
+    for feature in rng.sample(range(features), min(features, 1 + rng.randrange(2))):
+        cube[feature] = "01"[rng.randrange(2)]
+    return "".join(cube)
+
+def write_game(
+    filename: str,
+    vertices: int,
+    out_degree: int,
+    priorities: int,
+    features: int,
+    guard_density: float,
+    seed: int,
+):
+    """Writes a random variability parity game, generated vertex by vertex such that its size is not bounded by memory.
+
+       Every vertex has a random priority and owner, and out_degree random successors. The first edge of every
+       vertex is enabled for all products, such that there are no deadlocks in any product, and every other edge
+       is guarded by a random cube with probability guard_density. The same parameters and seed give the same game."""
+    if vertices < 1 or out_degree < 1 or priorities < 1 or features < 1:
+        raise ValueError("A synthetic game needs at least one vertex, edge per vertex, priority and feature")
+
+    rng = random.Random(seed)
+    unguarded = "-" * features
+
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        f.write(f"confs {unguarded};\n")
+        f.write(f"parity {vertices - 1};\n")
+
+        for start in range(0, vertices, BLOCK_SIZE):
+            lines = []
+            for vertex in range(start, min(start + BLOCK_SIZE, vertices)):
+                edges = []
+                for successor in sorted({rng.randrange(vertices) for _ in range(out_degree)}):
+                    guarded = edges and rng.random() < guard_density
+                    edges.append(f"{successor}|{random_guard(rng, features) if guarded else unguarded}")
+
+                lines.append(f"{vertex} {rng.randrange(priorities)} {rng.randrange(2)} {','.join(edges)};\n")
+            f.write("".join(lines))
+
+    os.replace(tmp_filename, filename)
+
+def game_seed(prop: str) -> int:
+    """Returns the seed of the game of a property of a synthetic case"""
+    match = seed_regex.search(os.path.splitext(prop)[0])
+    if match is None:
+        raise ValueError(f"The property {prop} of a synthetic case should be named seed<N>")
+    return int(match.group(1))
+
+def write_feature_diagram(filename: str, features: int):
+    """Writes the feature diagram over the features F1 to Fn in which every product is valid"""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(",".join(f"F{i}" for i in range(1, features + 1)) + "\ntt")
+
+def add_synthetic_tasks(graph: BuildGraph, experiment: Experiment, properties: list[str]) -> list[str]:
+    """Adds the tasks that generate the games of a synthetic case to the graph, and returns the game files.
+       The feature diagram is written when the case has none, since the games are solved with it."""
+    os.makedirs(experiment.tmp_directory, exist_ok=True)
+    parameters = {name: experiment.synthetic.get(name, value) for name, value in DEFAULT_PARAMETERS.items() if name != "seeds"}
+
+    fd_file = experiment.path(experiment.fd)
+    if not os.path.exists(fd_file):
+        write_feature_diagram(fd_file, parameters["features"])
+
+    game_files = []
+    for prop in properties:
+        game_file = experiment.game_file(prop)
+        seed = game_seed(prop)
+        graph.add(Task(
+            f"synthetic game {os.path.basename(game_file)} of {experiment.name}",
+            outputs=[game_file],
+            inputs=[experiment.path(MANIFEST_NAME)],
+            action=lambda task, seed=seed: write_game(task.outputs[0], **parameters, seed=seed),
+            salt=f"{SYNTHETIC_SALT} {seed}",
+        ))
+        game_files.append(game_file)
+
+    return game_files
+
+def write_case(directory: str, parameters: dict) -> Experiment:
+    """Writes the manifest and the feature diagram of a synthetic case, in which every product is valid"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"synthetic": parameters}, f, indent=4)
+        f.write("\n")
+
+    write_feature_diagram(os.path.join(directory, "FD"), parameters["features"])
+    return load_experiment(directory)
+
+def main():
+    """The main function"""
+
+    parser = argparse.ArgumentParser(
+        prog="synthetic.py",
+        description="Writes a synthetic case whose random variability parity games are generated by prepare.py, "
+                    "or with --output writes a single game directly.",
+        epilog="",
+    )
+    parser.add_argument(dest="directory", action="store", type=str, help="Case directory, for example cases/synthetic")
+    parser.add_argument("--vertices", action="store", type=int, default=DEFAULT_PARAMETERS["vertices"])
+    parser.add_argument(
+        "--out-degree", action="store", type=int, default=DEFAULT_PARAMETERS["out_degree"],
+        help="Number of random successors of every vertex, duplicates are merged",
+    )
+    parser.add_argument("--priorities", action="store", type=int, default=DEFAULT_PARAMETERS["priorities"])
+    parser.add_argument("--features", action="store", type=int, default=DEFAULT_PARAMETERS["features"])
+    parser.add_argument(
+        "--guard-density", action="store", type=float, default=DEFAULT_PARAMETERS["guard_density"],
+        help="Fraction of the edges, except the first of every vertex, that is guarded by a cube over the features",
+    )
+    parser.add_argument(
+        "--seeds", action="store", type=int, nargs="+", default=DEFAULT_PARAMETERS["seeds"],
+        help="Seed of every game of the case, each game is a property named seed<N>",
+    )
+    parser.add_argument(
+        "--output", action="store", type=str, default=None,
+        help="Writes the game of the first seed to this file, and its feature diagram next to it with the "
+             "extension .FD, instead of writing a case",
+    )
+
+    args = parser.parse_args()
+    parameters = {
+        "vertices": args.vertices,
+        "out_degree": args.out_degree,
+        "priorities": args.priorities,
+        "features": args.features,
+        "guard_density": args.guard_density,
+    }
+
+    if args.output is not None:
+        write_game(args.output, **parameters, seed=args.seeds[0])
+        write_feature_diagram(os.path.splitext(args.output)[0] + ".FD", args.features)
+        return
+
+    experiment = write_case(args.directory, {**parameters, "seeds": args.seeds})
+    print(
+        f"Wrote synthetic case {experiment.name} with games {', '.join(experiment.properties)}, run prepare.py to generate them",
+        file=sys.stderr,
+    )
+
+if __name__ == "__main__":
+    main()
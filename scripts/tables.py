@@ -0,0 +1,75 @@
+import csv
+
+# The formats in which tables can be written.
+FORMATS = ["latex", "csv", "markdown"]
+
+def escape_latex(value: str) -> str:
+    return value.replace("\\", "\\textbackslash{}").replace("_", "\\_").replace("&", "\\&").replace("%", "\\%")
+
+def write_latex(
+    columns: list[str],
+    rows: list[list[str]],
+    out,
+    alignment: str | None = None,
+    groups: list[tuple[str, int]] | None = None,
+    escape: bool = True,
+    sections: bool = False,
+    rules: bool = False,
+):
+    """Writes the rows as a standalone LaTeX tabular.
+
+       The alignment is the column specification of the tabular, by default right aligned, and the groups are
+       headers spanning several columns above the column names, the first with a left border. Without escape the
+       cells are LaTeX already. With sections consecutive rows with the same first cell form a section, whose
+       first cell is only shown in its first row, and with rules every section is followed by a line."""
+    format_cell = escape_latex if escape else str
+
+    out.write("\\documentclass{standalone}\n")
+    out.write("\\begin{document}\n")
+    out.write(f"\\begin{{tabular}}{{{alignment if alignment is not None else ' '.join('r' * len(columns))}}}\n")
+    if groups:
+        out.write(" & ".join(
+            f"\\multicolumn{{{span}}}{{{'|' if i == 0 else ''}{'c' if i + 1 == len(groups) else 'c|'}}}{{{format_cell(title)}}}"
+            for i, (title, span) in enumerate(groups)
+        ) + " \\\\\n")
+    out.write(" & ".join(format_cell(column) for column in columns) + " \\\\ \\hline\n")
+
+    section = None
+    for row in rows:
+        cells = [format_cell(cell) for cell in row]
+        if sections:
+            if rules and section is not None and row[0] != section:
+                out.write("\\hline\n")
+            if row[0] == section:
+                cells[0] = ""
+            section = row[0]
+        out.write(" & ".join(cells) + " \\\\\n")
+
+    if rules and section is not None:
+        out.write("\\hline\n")
+    out.write("\\end{tabular}\n")
+    out.write("\\end{document}\n")
+
+def write_csv(columns: list[str], rows: list[list[str]], out):
+    """Writes the rows as comma separated values with a header"""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+
+def write_markdown(columns: list[str], rows: list[list[str]], out):
+    """Writes the rows as a Markdown table"""
+    out.write("| " + " | ".join(columns) + " |\n")
+    out.write("|" + "|".join("---" for _ in columns) + "|\n")
+    for row in rows:
+        out.write("| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |\n")
+
+def write_table(format: str, columns: list[str], rows: list[list[str]], out):
+    """Writes the rows in the given format, one of FORMATS"""
+    if format == "latex":
+        write_latex(columns, rows, out)
+    elif format == "csv":
+        write_csv(columns, rows, out)
+    elif format == "markdown":
+        write_markdown(columns, rows, out)
+    else:
+        raise ValueError(f"Unknown table format {format}")
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import unittest
+
+from benchstats import StoppingRule, median_interval
+
+class StoppingRuleTest(unittest.TestCase):
+    """Checks that the runs are repeated until the interval of the median attains the confidence level"""
+
+    def test_coverage(self):
+        values = [1.0, 1.01, 1.02]
+        self.assertLess(median_interval(values)[2], 0.95)
+        self.assertEqual(StoppingRule().remaining(values), 1)
+        self.assertFalse(StoppingRule().reached(values))
+
+        values += [1.0, 1.01, 1.0]
+        self.assertGreaterEqual(median_interval(values)[2], 0.95)
+        self.assertEqual(StoppingRule().remaining(values), 0)
+        self.assertTrue(StoppingRule().reached(values))
+
+    def test_max_runs(self):
+        rule = StoppingRule(min_runs=3, max_runs=4)
+        self.assertEqual(rule.remaining([1.0, 1.01, 1.02, 1.0]), 0)
+        self.assertFalse(rule.reached([1.0, 1.01, 1.02, 1.0]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import random
+import unittest
+
+from compare import Comparison
+
+def entry(times: list[float]) -> dict:
+    return {"times": times, "outcomes": ["ok"] * len(times)}
+
+class ComparisonTest(unittest.TestCase):
+    """Checks the verdicts of the comparison of a single job"""
+
+    def compare(self, baseline: list[float], candidate: list[float]) -> Comparison:
+        comparison = Comparison(("case", "property", "family"), entry(baseline), entry(candidate))
+        comparison.test(0.05, 0.05, 0.95, 1000, random.Random(0))
+        return comparison
+
+    def test_three_against_three(self):
+        # The exact test cannot attain p < 0.1 for three runs each, so the slowdown cannot be significant.
+        comparison = self.compare([1.0, 1.01, 1.02], [2.0, 2.01, 2.02])
+        self.assertAlmostEqual(comparison.p_value, 0.1)
+        self.assertEqual(comparison.verdict, "insufficient runs")
+        self.assertTrue(comparison.regression())
+
+        comparison = self.compare([2.0, 2.01, 2.02], [1.0, 1.01, 1.02])
+        self.assertEqual(comparison.verdict, "insufficient runs")
+        self.assertFalse(comparison.regression())
+
+    def test_slower(self):
+        comparison = self.compare([1.0, 1.01, 1.02, 1.03, 1.04], [2.0, 2.01, 2.02, 2.03, 2.04])
+        self.assertLess(comparison.p_value, 0.05)
+        self.assertEqual(comparison.verdict, "slower")
+        self.assertTrue(comparison.regression())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import gzip
+import os
+import tempfile
+import unittest
+
+import relabel
+from relabel import Relabeller
+
+class RelabelTest(unittest.TestCase):
+    """Checks that the parallel relabelling gives the same output as a single process"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.directory.name, "input.aut")
+
+        transitions = 5000
+        with open(self.input_file, "w", encoding="utf-8") as f:
+            f.write(f"des (0,{transitions},{transitions})\n")
+            for i in range(transitions):
+                f.write(f'({i}, "a(F{i % 7})", {(i + 1) % transitions})\n')
+
+        self.threshold = relabel.PARALLEL_THRESHOLD
+        relabel.PARALLEL_THRESHOLD = 0
+
+    def tearDown(self):
+        relabel.PARALLEL_THRESHOLD = self.threshold
+        self.directory.cleanup()
+
+    def expected(self) -> bytes:
+        output_file = os.path.join(self.directory.name, "expected.aut")
+        relabel.relabel(self.input_file, output_file, Relabeller({"a(F1)": "b"}, strip_parameters=True), 1)
+        with open(output_file, "rb") as f:
+            return f.read()
+
+    def test_parallel(self):
+        output_file = os.path.join(self.directory.name, "output.aut")
+        relabel.relabel(self.input_file, output_file, Relabeller({"a(F1)": "b"}, strip_parameters=True), 4)
+        with open(output_file, "rb") as f:
+            self.assertEqual(f.read(), self.expected())
+
+    def test_parallel_compressed(self):
+        output_file = os.path.join(self.directory.name, "output.aut.gz")
+        relabel.relabel(self.input_file, output_file, Relabeller({"a(F1)": "b"}, strip_parameters=True), 4)
+        with gzip.open(output_file, "rb") as f:
+            self.assertEqual(f.read(), self.expected())
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["expected.aut", "input.aut", "output.aut.gz"])
+
+if __name__ == "__main__":
+    unittest.main()
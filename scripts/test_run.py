@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import json
+import os
+import resource
+import tempfile
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+import run
+from benchstats import StoppingRule
+from library import Measurement, MyLogger
+from run import ResultParser, SolveOptions, solve_in_pool
+
+def fake_solve_job(merc_vpg_bin, file, solve_variant, repetition, options, timeline=None, raw=None):
+    """Solves a game in 0.2 seconds, the games named fail time out and the others take 1 + repetition / 10 seconds"""
+    time.sleep(0.2)
+    failed = os.path.basename(file).startswith("fail")
+
+    parser = ResultParser()
+    if not failed:
+        parser.solving_time_s = 1.0 + (repetition if repetition is not None else 0) / 10
+    measurement = Measurement(-9 if failed else 0, 200000000, resource.getrusage(resource.RUSAGE_SELF), "timeout" if failed else "ok")
+    measurement.node_capacity = 1000
+    measurement.nodes_exhausted = False
+    return parser, measurement, timeline, raw
+
+class SolveInPoolTest(unittest.TestCase):
+    """Drives the scheduling loop of run_parallel with a thread pool, in which runs of the same game finish together"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.logger = MyLogger("test", stderr_level=100)
+        self.solve_job = run._solve_job
+        run._solve_job = fake_solve_job
+
+    def tearDown(self):
+        run._solve_job = self.solve_job
+        self.logger.close()
+        self.directory.cleanup()
+
+    def solve(self, experiments: list[tuple[str, str, str]], rule: StoppingRule) -> list[dict]:
+        with ThreadPoolExecutor(4) as pool:
+            solve_in_pool(self.logger, pool, "merc-vpg", experiments, self.directory.name, SolveOptions(), rule)
+
+        with open(os.path.join(self.directory.name, "results.json"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_simultaneous_failures(self):
+        results = self.solve([("x.mcrl2", "/tmp/fake/fail.svpg", "family")], StoppingRule(warmup=0, min_runs=3, max_runs=3))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["outcomes"], ["timeout"] * 3)
+
+    def test_additional_repetitions(self):
+        # Every repetition takes longer, so the interval never becomes narrow enough and max_runs are performed.
+        rule = StoppingRule(warmup=1, min_runs=3, max_runs=6, ci_width=0.0)
+        results = self.solve([("x.mcrl2", "/tmp/fake/a.svpg", "family"), ("x.mcrl2", "/tmp/fake/b.svpg", "product")], rule)
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result["outcomes"], ["ok"] * 6)
+            self.assertEqual(result["times"], [1.0 + i / 10 for i in range(6)])
+
+if __name__ == "__main__":
+    unittest.main()
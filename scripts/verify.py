@@ -1,22 +1,25 @@
 import argparse
+import functools
 import os
 import logging
 import shutil
 import re
-import subprocess
 import json
+import subprocess
+import sys
 
+from buildcache import BuildGraph, Task
+from capacity import CAPACITY_OPTION, CapacityPlanner, exhausted_regex, grow
+from fd import read_fd
 from library import MyLogger, run_program
-from prepare import EXPERIMENTS
-
-# A regex matching in=out
-mapping_regex = re.compile(r"(.*)=(.*)")
+from manifest import Experiment, add_filter_arguments, matches, select_experiments, select_variants
+from prepare import CACHE_PATH
+from relabel import Relabeller, relabel
+from run import PORTFOLIO_VARIANT, SHARDED_VARIANT, VARIANTS, merge_flags
+from solution import load_solutions, same_winners, to_bitset
 
-# A regex matching a transition in the aut format '(from, action, to)'
-transition_regex = re.compile(r"\(([0-9]*), \"(.*)\", ([0-9]*)\)")
-
-# Extract the product (zeroes and ones) from the pbes file: minepump_fts_projected.renamed_0000001000.phi1.mcf.pbes
-product_regex = re.compile(r".*_projected\.renamed_([01]+)\..*\.pbes")
+# Extract the product (zeroes and ones) from the projected file: minepump_fts_projected_0000001000.aut
+projection_regex = re.compile(r".*_projected_([01]+)\.aut$")
 
 
 def main():
@@ -32,6 +35,19 @@ def main():
     parser.add_argument(dest="mcrl2_binpath", action="store", type=str)
     parser.add_argument(dest="merc_binpath", action="store", type=str)
     parser.add_argument(dest="output", action="store", type=str)
+    parser.add_argument(
+        "--jobs", action="store", type=int, default=1,
+        help="Number of tools to run concurrently",
+    )
+    parser.add_argument(
+        "--cache-dir", action="store", type=str, default=CACHE_PATH,
+        help="Directory in which the generated files are cached by the content of their inputs",
+    )
+    parser.add_argument(
+        "--check-only", action="store_true",
+        help="Only compare the existing results.json and solution.json in the output directory",
+    )
+    add_filter_arguments(parser)
 
     args = parser.parse_args()
     merc_vpg = shutil.which("merc-vpg", path=args.merc_binpath)
@@ -40,167 +56,407 @@ def main():
 
     logger = MyLogger("main", os.path.join(args.output, "verify.log"))
 
-    # Prepare the variability parity games for all the properties and specifications.
-    for experiment in EXPERIMENTS:
-        directory, mcrl2_name, properties = experiment
+    if args.check_only:
+        report = check_solution(args, logger)
+        sys.exit(1 if report["mismatches"] else 0)
 
-        # The directory in which to store all generated files
-        tmp_directory = directory + "tmp/"
+    # Verify the family solvers and project the feature transition systems onto the products.
+    selected = select_experiments(args)
+    capacities = CapacityPlanner()
+    capacities.load([os.path.join(args.output, "results.json")])
 
-        verify_family_solver(merc_vpg, logger, tmp_directory)
+    graph = BuildGraph(args.cache_dir, logger)
+    for experiment, properties in selected:
+        add_verify_family_solver_tasks(
+            graph, merc_vpg, logger, experiment, properties, select_variants(args, VARIANTS), capacities
+        )
 
         # This projection function is not in the submodule yet, but only in the main branch.
-        project_fts(merc_vpg, logger, tmp_directory, directory)
-
-        rename_projections(tmp_directory)
-
-    for experiment in EXPERIMENTS:
-        directory, mcrl2_name, properties = experiment
+        if experiment.synthetic is None:
+            add_project_fts_task(graph, merc_vpg, logger, experiment)
 
-        tmp_directory = directory + "tmp/"
+    graph.run(args.jobs)
 
-        generate_pbes(lts2pbes, logger, directory, mcrl2_name, properties, tmp_directory)
+    # Generate and solve a PBES for every product and property, where the solutions are
+    # written as soon as they are known.
+    writer = SolutionWriter(os.path.join(args.output, "solution.json"))
+    graph = BuildGraph(args.cache_dir, logger)
+    for experiment, properties in selected:
+        if experiment.synthetic is not None:
+            logger.info(f"Skipping the PBESs of {experiment.name} since a synthetic case has no specification")
+            continue
+        add_product_tasks(graph, lts2pbes, pbessolve, logger, experiment, properties, writer)
 
-        solve_pbes(args, pbessolve, directory, properties, tmp_directory)
+    graph.run(args.jobs, writer.on_done)
 
     # Open both the results.json and solution.json files and compare the results for each property.
-    check_solution(args, logger)
-
-def check_solution(args, logger):
-    results = []
+    report = check_solution(args, logger)
+    if report["mismatches"]:
+        sys.exit(1)
+
+def result_key(result: dict) -> tuple[str, str]:
+    """Returns the (case, property) of a results.json entry, where the file is <case>/tmp/<property>.svpg"""
+    case = os.path.basename(os.path.dirname(os.path.dirname(result["file"])))
+    return (case, os.path.splitext(os.path.basename(result["file"]))[0])
+
+def solution_key(solution: dict) -> tuple[str, str]:
+    """Returns the (case, property) of a solution.json entry, where the experiment is the case directory"""
+    case = os.path.basename(os.path.normpath(solution["experiment"]))
+    return (case, os.path.splitext(solution["property"])[0])
+
+def check_solution(args, logger) -> dict:
+    """Compares all repetitions of all solve variants against each other and against the PBES solutions.
+
+       Solutions are indexed by (case, property, product) and stored as bitsets of the vertices won
+       by each player, or their digest, so every product is compared once. Only the cases, properties and
+       variants that match the filters are compared. Writes a machine-readable report to verification.json
+       and returns it."""
+    # The sharded product variant and the portfolio are only expected when they have been run.
+    optional_variants = [SHARDED_VARIANT, PORTFOLIO_VARIANT]
+    selected_variants = select_variants(args, VARIANTS + optional_variants)
+
+    def selected(case: str, prop: str) -> bool:
+        return matches(case, args.case) and matches(prop, args.property)
+
+    # The PBES solutions only determine the winner of the initial vertex, the last line for a product is used.
+    # There are none when only synthetic cases have been verified.
+    expected: dict[tuple[str, str, str], tuple[int, int]] = {}
+    solution_file = os.path.join(args.output, "solution.json")
+    if not os.path.exists(solution_file):
+        logger.warning(f"{solution_file} does not exist, only the solve variants are compared")
+    else:
+        with open(solution_file, encoding="utf-8") as f:
+            for line in f:
+                solution = json.loads(line)
+                case, prop = solution_key(solution)
+                if not selected(case, prop):
+                    continue
+
+                for product, value in solution["solution"].items():
+                    expected[(case, prop, product)] = (to_bitset(value.get("0", [])), to_bitset(value.get("1", [])))
+
+    # For every (case, property, product) the solutions of every variant and repetition.
+    actual: dict[tuple[str, str, str], dict[str, list[tuple[int, int] | str]]] = {}
+    observed = set()
     with open(os.path.join(args.output, "results.json"), encoding="utf-8") as f:
-        results = [json.loads(line) for line in f]
-
-    with open(os.path.join(args.output, "solution.json"), encoding="utf-8") as f:
         for line in f:
-            solution = json.loads(line)
-
-            for result in results:
-                name = os.path.splitext(solution["property"])[0]
-
-                if name in result["file"]:
-                    actual = result["solution"][0]
-                    expected = solution["solution"]
-
-                    for key, value in expected.items():
-                        if key not in actual:
-                            continue             
-
-                        if value != actual[key]:
-                            logger.error(
-                                f"Verification failed for {name}, key: {key}, expected: {value}, actual: {actual[key]}"
-                            )
+            result = json.loads(line)
+            case, prop = result_key(result)
+            variant = result["solve_variant"]
+            if not selected(case, prop) or variant not in selected_variants:
+                continue
+
+            observed.add(variant)
+            for solution in load_solutions(result):
+                for product, value in solution.items():
+                    actual.setdefault((case, prop, product), {}).setdefault(variant, []).append(value)
+
+    selected_variants = [variant for variant in selected_variants if variant not in optional_variants or variant in observed]
+    mismatches = []
+    coverage: dict[str, dict] = {}
+
+    def statistics(case: str, prop: str) -> dict:
+        return coverage.setdefault(f"{case}/{prop}", {
+            "products": 0,
+            "verified": 0,
+            "missing": {variant: [] for variant in selected_variants},
+        })
+
+    for (case, prop, product), variants in actual.items():
+        reference_variant = None
+        reference = None
+        for variant, solutions in variants.items():
+            for repetition, solution in enumerate(solutions):
+                if not same_winners(solution, solutions[0]):
+                    mismatches.append({
+                        "case": case, "property": prop, "product": product, "variant": variant,
+                        "kind": "repetition", "repetition": repetition,
+                    })
+
+            if reference is None:
+                reference_variant, reference = variant, solutions[0]
+            elif not same_winners(solutions[0], reference):
+                mismatches.append({
+                    "case": case, "property": prop, "product": product, "variant": variant,
+                    "kind": "variant", "reference": reference_variant,
+                })
+
+        # Only the vertices determined by the ground truth are compared.
+        truth = expected.get((case, prop, product))
+        if truth is not None:
+            statistics(case, prop)["verified"] += 1
+
+            mask = truth[0] | truth[1]
+            for variant, solutions in variants.items():
+                # A digest can not be restricted to the vertices of the ground truth.
+                if isinstance(solutions[0], str):
+                    continue
+
+                if (solutions[0][0] & mask, solutions[0][1] & mask) != truth:
+                    mismatches.append({
+                        "case": case, "property": prop, "product": product, "variant": variant,
+                        "kind": "pbes",
+                    })
+
+    # Every product with a ground truth should have been solved by every variant.
+    for (case, prop, product) in expected:
+        entry = statistics(case, prop)
+        entry["products"] += 1
+
+        solved = actual.get((case, prop, product), {})
+        for variant in selected_variants:
+            if variant not in solved:
+                entry["missing"][variant].append(product)
+
+    for mismatch in mismatches:
+        logger.error(f"Verification failed: {mismatch}")
+
+    for name, entry in sorted(coverage.items()):
+        for variant, products in entry["missing"].items():
+            if products:
+                logger.warning(f"{name}: {len(products)} of {entry['products']} products missing for variant {variant}")
+
+    report = {
+        "products": len(actual),
+        "verified": sum(entry["verified"] for entry in coverage.values()),
+        "unverified": len(actual.keys() - expected.keys()),
+        "mismatches": mismatches,
+        "coverage": coverage,
+    }
+
+    logger.info(
+        f"Checked {report['products']} products of which {report['verified']} against a PBES solution, "
+        f"found {len(mismatches)} mismatches"
+    )
 
-def solve_pbes(args, pbessolve, directory, properties, tmp_directory):
-    for prop in properties:
-        result = {"experiment": directory, "property": prop, "solution": {}}
-
-        for pbes in os.listdir(tmp_directory):
-            if "pbes" in pbes and prop in pbes:
-                print("Found pbes file: " + pbes)
-
-                product = None
-                match = product_regex.match(pbes)
-                if match:
-                    product = match.group(1)
-
-                pbes_file = os.path.join(tmp_directory, pbes)
-
-                proc = subprocess.run(
-                        [pbessolve, pbes_file],
-                        stdout=subprocess.PIPE,
-                        text=True,
-                        check=True,
-                    )
-                if "true" in proc.stdout:
-                    result["solution"][product] = {"0": [0], "1": []}
-                elif "false" in proc.stdout:
-                    result["solution"][product] = {"0": [], "1": [0]}
-
-        with open(
-                os.path.join(args.output, "solution.json"), "a", encoding="utf-8"
-            ) as f:
-            json.dump(result, f)
+    with open(os.path.join(args.output, "verification.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    return report
+
+class SolutionWriter:
+    """Streams the solution of every product into the solution file, skipping products that are already recorded"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.solve_tasks: dict[Task, tuple[str, str, str]] = {}
+        self.known: dict[tuple[str, str, str], dict] = {}
+
+        try:
+            with open(filename, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        solution = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line of an interrupted verification.
+                        continue
+
+                    for product, value in solution["solution"].items():
+                        self.known[self.key(solution["experiment"], solution["property"], product)] = value
+        except OSError:
+            pass
+
+    @staticmethod
+    def key(directory: str, prop: str, product: str) -> tuple[str, str, str]:
+        return (os.path.basename(os.path.normpath(directory)), prop, product)
+
+    def on_done(self, task: Task):
+        """Records the solution of a finished pbessolve task"""
+        if task not in self.solve_tasks:
+            return
+
+        directory, prop, product = self.solve_tasks[task]
+        with open(task.outputs[0], encoding="utf-8") as f:
+            answer = f.read().strip()
+
+        if answer == "true":
+            value = {"0": [0], "1": []}
+        elif answer == "false":
+            value = {"0": [], "1": [0]}
+        else:
+            return
+
+        key = self.key(directory, prop, product)
+        if self.known.get(key) == value:
+            return
+
+        self.known[key] = value
+        with open(self.filename, "a", encoding="utf-8") as f:
+            json.dump({"experiment": directory, "property": prop, "solution": {product: value}}, f)
             f.write("\n")
+            f.flush()
+
+def solve_pbes(pbessolve, pbes_file, solution_file, logger):
+    """Solves the PBES and writes its answer, true or false, to the solution file"""
+    output = []
+    run_program([pbessolve, pbes_file], logger, output.append)
+
+    answer = ""
+    if "true" in output:
+        answer = "true"
+    elif "false" in output:
+        answer = "false"
+
+    with open(solution_file, "w", encoding="utf-8") as f:
+        f.write(answer + "\n")
+
+def add_product_tasks(graph, lts2pbes, pbessolve, logger, experiment: Experiment, properties, writer):
+    """Adds the tasks that rename the projections, and generate and solve a PBES for every valid product and property.
+
+       Projections onto products that the feature diagram excludes are skipped."""
+    projected_directory = os.path.join(experiment.tmp_directory, "projected")
+    products_directory = os.path.join(experiment.tmp_directory, "products")
+    mcrl2_file = experiment.path(experiment.spec)
+    diagram = read_fd(experiment.path(experiment.fd))
+    os.makedirs(products_directory, exist_ok=True)
+
+    projections = 0
+    skipped = 0
+    for file in sorted(os.listdir(projected_directory)):
+        match = projection_regex.match(file)
+        if match is None:
+            continue
+
+        product = match.group(1)
+        projections += 1
+        if len(product) != len(diagram.features):
+            logger.warning(f"Product {product} of {file} does not match the {len(diagram.features)} features of the feature diagram")
+        elif not diagram.is_valid(product):
+            skipped += 1
+            continue
+
+        path = os.path.join(projected_directory, file)
+        aut_renamed_file = os.path.join(products_directory, file.replace("_projected", "_projected.renamed"))
+
+        graph.add(Task(
+            os.path.basename(aut_renamed_file),
+            outputs=[aut_renamed_file],
+            inputs=[path],
+            action=lambda task: relabel(task.inputs[0], task.outputs[0], Relabeller(strip_parameters=True)),
+            salt="rename_projections-1",
+        ))
+
+        for prop in properties:
+            mcf_file = experiment.path(prop)
+            pbes_file = aut_renamed_file.replace(".aut", f".{prop}.pbes")
+
+            graph.add(Task(
+                os.path.basename(pbes_file),
+                outputs=[pbes_file],
+                inputs=[aut_renamed_file, mcf_file, mcrl2_file],
+                command=[lts2pbes, "-f", mcf_file, "-m", mcrl2_file, aut_renamed_file, pbes_file],
+                tools=[lts2pbes],
+            ))
+
+            solve_task = graph.add(Task(
+                f"solution of {os.path.basename(pbes_file)}",
+                outputs=[pbes_file + ".solution"],
+                inputs=[pbes_file],
+                tools=[pbessolve],
+                action=lambda task: solve_pbes(pbessolve, task.inputs[0], task.outputs[0], logger),
+                salt="solve_pbes-1",
+            ))
+            writer.solve_tasks[solve_task] = (experiment.directory, prop, product)
+
+    logger.info(
+        f"{experiment.name}: {projections} projections of which {skipped} are excluded by the feature diagram, "
+        f"which has {diagram.count()} valid products"
+    )
 
-def generate_pbes(lts2pbes, logger, directory, mcrl2_name, properties, tmp_directory):
+def verify_family_solver(task: Task, merc_vpg, logger, solve_variant: str, flags: list[str], capacity: int):
+    """Checks the solution of a family solver, restarting it with a larger node capacity when it runs out of nodes"""
+    while True:
+        exhausted = []
+        command = [
+            merc_vpg,
+            "solve",
+            *merge_flags(merge_flags([f"--solve-variant={solve_variant}"], flags), [f"{CAPACITY_OPTION}={capacity}"]),
+            "--verify-solution",
+            task.inputs[0],
+        ]
+        measurement = run_program(
+            command,
+            logger,
+            lambda line: exhausted.append(line) if exhausted_regex.search(line) else None,
+            check=False,
+        )
+
+        if measurement.outcome == "ok":
+            break
+
+        larger = grow(capacity) if exhausted else None
+        if larger is None:
+            raise subprocess.CalledProcessError(measurement.returncode, command)
+
+        logger.warning(f"Verifying {task.inputs[0]} ran out of {capacity} nodes, retrying with {larger}")
+        capacity = larger
+
+    write_stamp(task.outputs[0])
+
+def add_verify_family_solver_tasks(
+    graph, merc_vpg, logger, experiment: Experiment, properties, variants, capacities: CapacityPlanner
+):
+    """Adds tasks that check the solutions of the family solvers, the stamp file records a successful check"""
     for prop in properties:
-        for file in os.listdir(tmp_directory):
-            path = tmp_directory + file
-
-            mcrl2_name = os.path.join(directory, mcrl2_name)
-            pbes_file = path.replace(".aut", f".{prop}.pbes")
-
-            if "_projected.renamed" in path and ".aut" in path:
-                print("Generating pbes for " + path + " and " + prop)
-                run_program(
-                        [
-                            lts2pbes,
-                            "-f",
-                            os.path.join(directory, prop),
-                            "-m",
-                            mcrl2_name,
-                            path,
-                            pbes_file,
-                        ],
-                        logger,
-                    )
-
-def rename_projections(tmp_directory):
-    for file in os.listdir(tmp_directory):
-        path = tmp_directory + file
-
-        if "_projected" in path and "renamed" not in path:
-            aut_renamed_file = path.replace("_projected", "_projected.renamed")
-
-                # Rename the action labels in the aut file based on the mapping computed above
-            with open(aut_renamed_file, "w", encoding="utf-8") as outfile:
-                with open(path, encoding="utf-8") as file:
-                    for line in file.readlines():
-                        result = transition_regex.match(line)
-                        if result is not None:
-                            action = result.group(2)
-                            # Remove the action parameters between brackets
-                            action = re.sub(r"\(.*\)", "", action)
-                            outfile.write(
-                                    f'({result.group(1)},"{action}",{result.group(3)})\n'
-                                )
-                        else:
-                            outfile.write(line)
-
-def verify_family_solver(merc_vpg, logger, tmp_directory):
-    for file in os.listdir(tmp_directory):
-        path = tmp_directory + file
-        if ".svpg" in path:
-            for solve_variant in ["family", "family-optimised-left"]:
-                run_program(
-                        [
-                            merc_vpg,
-                            "solve",
-                            "--oxidd-node-capacity=1000000",
-                            f"--solve-variant={solve_variant}",
-                            "--verify-solution",
-                            path,
-                        ],
-                        logger,
-                    )
-       
-def project_fts(merc_vpg, logger, tmp_directory, directory):  
-    for file in os.listdir(tmp_directory):
-        path = tmp_directory + file      
-                
-        if ".renamed.aut" in path:
-            projected_aut = path.replace(".renamed.aut", "_projected.aut")
-            run_program(
-                [
-                    merc_vpg,
-                    "project",
-                    path,
-                    os.path.join(directory, "FD"),
-                    projected_aut,
-                ],
-                logger,
-            )
+        path = experiment.game_file(prop)
+        if not os.path.exists(path):
+            logger.warning(f"Skipping {path} since it has not been prepared")
+            continue
+
+        flags = experiment.flags(prop)
+        capacities.features[path] = len(read_fd(experiment.path(experiment.fd)).features)
+        for solve_variant in variants:
+            if solve_variant.startswith("family"):
+                # The node capacity is not part of the key, since it only determines whether the check succeeds.
+                graph.add(Task(
+                    f"verification of {os.path.basename(path)} with variant {solve_variant}",
+                    outputs=[f"{path}.{solve_variant}.verified"],
+                    inputs=[path],
+                    tools=[merc_vpg],
+                    action=functools.partial(
+                        verify_family_solver,
+                        merc_vpg=merc_vpg,
+                        logger=logger,
+                        solve_variant=solve_variant,
+                        flags=flags,
+                        capacity=capacities.capacity(path, solve_variant, flags),
+                    ),
+                    salt=f"verify_family_solver-1 {solve_variant} {' '.join(flags)}",
+                ))
+
+def add_project_fts_task(graph, merc_vpg, logger, experiment: Experiment):
+    """Adds a task that projects the renamed feature transition system onto all products"""
+    base, _ = os.path.splitext(experiment.spec)
+    renamed_aut = os.path.join(experiment.tmp_directory, base + ".renamed.aut")
+    featurediagram_file = experiment.path(experiment.fd)
+    projected_directory = os.path.join(experiment.tmp_directory, "projected")
+
+    def project(task: Task):
+        os.makedirs(projected_directory)
+        run_program(
+            [
+                merc_vpg,
+                "project",
+                renamed_aut,
+                featurediagram_file,
+                os.path.join(projected_directory, base + "_projected.aut"),
+            ],
+            logger,
+        )
+
+    graph.add(Task(
+        f"projections of {os.path.basename(renamed_aut)}",
+        outputs=[projected_directory],
+        inputs=[renamed_aut, featurediagram_file],
+        tools=[merc_vpg],
+        action=project,
+        salt="project_fts-1",
+    ))
+
+def write_stamp(filename: str):
+    """Writes a file that marks that a task has succeeded"""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("ok\n")
 
 if __name__ == "__main__":
     try: